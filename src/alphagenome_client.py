@@ -0,0 +1,172 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Tuple
+
+from cache import SWRCache, backend_from_url
+from projection import favor_records
+from resilience import Provider
+
+logger = logging.getLogger(__name__)
+
+# (chromosome, 1-based position, ref, alt), e.g. ("chr19", 44908684, "T", "C")
+VariantKey = Tuple[str, int, str, str]
+
+# Scores are deterministic for a given model version, so keep them a long time
+SCORE_TTL = 30 * 24 * 3600
+
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_MAX_CONCURRENCY = 2
+# Upper bound on variants sent upstream per ``score`` call (AlphaGenome calls are metered)
+DEFAULT_MAX_VARIANTS = 200
+
+
+def parse_variant_vcf(variant_vcf: str) -> Optional[VariantKey]:
+    """Parse FAVOR's ``variant_vcf`` ("19-44908684-T-C") into a VariantKey."""
+    try:
+        chrom, pos, ref, alt = variant_vcf.split("-")
+        chrom = chrom if chrom.startswith("chr") else f"chr{chrom}"
+        return chrom, int(pos), ref, alt
+    except (AttributeError, ValueError):
+        return None
+
+
+def variants_from_favor(favor_data: Any) -> List[VariantKey]:
+    """VariantKeys for every FAVOR record with a parseable ``variant_vcf`` (bare or wrapped payloads)."""
+    keys = []
+    for record in favor_records(favor_data) or []:
+        key = parse_variant_vcf(record.get("variant_vcf"))
+        if key is not None and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def allele_key(variant: VariantKey) -> str:
+    chrom, pos, ref, alt = variant
+    return f"alphagenome:{chrom}:{pos}:{ref}>{alt}"
+
+
+class ScoringClient(Protocol):
+    """Anything that scores a batch of variants, one summary dict per input, in order."""
+
+    def score_batch(self, variants: List[VariantKey]) -> List[Dict[str, Any]]:
+        ...
+
+
+class SdkScoringClient:
+    """
+    ScoringClient backed by the ``alphagenome`` SDK (``pip install alphagenome``).
+
+    Each variant is scored on the 1 Mb interval centred on it with the
+    recommended scorers, and summarised to its largest absolute quantile
+    score overall and per scorer.
+    """
+
+    def __init__(self, api_key: str, scorers: Optional[Iterable[str]] = None, max_workers: int = 4):
+        from alphagenome.data import genome
+        from alphagenome.models import dna_client, variant_scorers
+
+        self._genome = genome
+        self._variant_scorers = variant_scorers
+        self._model = dna_client.create(api_key)
+        self._sequence_length = dna_client.SUPPORTED_SEQUENCE_LENGTHS["SEQUENCE_LENGTH_1MB"]
+        names = scorers or variant_scorers.RECOMMENDED_VARIANT_SCORERS.keys()
+        self._scorers = [variant_scorers.RECOMMENDED_VARIANT_SCORERS[name] for name in names]
+        self._max_workers = max_workers
+
+    def score_batch(self, variants: List[VariantKey]) -> List[Dict[str, Any]]:
+        sdk_variants = [
+            self._genome.Variant(chromosome=c, position=p, reference_bases=r, alternate_bases=a)
+            for c, p, r, a in variants
+        ]
+        intervals = [v.reference_interval.resize(self._sequence_length) for v in sdk_variants]
+        results = self._model.score_variants(
+            intervals=intervals, variants=sdk_variants,
+            variant_scorers=self._scorers, max_workers=self._max_workers,
+        )
+        return [self._summarise(self._variant_scorers.tidy_scores(r)) for r in results]
+
+    @staticmethod
+    def _summarise(tidy) -> Dict[str, Any]:
+        if tidy is None or tidy.empty:
+            return {"max_abs_quantile_score": None, "top_scorer": None, "top_gene": None, "scores": {}}
+        tidy = tidy.assign(abs_q=tidy["quantile_score"].abs())
+        top = tidy.loc[tidy["abs_q"].idxmax()]
+        per_scorer = tidy.groupby(tidy["variant_scorer"].astype(str))["abs_q"].max()
+        gene = top.get("gene_name")
+        return {
+            "max_abs_quantile_score": float(top["abs_q"]),
+            "top_scorer": str(top["variant_scorer"]),
+            "top_gene": gene if isinstance(gene, str) else None,
+            "scores": {name: float(v) for name, v in per_scorer.items()},
+        }
+
+
+class AlphaGenomeScorer:
+    """
+    Batched, cached variant scoring.
+
+    ``score`` deduplicates the requested alleles, serves cached scores, splits
+    the misses into batches of ``batch_size`` and scores up to
+    ``max_concurrency`` batches at once. At most ``max_variants`` alleles go
+    upstream per call; the rest are reported as skipped so callers can retry
+    later. Batches go through ``provider`` (circuit breaker, no hedging, since
+    duplicate calls cost money).
+    """
+
+    def __init__(self, client: ScoringClient, provider: Optional[Provider] = None,
+                 cache: Optional[SWRCache] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, max_variants: int = DEFAULT_MAX_VARIANTS):
+        self.client = client
+        self.provider = provider or Provider("alphagenome", hedge=False)
+        self.cache = cache or SWRCache(fresh_ttl=SCORE_TTL, backend=backend_from_url(table="alphagenome"))
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_variants = max_variants
+
+    def score(self, variants: Iterable[VariantKey]) -> Dict[VariantKey, Dict[str, Any]]:
+        results: Dict[VariantKey, Dict[str, Any]] = {}
+        misses = []
+        for variant in dict.fromkeys(variants):
+            entry = self.cache.peek(allele_key(variant))
+            if entry is not None and self.cache.age(entry) < self.cache.fresh_ttl:
+                results[variant] = entry.value
+            else:
+                misses.append(variant)
+
+        to_score, skipped = misses[:self.max_variants], misses[self.max_variants:]
+        for variant in skipped:
+            results[variant] = {"error": "skipped: per-call AlphaGenome budget exceeded"}
+
+        batches = [to_score[i:i + self.batch_size] for i in range(0, len(to_score), self.batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                for batch, scores in zip(batches, pool.map(self._score_batch, batches)):
+                    results.update(zip(batch, scores))
+        return results
+
+    def _score_batch(self, batch: List[VariantKey]) -> List[Dict[str, Any]]:
+        try:
+            scores = self.provider.call(lambda: self.client.score_batch(batch))
+        except Exception as e:
+            logger.warning("AlphaGenome batch of %d failed: %s", len(batch), e)
+            return [{"error": str(e)} for _ in batch]
+
+        if len(scores) != len(batch):
+            return [{"error": "AlphaGenome returned a partial batch"} for _ in batch]
+        for variant, score in zip(batch, scores):
+            self.cache.set(allele_key(variant), score)
+        return scores
+
+
+def default_scorer() -> Optional[AlphaGenomeScorer]:
+    """Scorer using the SDK if ALPHAGENOME_API_KEY is set and the SDK is installed, else None."""
+    api_key = os.environ.get("ALPHAGENOME_API_KEY")
+    if not api_key:
+        return None
+    try:
+        client = SdkScoringClient(api_key)
+    except ImportError:
+        logger.warning("ALPHAGENOME_API_KEY is set but the alphagenome package is not installed")
+        return None
+    return AlphaGenomeScorer(client)
@@ -0,0 +1,54 @@
+"""
+Fetch-and-merge of one variant into the record store, shared by the cache
+warmer, ``batch_annotate.py`` and reports. Imports nothing from the Streamlit
+UI, so worker processes stay light.
+"""
+from pathlib import Path
+from typing import List
+
+from fetch_data import HTTP_CACHE, fetch_alphagenome, fetch_favor, fetch_gtex
+from merge_api import changed_sections, merge_variant_data
+from projection import APP_FAVOR_FIELDS
+from record_store import RECORD_STORE, RecordStore
+
+
+def load_variant_list(path: str) -> List[str]:
+    """rsIDs from a text/CSV file: first column, one per line, '#' comments and headers ignored."""
+    variants = []
+    for line in Path(path).read_text().splitlines():
+        token = line.split("#", 1)[0].replace(",", " ").replace("\t", " ").split()
+        if token and token[0].lower().startswith("rs") and token[0][2:].isdigit():
+            variants.append(token[0].lower())
+    return list(dict.fromkeys(variants))
+
+
+class ProviderUnavailable(Exception):
+    """FAVOR or GTEx could not be reached, so it is unknown whether the variant exists. Retry later."""
+
+
+def annotate_variant(rsid: str, store: RecordStore = RECORD_STORE, with_alphagenome: bool = True) -> bool:
+    """
+    Fetch (through the shared caches) and merge one variant into ``store``.
+    Returns False if neither FAVOR nor GTEx knows the variant; raises
+    ProviderUnavailable if neither has data and at least one did not answer.
+
+    The stored record counts as fresh from now on, so expired upstream
+    responses are revalidated before merging rather than served stale.
+    """
+    with HTTP_CACHE.foreground():
+        favor_data = fetch_favor(rsid, fields=APP_FAVOR_FIELDS)
+        gtex_data = fetch_gtex(rsid)
+        alphagenome_data = fetch_alphagenome(favor_data) if with_alphagenome else None
+
+    if not favor_data and not (gtex_data and "eqtl_results" in gtex_data):
+        if favor_data is None or not (gtex_data or {}).get("not_found"):
+            raise ProviderUnavailable(f"{rsid}: FAVOR or GTEx unavailable")
+        return False
+    previous = store.get(rsid)
+    merged = merge_variant_data(favor_data, gtex_data, rsid, alphagenome_data=alphagenome_data, previous=previous)
+    if changed_sections(previous, merged):
+        store.put(rsid, merged)
+    else:
+        # Rewriting an identical record would bump the store version and rebuild cohort indexes
+        store.touch(rsid)
+    return True
@@ -0,0 +1,52 @@
+"""
+REST API over stored merged records.
+
+    uvicorn api:app --app-dir src
+
+Interactive docs at /docs. With VARIANT_COHORT_INDEX set to a directory,
+workers memory-map the saved cohort index instead of rebuilding it from
+every stored record.
+"""
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Query
+
+from cohort import COHORT, COLUMNS, DEFAULT_LIMIT, MAX_LIMIT, eqtl_condition
+from snapshot import load_from_env
+
+app = FastAPI(title="Genetic Variant Explorer API")
+
+# Serve cache hits from the first request when VARIANT_SNAPSHOT is set
+SNAPSHOT_REPORT = load_from_env()
+
+
+@app.get("/cohort")
+def cohort(
+    where: List[str] = Query([], description="Conditions such as cadd_phred>20 or gene=APOE|TOMM40; repeat or comma-separate"),
+    eqtl_tissue: Optional[str] = Query(None, description="Require an eQTL in these tissues (e.g. brain, Whole_Blood)"),
+    eqtl_gene: Optional[str] = Query(None, description="Require an eQTL for these genes (comma-separated)"),
+    eqtl_max_pvalue: Optional[float] = Query(None, description="Require an eQTL with p-value <= this"),
+    sort: Optional[str] = Query(None, description="Column to sort by (missing values last)"),
+    desc: bool = False,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (default: all)"),
+):
+    """Stored variants matching every condition, e.g. ?where=cadd_phred>20,af_total<0.01&eqtl_tissue=brain&eqtl_max_pvalue=1e-6"""
+    columns = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        result = COHORT.get().query(
+            where=",".join(where),
+            eqtl=eqtl_condition(eqtl_tissue, eqtl_gene, eqtl_max_pvalue),
+            sort_by=sort, descending=desc, limit=limit, offset=offset, columns=columns,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return result.as_dict()
+
+
+@app.get("/cohort/columns")
+def cohort_columns():
+    """Queryable columns and the number of stored variants."""
+    index = COHORT.get()
+    return {"variants": len(index), "columns": list(COLUMNS), "indexed": list(index.indexes)}
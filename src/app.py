@@ -1,124 +1,312 @@
 from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import sys
+import time
 sys.path.insert(0, str(Path(__file__).parent))
 
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 
-from data_viz import create_population_frequency_chart, create_eqtl_heatmap, create_functional_annotation_landscape
-from fetch_data import fetch_favor, fetch_gtex
-from merge_api import merge_variant_data, export_to_json, export_to_csv
+from data_viz import create_population_frequency_chart, create_eqtl_heatmap, create_functional_annotation_landscape, create_locus_plot, FAVOR_TABLE_COLUMNS, APP_FAVOR_FIELDS
+from fetch_data import fetch_favor, fetch_gtex, fetch_alphagenome, collect_messages, PROVIDERS
+from eqtl_table import EQTLTable, resolve_tissues
+from merge_api import changed_sections, merge_variant_data, export_to_json, export_to_csv
+from record_store import RECORD_STORE
+from cohort import COHORT, COLUMNS, LOCUS_EQTL_METRIC, eqtl_condition
+from warmer import warmer_from_env
+from snapshot import load_from_env
 
 
 
 st.set_page_config(layout="wide")
 
-favor_columns_to_show = [
-    "rsid",
-    "chromosome",
-    "position",
-    "variant_vcf",
-    "genecode_comprehensive_info",
-    "genecode_comprehensive_exonic_category",
-    "protein_variant",
-    "cadd_phred",
-    "am_class",
-    "clnsig",
-    "af_total",
-    "sift_cat",
-    "polyphen_cat"
-]
 
-GTEx_columns_to_show = [
-    "snpId",
-    "geneSymbol",
-    "tissueSiteDetailId",
-    "pValue",
-    "nes"
-]
+@st.cache_resource
+def load_startup_snapshot():
+    """Fill the caches from VARIANT_SNAPSHOT once per server process, before warming."""
+    return load_from_env()
 
-st.title("🧬 Genetic Variant Explorer")
 
-# Create tabs
-tab1, tab2 = st.tabs(["🔍 Search", "❓ Help"])
+snapshot_report = load_startup_snapshot()
 
-with tab1:
-    st.write("Search for a variant and recieve data vizualisations from the FAVOR and GTEx databases.")
 
-    variant_id = st.text_input("Enter rsID (e.g., rs429358):", "rs429358")
+@st.cache_resource
+def start_cache_warmer():
+    """One background warmer per server process (not per session)."""
+    return warmer_from_env()
 
-    if st.button("Search"):
-    # ========== FETCH ALL DATA FIRST ==========
-        with st.expander("🔧 API Request Details (Click to expand)", expanded=False):
-            with st.spinner("Fetching data from all sources..."):
-                # Fetch FAVOR
-                favor_data = fetch_favor(variant_id)
 
-                # Show raw FAVOR data
-                if favor_data:
-                    st.markdown("**FAVOR Raw Response:**")
-                    st.json(favor_data)  # Pretty-prints JSON
+cache_warmer = start_cache_warmer()
 
-                # Fetch GTEx
-                GTEx_data = fetch_gtex(variant_id)
 
-                # Show raw GTEx data
-                if GTEx_data:
-                    st.markdown("**GTEx Raw Response:**")
-                    st.json(GTEx_data)  # Pretty-prints JSON
+@st.cache_resource
+def get_fetch_pool():
+    """Threads for upstream fetches, shared by all sessions."""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="fetch")
 
-            st.success("✅ Data fetching complete!")
 
-        # ========== DISPLAY RAW DATA TABLES ==========
-        if favor_data:
-            favor_df = pd.DataFrame(favor_data)
-            with st.expander("📘 FAVOR Annotation Table (Click to expand)"):
-                st.dataframe(favor_df[favor_columns_to_show])
-        else:
-            st.warning("⚠️ No FAVOR results found.")
+def show_fetch_messages(messages, details, notices):
+    """Progress lines go in the details expander; warnings and errors above the results."""
+    for level, text in messages:
+        with details if level == "write" else notices:
+            getattr(st, level)(text)
 
-        if GTEx_data and "eqtl_results" in GTEx_data:
-            gtex_df = pd.DataFrame(GTEx_data["eqtl_results"])
-            with st.expander("🧫 GTEx eQTL Results Table (Click to expand)"):
-                st.dataframe(gtex_df[GTEx_columns_to_show])
-        else:
-            st.warning("⚠️ No GTEx eQTL results found.")
 
-        # ========== DISPLAY VISUALIZATIONS ==========
+favor_columns_to_show = FAVOR_TABLE_COLUMNS
+
+GTEx_columns_to_show = [
+    "snp_id",
+    "gene",
+    "tissue",
+    "p_value",
+    "effect_size"
+]
 
-        if favor_data:
-            st.subheader("Data Visualizations")
+st.title("🧬 Genetic Variant Explorer")
 
-            st.markdown("#### 🌍 Global Population Allele Frequencies")
-            fig1 = create_population_frequency_chart(favor_df, variant_id)
-            st.plotly_chart(fig1, use_container_width=True)
+# Create tabs
+tab1, tab_cohort, tab2 = st.tabs(["🔍 Search", "🧮 Cohort", "❓ Help"])
 
-            st.markdown("#### 🧬 Functional Annotation Landscape")
-            fig2 = create_functional_annotation_landscape(favor_df, variant_id)
-            st.plotly_chart(fig2, use_container_width=True)
+with tab1:
+    st.write("Search for a variant and recieve data vizualisations from the FAVOR and GTEx databases.")
 
-        if GTEx_data:
-            fig = create_eqtl_heatmap(GTEx_data, variant_id)
-            if fig:
-                st.markdown("#### 🔬 eQTL Effect Heatmap")
-                st.plotly_chart(fig, use_container_width=True)
+    variant_id = st.text_input("Enter rsID (e.g., rs429358):", "rs429358")
 
-        if favor_data or GTEx_data:
-            st.subheader("📥 Export Data")
-            merged = merge_variant_data(favor_data, GTEx_data, variant_id)
+    filter_col1, filter_col2 = st.columns(2)
+    with filter_col1:
+        tissue_filter = st.text_input("Limit eQTLs to tissues (optional, e.g. brain, Whole_Blood):", "")
+    with filter_col2:
+        max_pvalue = st.select_slider("Max eQTL p-value:", options=[1e-8, 1e-6, 1e-4, 1e-2, 1.0], value=1.0)
 
-            col1, col2 = st.columns(2)
-            with col1:
-                st.download_button("⬇️ JSON", export_to_json(merged),
-                                f"{variant_id}.json", "application/json")
-            with col2:
-                st.download_button("⬇️ CSV", export_to_csv(merged),
-                                f"{variant_id}.csv", "text/csv")
+    if st.button("Search"):
+        try:
+            tissues = resolve_tissues(tissue_filter)
+        except ValueError as e:
+            st.error(str(e))
+            st.stop()
+
+        # ========== START ALL FETCHES AT ONCE ==========
+        # Fetchers run on worker threads; every section below renders on this
+        # thread as soon as its own inputs arrive, so a slow GTEx response no
+        # longer hides FAVOR results. Their messages come back with the result.
+        pool = get_fetch_pool()
+        started = time.monotonic()
+        favor_future = pool.submit(collect_messages, fetch_favor, variant_id, APP_FAVOR_FIELDS)
+        gtex_future = pool.submit(collect_messages, fetch_gtex, variant_id, tissues,
+                                  max_pvalue if max_pvalue < 1.0 else None)
+        pending = {favor_future: "FAVOR", gtex_future: "GTEx"}
+
+        details = st.expander("🔧 API Request Details (Click to expand)", expanded=False)
+        notices = st.container()
+
+        # ========== PLACEHOLDERS, IN PAGE ORDER ==========
+        favor_slot = st.empty()
+        alphagenome_slot = st.empty()
+        gtex_slot = st.empty()
+        st.subheader("Data Visualizations")
+        freq_slot = st.empty()
+        landscape_slot = st.empty()
+        heatmap_slot = st.empty()
+        export_slot = st.empty()
+
+        for slot, source in [(favor_slot, "FAVOR"), (gtex_slot, "GTEx"), (freq_slot, "FAVOR"),
+                             (landscape_slot, "FAVOR"), (heatmap_slot, "GTEx"), (export_slot, "all sources")]:
+            slot.info(f"⏳ Waiting for {source}...")
+
+        favor_data = GTEx_data = alphagenome_data = eqtls = None
+
+        # AlphaGenome joins ``pending`` once FAVOR is in, so wait on the live set
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            future = done.pop()
+            source = pending.pop(future)
+            elapsed = time.monotonic() - started
+            result, messages = future.result()
+            show_fetch_messages(messages, details, notices)
+
+            if source == "FAVOR":
+                favor_data = result
+                with details:
+                    st.markdown(f"**FAVOR Raw Response** ({elapsed:.2f}s):")
+                    st.json(favor_data)
 
-            st.caption("💡 CSV uses tidy format: one row per eQTL association, with annotation data repeated. "
-                    "JSON preserves the nested structure.")
+                if favor_data:
+                    favor_df = pd.DataFrame(favor_data)
+                    with favor_slot.container():
+                        with st.expander("📘 FAVOR Annotation Table (Click to expand)"):
+                            st.dataframe(favor_df[favor_columns_to_show])
+                    with freq_slot.container():
+                        st.markdown("#### 🌍 Global Population Allele Frequencies")
+                        fig1 = create_population_frequency_chart(favor_df, variant_id)
+                        st.plotly_chart(fig1, use_container_width=True)
+                    with landscape_slot.container():
+                        st.markdown("#### 🧬 Functional Annotation Landscape")
+                        fig2 = create_functional_annotation_landscape(favor_df, variant_id)
+                        st.plotly_chart(fig2, use_container_width=True)
+
+                    # AlphaGenome needs FAVOR's allele (skipped if not configured)
+                    alphagenome_future = pool.submit(collect_messages, fetch_alphagenome, favor_data)
+                    pending[alphagenome_future] = "AlphaGenome"
+                    alphagenome_slot.info("⏳ Waiting for AlphaGenome...")
+                else:
+                    favor_slot.warning("⚠️ No FAVOR results found.")
+                    freq_slot.empty()
+                    landscape_slot.empty()
+
+            elif source == "GTEx":
+                GTEx_data = result
+                with details:
+                    st.markdown(f"**GTEx Raw Response** ({elapsed:.2f}s):")
+                    st.json(GTEx_data)
+
+                if GTEx_data and "eqtl_results" in GTEx_data:
+                    # One compact eQTL table, shared by the table, heatmap and exports
+                    eqtls = EQTLTable.from_gtex(GTEx_data)
+                    with gtex_slot.container():
+                        with st.expander("🧫 GTEx eQTL Results Table (Click to expand)"):
+                            st.dataframe(eqtls.to_frame()[GTEx_columns_to_show])
+                    fig = create_eqtl_heatmap(eqtls, variant_id)
+                    if fig:
+                        with heatmap_slot.container():
+                            st.markdown("#### 🔬 eQTL Effect Heatmap")
+                            st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        heatmap_slot.empty()
+                else:
+                    gtex_slot.warning("⚠️ No GTEx eQTL results found.")
+                    heatmap_slot.empty()
+
+            elif source == "AlphaGenome":
+                alphagenome_data = result
+                if alphagenome_data and "error" not in alphagenome_data:
+                    with alphagenome_slot.container():
+                        with st.expander("🤖 AlphaGenome Variant Effect Scores (Click to expand)"):
+                            max_score = alphagenome_data.get("max_abs_quantile_score")
+                            st.metric("Max |quantile score|", f"{max_score:.3f}" if max_score is not None else "n/a",
+                                      help=f"Top scorer: {alphagenome_data['top_scorer']}, gene: {alphagenome_data['top_gene']}")
+                            st.dataframe(pd.DataFrame(alphagenome_data["scores"].items(),
+                                                      columns=["Scorer", "Max |quantile score|"]))
+                else:
+                    alphagenome_slot.empty()
+
+        # ========== MERGE + EXPORT (needs every source) ==========
+        with details:
+            st.markdown("**Upstream health:**")
+            st.json({name: provider.status() for name, provider in PROVIDERS.items()})
+            if snapshot_report is not None:
+                st.markdown("**Startup snapshot:**")
+                st.json(snapshot_report)
+            if cache_warmer is not None:
+                st.markdown("**Cache warm-up coverage:**")
+                st.json(cache_warmer.report().as_dict())
+            st.success(f"✅ Data fetching complete! ({time.monotonic() - started:.2f}s)")
+
+        # Cohort queries, snapshots and exports read the stored record, so only
+        # searches without eQTL filters may replace it
+        unfiltered = tissues is None and max_pvalue >= 1.0
+        gtex_for_merge = dict(GTEx_data, eqtl_results=eqtls) if eqtls is not None else GTEx_data
+        previous = RECORD_STORE.get(variant_id) if unfiltered else None
+        merged = merge_variant_data(favor_data, gtex_for_merge, variant_id, alphagenome_data=alphagenome_data,
+                                    previous=previous)
+        if unfiltered and (favor_data or eqtls is not None):
+            if changed_sections(previous, merged):
+                RECORD_STORE.put(variant_id, merged)
+            else:
+                RECORD_STORE.touch(variant_id)
 
+        if favor_data or GTEx_data:
+            with export_slot.container():
+                st.subheader("📥 Export Data")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.download_button("⬇️ JSON", export_to_json(merged),
+                                    f"{variant_id}.json", "application/json")
+                with col2:
+                    st.download_button("⬇️ CSV", export_to_csv(merged),
+                                    f"{variant_id}.csv", "text/csv")
+
+                st.caption("💡 CSV uses tidy format: one row per eQTL association, with annotation data repeated. "
+                        "JSON preserves the nested structure.")
+        else:
+            export_slot.empty()
+
+
+with tab_cohort:
+    st.write("Query every variant merged so far (searches and cache warm-up) by scores, frequencies and eQTLs.")
+
+    where = st.text_area("Conditions (one per line or comma-separated):", "cadd_phred>20\naf_total<0.01",
+                         help="Numeric: <, <=, >, >=, =, != (e.g. cadd_phred>20). "
+                              "Text columns: = or != with | for alternatives (e.g. gene=APOE|TOMM40).")
+    cohort_col1, cohort_col2, cohort_col3 = st.columns(3)
+    with cohort_col1:
+        cohort_tissue = st.text_input("Has an eQTL in tissues (optional):", "")
+    with cohort_col2:
+        cohort_pvalue = st.select_slider("eQTL p-value at most:", options=[1e-12, 1e-9, 1e-6, 1e-3, 1.0], value=1.0)
+    with cohort_col3:
+        sort_by = st.selectbox("Sort by:", ["(none)"] + list(COLUMNS[1:]), index=COLUMNS.index("cadd_phred"))
+        descending = st.checkbox("Descending", value=True)
+
+    if st.button("Run query"):
+        try:
+            result = COHORT.get().query(
+                where=where,
+                eqtl=eqtl_condition(cohort_tissue, max_pvalue=cohort_pvalue if cohort_pvalue < 1.0 else None),
+                sort_by=None if sort_by == "(none)" else sort_by,
+                descending=descending,
+                limit=1000,
+            )
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.caption(f"{result.total} of {len(COHORT.get())} stored variants match "
+                       f"({result.elapsed_ms:.1f} ms); showing the first {len(result.rows)}.")
+            st.dataframe(result.rows)
+            st.download_button("⬇️ CSV", result.rows.to_csv(index=False), "cohort.csv", "text/csv")
+
+    st.markdown("#### 📍 Locus View")
+    with st.form("locus_form"):
+        locus_col1, locus_col2, locus_col3, locus_col4 = st.columns(4)
+        with locus_col1:
+            locus_chrom = st.text_input("Chromosome:", "19")
+        with locus_col2:
+            locus_start = st.number_input("From position:", min_value=0, value=44_400_000, step=100_000)
+        with locus_col3:
+            locus_end = st.number_input("To position:", min_value=0, value=45_400_000, step=100_000)
+        with locus_col4:
+            locus_metric = st.radio("Y axis:", ["eQTL -log10(p)", "CADD"], horizontal=True)
+            locus_color = st.radio("Colour by:", ["gene", "tissue"], horizontal=True)
+        show_locus = st.form_submit_button("Show locus")
+
+    # The index is only read when the form is submitted; zooming and other
+    # reruns (e.g. a search) reuse the points kept in the session
+    if show_locus:
+        metric = LOCUS_EQTL_METRIC if locus_metric.startswith("eQTL") else "cadd_phred"
+        st.session_state["locus"] = {
+            "points": COHORT.get().locus(locus_chrom, locus_start, locus_end, metric=metric),
+            "title": f"chr{locus_chrom}:{locus_start:,}-{locus_end:,}",
+            "y_label": "-log10(eQTL p-value)" if metric == LOCUS_EQTL_METRIC else "CADD phred",
+            "color_by": locus_color,
+        }
+        st.session_state.pop("locus_zoom", None)
+
+    locus = st.session_state.get("locus")
+    if locus is not None:
+        zoom = st.session_state.get("locus_zoom")
+        fig = create_locus_plot(locus["points"], locus["title"], y_label=locus["y_label"],
+                                color_by=locus["color_by"], x_range=zoom)
+        # Box-selecting a region re-bins it server-side at full resolution
+        event = st.plotly_chart(fig, use_container_width=True, key="locus_plot", on_select="rerun", selection_mode="box")
+        boxes = event.selection.get("box") if event else None
+        if boxes:
+            selected = tuple(sorted(boxes[0]["x"]))
+            if selected != zoom:
+                st.session_state["locus_zoom"] = selected
+                st.rerun()
+        if zoom and st.button("Reset zoom"):
+            del st.session_state["locus_zoom"]
+            st.rerun()
 
 with tab2:
     st.header("Help & Documentation")
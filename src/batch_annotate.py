@@ -0,0 +1,105 @@
+"""
+Distributed batch annotation.
+
+Worker processes on one host share a work queue and the annotation caches,
+so a big rsID list is split between them without overlap:
+
+    export VARIANT_CACHE_URL=sqlite:///var/cache/variants.db
+    python src/batch_annotate.py enqueue loci.txt --queue var/queue.db
+    python src/batch_annotate.py work --queue var/queue.db --processes 4
+    python src/batch_annotate.py status --queue var/queue.db
+
+The queue and cache are SQLite files in WAL mode, which relies on shared
+memory between processes on one machine and is not safe on a network
+filesystem. Spreading workers over several hosts needs a networked cache
+backend (``register_backend``) and queue.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import time
+
+from cache import is_shared_backend
+from annotate import ProviderUnavailable, annotate_variant, load_variant_list
+from work_queue import SQLiteWorkQueue, default_worker_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = "var/queue.db"
+DEFAULT_BATCH = 10
+# Pause after an upstream outage; matches the circuit breakers' reset timeout
+UNAVAILABLE_BACKOFF_SECONDS = 30
+
+
+def run_worker(queue_path: str, batch: int = DEFAULT_BATCH, worker: str = None,
+               idle_exit: bool = True, poll_seconds: float = 2.0,
+               backoff_seconds: float = UNAVAILABLE_BACKOFF_SECONDS) -> int:
+    """
+    Claim and annotate batches until the queue is drained (or forever if
+    ``idle_exit`` is False). Returns the number of variants this worker annotated.
+
+    Variants neither FAVOR nor GTEx knows fail permanently. While an upstream
+    is unavailable the rest of the batch is handed back untried and the
+    worker waits ``backoff_seconds``, so an outage does not use up retries.
+    """
+    queue = SQLiteWorkQueue(queue_path)
+    worker = worker or default_worker_id()
+    done = 0
+    while True:
+        items = queue.claim(worker, batch)
+        if not items:
+            stats = queue.stats()
+            if idle_exit and stats["pending"] == 0 and stats["claimed"] == 0:
+                return done
+            time.sleep(poll_seconds)
+            continue
+
+        completed = []
+        unavailable = False
+        for i, rsid in enumerate(items):
+            try:
+                if annotate_variant(rsid):
+                    completed.append(rsid)
+                else:
+                    queue.fail(worker, rsid, "not found in FAVOR or GTEx", permanent=True)
+            except ProviderUnavailable as e:
+                logger.warning("%s: %s; backing off for %ss", worker, e, backoff_seconds)
+                queue.release(worker, items[i:])
+                unavailable = True
+                break
+            except Exception as e:
+                logger.warning("%s failed on %s: %s", worker, rsid, e)
+                queue.fail(worker, rsid, str(e))
+        queue.complete(worker, completed)
+        done += len(completed)
+        if unavailable:
+            time.sleep(backoff_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split batch annotation across worker processes.")
+    parser.add_argument("command", choices=["enqueue", "work", "status"])
+    parser.add_argument("variants", nargs="?", help="rsID file (enqueue)")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="queue database path")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="items claimed per round trip")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to start on this host")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "enqueue":
+        added = SQLiteWorkQueue(args.queue).enqueue(load_variant_list(args.variants))
+        print(f"Enqueued {added} new variants")
+
+    elif args.command == "work":
+        if not is_shared_backend():
+            logger.warning("VARIANT_CACHE_URL is not a shared backend; results stay in each worker's memory")
+        with multiprocessing.Pool(args.processes) as pool:
+            counts = pool.starmap(run_worker, [(args.queue, args.batch)] * args.processes)
+        print(f"Annotated {sum(counts)} variants across {args.processes} process(es)")
+
+    print(json.dumps(SQLiteWorkQueue(args.queue).stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+import abc
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Annotation sources change rarely: serve from cache for FRESH_TTL, then serve
+# stale while revalidating in the background for up to MAX_STALE.
+FRESH_TTL = 6 * 3600
+MAX_STALE = 7 * 24 * 3600
+
+# Cache states reported to callers
+FRESH, STALE, MISS = "fresh", "stale", "miss"
+
+# How long a process may hold the right to refresh a key before others take over
+LEASE_SECONDS = 30
+# How long a miss waits for another process that is already loading the same key
+PEER_WAIT_SECONDS = 5
+
+
+class _NotModified:
+    def __repr__(self) -> str:
+        return "NOT_MODIFIED"
+
+
+# Returned by a loader when the upstream copy matches the cached one
+NOT_MODIFIED = _NotModified()
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    fetched_at: float = 0.0
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    digest: Optional[str] = None
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for revalidating this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+# loader(previous_entry) -> new CacheEntry, or NOT_MODIFIED to keep the previous one.
+# The cache stamps fetched_at itself.
+Loader = Callable[[Optional[CacheEntry]], Any]
+
+
+def body_digest(body: bytes) -> str:
+    """Content hash used to detect unchanged payloads when the upstream sends no validators."""
+    return hashlib.sha1(body).hexdigest()
+
+
+class CacheBackend(abc.ABC):
+    """
+    Storage behind SWRCache and RecordStore.
+
+    Implementations must be safe to use from several threads; shared ones
+    also from several processes at once (SQLiteBackend on one host, a
+    networked store registered with ``register_backend`` across hosts).
+    Leases let one process claim the refresh of a key so others do not
+    repeat the same upstream call.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, entry: CacheEntry) -> None:
+        ...
+
+    def set_many(self, items: Iterable[Tuple[str, CacheEntry]]) -> None:
+        """Store many entries (bulk loads); backends may do this in one transaction."""
+        for key, entry in items:
+            self.set(key, entry)
+
+    def touch(self, key: str, fetched_at: float) -> None:
+        """Mark an unchanged entry as re-fetched without rewriting its payload (``version`` stays the same)."""
+        entry = self.get(key)
+        if entry is not None:
+            self.set(key, replace(entry, fetched_at=fetched_at))
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        ...
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abc.abstractmethod
+    def version(self) -> str:
+        """Token that changes whenever an entry is stored or deleted; one cheap lookup, no key scan."""
+        ...
+
+    @abc.abstractmethod
+    def acquire_lease(self, name: str, owner: str, seconds: float) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def release_lease(self, name: str, owner: str) -> None:
+        ...
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Per-process dict; the default. With ``max_entries`` it is an LRU: storing
+    a new key beyond the limit evicts the least recently used one.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._writes += 1
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def touch(self, key: str, fetched_at: float) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = replace(entry, fetched_at=fetched_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._writes += 1
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        with self._lock:
+            return iter([k for k in self._entries if k.startswith(prefix)])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._writes += 1
+
+    def version(self) -> str:
+        return f"{self._token}:{self._writes}"
+
+    def acquire_lease(self, name: str, owner: str, seconds: float) -> bool:
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder and holder[0] != owner and holder[1] > now:
+                return False
+            self._leases[name] = (owner, now + seconds)
+            return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    File-backed store shared by every process on a host.
+
+    Uses WAL mode so readers never block the single writer, one connection per
+    thread, and pickled values. ``table`` lets several stores (HTTP cache,
+    merged records) share one database file. WAL needs the processes on one
+    machine; do not put the file on a network filesystem.
+
+    Values are unpickled on read, so anyone who can write to the file can run
+    code in every process that reads it: keep it in a directory only the
+    service account can write.
+    """
+
+    def __init__(self, path: str, table: str = "cache", timeout: float = 30.0):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name '{table}'")
+        self.path = str(path)
+        self.table = table
+        self.timeout = timeout
+        self._local = threading.local()
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "fetched_at REAL NOT NULL, etag TEXT, last_modified TEXT, digest TEXT)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+        # Write counter per table, bumped by triggers so every writer (in any process) counts
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, token TEXT NOT NULL, writes INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO versions VALUES (?, ?, 0)", (table, uuid.uuid4().hex))
+        bump = f"BEGIN UPDATE versions SET writes = writes + 1 WHERE name = '{table}'; END"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_insert_version AFTER INSERT ON {table} {bump}")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_update_version AFTER UPDATE OF value ON {table} {bump}")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_delete_version AFTER DELETE ON {table} {bump}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; multi-statement updates open explicit transactions
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        row = self._conn().execute(
+            f"SELECT value, fetched_at, etag, last_modified, digest FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, fetched_at, etag, last_modified, digest = row
+        return CacheEntry(pickle.loads(value), fetched_at, etag, last_modified, digest)
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        self._conn().execute(
+            f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?)",
+            (key, pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL),
+             entry.fetched_at, entry.etag, entry.last_modified, entry.digest),
+        )
+
+    def set_many(self, items: Iterable[Tuple[str, CacheEntry]]) -> None:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?, ?)",
+                ((key, pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL),
+                  entry.fetched_at, entry.etag, entry.last_modified, entry.digest) for key, entry in items),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def touch(self, key: str, fetched_at: float) -> None:
+        self._conn().execute(f"UPDATE {self.table} SET fetched_at = ? WHERE key = ?", (fetched_at, key))
+
+    def delete(self, key: str) -> None:
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def keys(self, prefix: str = "") -> Iterator[str]:
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self._conn().execute(f"SELECT key FROM {self.table} WHERE key LIKE ? ESCAPE '\\'", (pattern,))
+        return (row[0] for row in rows.fetchall())
+
+    def clear(self) -> None:
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+    def version(self) -> str:
+        token, writes = self._conn().execute(
+            "SELECT token, writes FROM versions WHERE name = ?", (self.table,)
+        ).fetchone()
+        return f"{token}:{writes}"
+
+    def acquire_lease(self, name: str, owner: str, seconds: float) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE name = ? AND (expires <= ? OR owner = ?)", (name, now, owner))
+            cur = conn.execute("INSERT OR IGNORE INTO leases VALUES (?, ?, ?)", (name, owner, now + seconds))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+
+# Entry limits for in-process tables. Upstream responses (one per rsID, tissue
+# filter and page) can always be refetched, so the HTTP cache is bounded;
+# merged records are kept in full.
+MEMORY_MAX_ENTRIES = {"http": 20000}
+
+# URL scheme -> factory(path, table). A networked store (e.g. Redis) plugs in here.
+_BACKENDS: Dict[str, Callable[[str, str], CacheBackend]] = {
+    "memory": lambda path, table: MemoryBackend(max_entries=MEMORY_MAX_ENTRIES.get(table)),
+    "sqlite": lambda path, table: SQLiteBackend(path, table=table),
+}
+
+
+def register_backend(scheme: str, factory: Callable[[str, str], CacheBackend]) -> None:
+    _BACKENDS[scheme] = factory
+
+
+def backend_from_url(url: Optional[str] = None, table: str = "cache") -> CacheBackend:
+    """
+    Build a backend from a URL such as ``memory://`` or ``sqlite:///var/cache/variants.db``.
+    Defaults to the VARIANT_CACHE_URL environment variable, then ``memory://``.
+    """
+    url = url or os.environ.get("VARIANT_CACHE_URL") or "memory://"
+    scheme, sep, path = url.partition("://")
+    if not sep or scheme not in _BACKENDS:
+        raise ValueError(f"Unsupported cache URL '{url}' (known schemes: {', '.join(_BACKENDS)})")
+    return _BACKENDS[scheme](path, table)
+
+
+def is_shared_backend(url: Optional[str] = None) -> bool:
+    """Whether ``url`` (default: VARIANT_CACHE_URL) is visible to other processes, i.e. not ``memory://``."""
+    url = url or os.environ.get("VARIANT_CACHE_URL") or "memory://"
+    return url.partition("://")[0] != "memory"
+
+
+@dataclass
+class CacheStats:
+    fresh_hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    revalidations: int = 0
+    not_modified: int = 0
+    stored: int = 0
+    errors: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class SWRCache:
+    """
+    Stale-while-revalidate cache over a CacheBackend.
+
+    ``get`` returns a fresh entry directly, returns a stale entry immediately
+    while a background refresh runs (at most one per key), and only blocks on
+    a miss or when an entry is older than ``max_stale``. Loaders receive the
+    previous entry so they can send conditional requests and report
+    NOT_MODIFIED; in that case only the timestamp is bumped and the stored
+    payload is left untouched.
+
+    With a shared backend, refreshes are coordinated across processes by
+    leases: only the lease holder revalidates a stale key, and a miss on a key
+    another process is already loading waits briefly for its result.
+    """
+
+    def __init__(self, fresh_ttl: float = FRESH_TTL, max_stale: float = MAX_STALE,
+                 clock: Callable[[], float] = time.time, max_workers: int = 4,
+                 backend: Optional[CacheBackend] = None):
+        self.fresh_ttl = fresh_ttl
+        self.max_stale = max_stale
+        self.clock = clock
+        self.stats = CacheStats()
+        self.backend = backend or MemoryBackend()
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swr-revalidate")
+        self._local = threading.local()
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        return self.backend.get(key)
+
+    def _count(self, stat: str) -> None:
+        # Request threads and revalidation workers update the same counters
+        with self._lock:
+            setattr(self.stats, stat, getattr(self.stats, stat) + 1)
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        self.backend.set(key, entry)
+
+    def set(self, key: str, value: Any) -> None:
+        """Store ``value`` as freshly fetched (for callers that load in batches outside ``get``)."""
+        self.put(key, CacheEntry(value=value, fetched_at=self.clock()))
+
+    def age(self, entry: CacheEntry) -> float:
+        return self.clock() - entry.fetched_at
+
+    @contextmanager
+    def foreground(self):
+        """
+        Within this block (on this thread), stale entries are revalidated
+        before ``get`` returns instead of in the background. For callers that
+        stamp what they build as fresh, such as the cache warmer.
+        """
+        outer = getattr(self._local, "foreground", False)
+        self._local.foreground = True
+        try:
+            yield
+        finally:
+            self._local.foreground = outer
+
+    def get(self, key: str, loader: Loader) -> Tuple[Any, str]:
+        """Return (value, state) where state is FRESH, STALE or MISS."""
+        entry = self.peek(key)
+
+        if entry is not None:
+            age = self.age(entry)
+            if age < self.fresh_ttl:
+                self._count("fresh_hits")
+                return entry.value, FRESH
+            if age < self.fresh_ttl + self.max_stale and not getattr(self._local, "foreground", False):
+                self._count("stale_hits")
+                self.revalidate_async(key, loader)
+                return entry.value, STALE
+
+        # Miss (too stale to serve, or foreground mode): load now, unless a peer
+        # process is already loading this key and finishes quickly
+        self._count("misses")
+        if not self.backend.acquire_lease(key, self.owner, LEASE_SECONDS):
+            peer_entry = self._wait_for_peer(key, entry)
+            if peer_entry is not None:
+                return peer_entry.value, MISS
+        try:
+            entry = self._refresh(key, loader, entry)
+        finally:
+            self.backend.release_lease(key, self.owner)
+        return entry.value, MISS
+
+    def _wait_for_peer(self, key: str, previous: Optional[CacheEntry]) -> Optional[CacheEntry]:
+        """
+        The entry a peer stores for ``key`` within PEER_WAIT_SECONDS, or None
+        to load it here. Stops early once the peer's lease is gone (it failed
+        or stored nothing); the lease is then held by this process.
+        """
+        deadline = time.monotonic() + PEER_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = self.peek(key)
+            if entry is not None and (previous is None or entry.fetched_at > previous.fetched_at):
+                return entry
+            if self.backend.acquire_lease(key, self.owner, LEASE_SECONDS):
+                return None
+        return None
+
+    def revalidate_async(self, key: str, loader: Loader) -> bool:
+        """Schedule a background refresh unless one is already running for ``key`` here or in a peer."""
+        with self._lock:
+            if key in self._inflight:
+                return False
+            if not self.backend.acquire_lease(key, self.owner, LEASE_SECONDS):
+                return False
+            self._inflight[key] = threading.Event()
+        self._executor.submit(self._background_refresh, key, loader)
+        return True
+
+    def wait(self, key: str, timeout: Optional[float] = None) -> None:
+        """Block until any in-flight refresh for ``key`` finishes (used by tests and warmers)."""
+        with self._lock:
+            event = self._inflight.get(key)
+        if event is not None:
+            event.wait(timeout)
+
+    def _background_refresh(self, key: str, loader: Loader) -> None:
+        try:
+            self._refresh(key, loader, self.peek(key))
+        except Exception as e:
+            # Keep serving the stale copy; the next request will try again
+            self._count("errors")
+            logger.warning("Background revalidation of %s failed: %s", key, e)
+        finally:
+            self.backend.release_lease(key, self.owner)
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event is not None:
+                event.set()
+
+    def _refresh(self, key: str, loader: Loader, previous: Optional[CacheEntry]) -> CacheEntry:
+        if previous is not None:
+            self._count("revalidations")
+        result = loader(previous)
+        now = self.clock()
+
+        if result is NOT_MODIFIED:
+            if previous is None:
+                raise RuntimeError(f"Loader for {key} returned NOT_MODIFIED without a cached entry")
+            self._count("not_modified")
+            self.backend.touch(key, now)
+            return replace(previous, fetched_at=now)
+
+        self._count("stored")
+        entry = replace(result, fetched_at=now)
+        self.put(key, entry)
+        return entry
+
+    def clear(self) -> None:
+        self.backend.clear()
@@ -0,0 +1,617 @@
+"""
+Cohort queries over stored merged records.
+
+``CohortIndex`` flattens merged records into columns (one row per variant,
+plus an eQTL table with one row per association) and keeps sorted secondary
+indexes on the main score columns, so a query like
+
+    cadd_phred>20, af_total<0.01, eQTL in brain with p <= 1e-6
+
+starts from the most selective index range and only evaluates the remaining
+conditions on those rows.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from eqtl_table import CATEGORICAL_COLUMNS as EQTL_CATEGORICAL_COLUMNS
+from eqtl_table import FLOAT_COLUMNS as EQTL_FLOAT_COLUMNS
+from eqtl_table import EQTLTable, resolve_tissues
+from record_store import RECORD_STORE, RecordStore
+
+logger = logging.getLogger(__name__)
+
+# Column name -> path into the merged record
+NUMERIC_FIELDS = {
+    "position": ("favor_annotation", "basic_info", "position"),
+    "cadd_phred": ("favor_annotation", "pathogenicity_scores", "cadd_phred"),
+    "sift_score": ("favor_annotation", "pathogenicity_scores", "sift", "score"),
+    "polyphen_score": ("favor_annotation", "pathogenicity_scores", "polyphen2", "score"),
+    "alphamissense_score": ("favor_annotation", "pathogenicity_scores", "alphamissense", "score"),
+    "gerp": ("favor_annotation", "pathogenicity_scores", "gerp"),
+    "af_total": ("favor_annotation", "population_frequencies", "global"),
+    "af_afr": ("favor_annotation", "population_frequencies", "african"),
+    "af_nfe": ("favor_annotation", "population_frequencies", "european"),
+    "af_eas": ("favor_annotation", "population_frequencies", "east_asian"),
+    "af_sas": ("favor_annotation", "population_frequencies", "south_asian"),
+    "af_amr": ("favor_annotation", "population_frequencies", "latino"),
+    "af_asj": ("favor_annotation", "population_frequencies", "ashkenazi"),
+    "af_fin": ("favor_annotation", "population_frequencies", "finnish"),
+    "top_eqtl_pvalue": ("summary", "top_eqtl_pvalue"),
+    "alphagenome_max_score": ("summary", "alphagenome_max_score"),
+}
+
+CATEGORICAL_FIELDS = {
+    "chromosome": ("favor_annotation", "basic_info", "chromosome"),
+    "gene": ("summary", "gene"),
+    "consequence": ("favor_annotation", "basic_info", "consequence"),
+    "clinvar": ("summary", "clinvar"),
+    "top_eqtl_gene": ("summary", "top_eqtl_gene"),
+    "top_eqtl_tissue": ("summary", "top_eqtl_tissue"),
+}
+
+# Derived from the eQTL table rather than read from the record
+COUNT_COLUMNS = ("eqtl_count",)
+
+COLUMNS = ("variant_id",) + tuple(CATEGORICAL_FIELDS) + tuple(NUMERIC_FIELDS) + COUNT_COLUMNS
+
+# Columns with a sorted secondary index (the usual cohort thresholds)
+DEFAULT_INDEXED = ("cadd_phred", "af_total", "alphamissense_score", "alphagenome_max_score", "top_eqtl_pvalue")
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10_000
+
+# Locus plots: y = -log10(eQTL p-value) per association, or a variant column
+LOCUS_EQTL_METRIC = "eqtl_pvalue"
+
+# After the store changes, rebuild the shared index at most this often
+DEFAULT_REFRESH_SECONDS = 10
+
+# File in a saved index directory naming the current build (first line) and the one before it
+CURRENT_POINTER = "CURRENT"
+
+_CONDITION = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|==|=|<|>)\s*(.+?)\s*$")
+
+
+@dataclass(frozen=True)
+class Condition:
+    """``column op value``; categorical equality may list alternatives, e.g. gene=APOE|TOMM40."""
+    column: str
+    op: str
+    value: Union[float, Tuple[str, ...]]
+
+
+def parse_condition(text: str) -> Condition:
+    """Parse "cadd_phred>20" / "clinvar=Pathogenic|Likely_pathogenic" (ValueError if malformed)."""
+    match = _CONDITION.match(text)
+    if not match:
+        raise ValueError(f"Cannot parse condition {text!r} (expected e.g. 'cadd_phred>20')")
+    column, op, raw = match.groups()
+    op = "==" if op == "=" else op
+    if column in CATEGORICAL_FIELDS:
+        if op not in ("==", "!="):
+            raise ValueError(f"{column} is categorical; only = and != are supported")
+        return Condition(column, op, tuple(v.strip() for v in raw.split("|")))
+    if column in NUMERIC_FIELDS or column in COUNT_COLUMNS:
+        try:
+            return Condition(column, op, float(raw))
+        except ValueError:
+            raise ValueError(f"{column} needs a number, got {raw!r}") from None
+    raise ValueError(f"Unknown column {column!r}; choose from {', '.join(COLUMNS[1:])}")
+
+
+def parse_conditions(spec: Union[None, str, Iterable[str]]) -> List[Condition]:
+    """Conditions from a comma/newline separated string or an iterable of strings."""
+    if spec is None:
+        return []
+    if isinstance(spec, str):
+        spec = re.split(r"[,\n]", spec)
+    return [parse_condition(part) for part in spec if part.strip()]
+
+
+@dataclass(frozen=True)
+class EQTLCondition:
+    """Variant has at least one eQTL matching all of: tissue, gene, p-value <= max_pvalue."""
+    tissues: Optional[Tuple[str, ...]] = None
+    genes: Optional[Tuple[str, ...]] = None
+    max_pvalue: Optional[float] = None
+
+    def __bool__(self) -> bool:
+        return any(v is not None for v in (self.tissues, self.genes, self.max_pvalue))
+
+
+def eqtl_condition(tissue: Optional[str] = None, gene: Optional[str] = None,
+                   max_pvalue: Optional[float] = None) -> EQTLCondition:
+    """From UI/query-string values: tissue spec as in ``resolve_tissues``, comma-separated genes."""
+    genes = tuple(g.strip() for g in gene.split(",") if g.strip()) if gene else None
+    return EQTLCondition(tissues=resolve_tissues(tissue), genes=genes or None, max_pvalue=max_pvalue)
+
+
+class SortedIndex:
+    """
+    Row ids ordered by a numeric column (missing values last). Range
+    conditions become two binary searches and a slice of ``order``.
+    """
+
+    __slots__ = ("order", "values", "n_valid")
+
+    def __init__(self, order: np.ndarray, values: np.ndarray):
+        self.order = order
+        self.values = values
+        self.n_valid = int(np.count_nonzero(~np.isnan(values)))
+
+    @classmethod
+    def build(cls, column: np.ndarray) -> "SortedIndex":
+        order = np.argsort(column, kind="stable")
+        return cls(order, column[order])
+
+    def span(self, op: str, value: float) -> Tuple[int, int]:
+        """[start, stop) of ``order`` whose values satisfy ``op value``."""
+        valid = self.values[:self.n_valid]
+        if op == "<":
+            return 0, int(np.searchsorted(valid, value, "left"))
+        if op == "<=":
+            return 0, int(np.searchsorted(valid, value, "right"))
+        if op == ">":
+            return int(np.searchsorted(valid, value, "right")), self.n_valid
+        if op == ">=":
+            return int(np.searchsorted(valid, value, "left")), self.n_valid
+        if op == "==":
+            return int(np.searchsorted(valid, value, "left")), int(np.searchsorted(valid, value, "right"))
+        raise ValueError(f"{op} cannot use a sorted index")
+
+    def rows(self, op: str, value: float) -> np.ndarray:
+        start, stop = self.span(op, value)
+        return self.order[start:stop]
+
+
+@dataclass
+class CohortResult:
+    rows: pd.DataFrame
+    total: int          # matches before offset/limit
+    scanned: int        # rows evaluated after the index lookup
+    elapsed_ms: float
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "returned": len(self.rows),
+            "elapsed_ms": round(self.elapsed_ms, 3),
+            "rows": json.loads(self.rows.to_json(orient="records")),
+        }
+
+
+def _path(record: dict, path: Sequence[str]) -> Any:
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+class CohortIndex:
+    """
+    Columnar, indexed view of many merged records.
+
+    Variant columns are float64 arrays or pandas Categoricals (row i is
+    ``variant_ids[i]``); eQTLs are one EQTLTable with ``eqtl_variant`` giving
+    each association's variant row. Immutable: rebuild (``from_store``) to
+    pick up new records.
+    """
+
+    def __init__(self, variant_ids: np.ndarray, columns: Dict[str, Any], eqtls: EQTLTable,
+                 eqtl_variant: np.ndarray, indexed: Iterable[str] = DEFAULT_INDEXED,
+                 indexes: Optional[Dict[str, SortedIndex]] = None):
+        self.variant_ids = variant_ids
+        self.columns = columns
+        self.eqtls = eqtls
+        self.eqtl_variant = eqtl_variant
+        if "eqtl_count" not in columns:
+            columns["eqtl_count"] = np.bincount(eqtl_variant, minlength=len(variant_ids))
+        indexes = dict(indexes) if indexes is not None else {col: SortedIndex.build(columns[col]) for col in indexed}
+        self.eqtl_pvalue_index = indexes.pop("eqtl_p_value", None) or SortedIndex.build(eqtls.p_value)
+        self.indexes = indexes
+
+    # ---------- construction ----------
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict], indexed: Iterable[str] = DEFAULT_INDEXED) -> "CohortIndex":
+        """Build from merged records; a repeated variant_id keeps the last record."""
+        latest = {}
+        for merged in records:
+            latest[merged.get("variant_id")] = merged
+        records = list(latest.values())
+
+        columns: Dict[str, Any] = {
+            col: np.array([_number(_path(r, path)) for r in records], dtype=np.float64)
+            for col, path in NUMERIC_FIELDS.items()
+        }
+        for col, path in CATEGORICAL_FIELDS.items():
+            columns[col] = pd.Categorical([_text(_path(r, path)) for r in records])
+
+        tables, owners = [], []
+        for row, merged in enumerate(records):
+            table = EQTLTable.coerce((merged.get("gtex_eqtls") or {}).get("associations"))
+            if len(table):
+                tables.append(table)
+                owners.append(np.full(len(table), row, dtype=np.int64))
+        eqtl_variant = np.concatenate(owners) if owners else np.array([], dtype=np.int64)
+
+        variant_ids = np.array([str(r.get("variant_id")) for r in records], dtype=str)
+        return cls(variant_ids, columns, EQTLTable.concat(tables), eqtl_variant, indexed)
+
+    @classmethod
+    def from_store(cls, store: RecordStore, indexed: Iterable[str] = DEFAULT_INDEXED) -> "CohortIndex":
+        return cls.from_records(store.records(), indexed)
+
+    def __len__(self) -> int:
+        return len(self.variant_ids)
+
+    # ---------- querying ----------
+
+    def query(self, where: Union[None, str, Iterable[Union[str, Condition]]] = None,
+              eqtl: Optional[EQTLCondition] = None, sort_by: Optional[str] = None,
+              descending: bool = False, limit: Optional[int] = DEFAULT_LIMIT, offset: int = 0,
+              columns: Optional[Sequence[str]] = None) -> CohortResult:
+        """
+        Variants matching every condition in ``where`` (and ``eqtl``), sorted
+        by ``sort_by`` (missing values last; insertion order if None), paged
+        by ``offset``/``limit``.
+        """
+        start = time.perf_counter()
+        conditions = [c if isinstance(c, Condition) else parse_condition(c)
+                      for c in (parse_conditions(where) if isinstance(where, str) else where or [])]
+        if sort_by is not None and sort_by not in self.columns:
+            raise ValueError(f"Unknown sort column {sort_by!r}")
+
+        # Most selective indexed range first; everything else is checked on its rows
+        candidates: Optional[np.ndarray] = None
+        remaining = list(conditions)
+        indexable = [c for c in conditions if c.column in self.indexes and c.op != "!="]
+        if indexable:
+            best = min(indexable, key=lambda c: self._index_size(c))
+            candidates = self._ascending(self.indexes[best.column].rows(best.op, best.value))
+            remaining.remove(best)
+
+        if eqtl:
+            hits = self._eqtl_hits(eqtl)
+            candidates = np.flatnonzero(hits) if candidates is None else candidates[hits[candidates]]
+
+        scanned = len(self) if candidates is None else len(candidates)
+        if remaining:
+            mask = np.ones(scanned, dtype=bool)
+            for condition in remaining:
+                mask &= self._evaluate(condition, candidates)
+            candidates = np.flatnonzero(mask) if candidates is None else candidates[mask]
+        elif candidates is None:
+            candidates = np.arange(len(self))
+
+        page = self._page(candidates, sort_by, descending, limit, offset)
+        return CohortResult(
+            rows=self._frame(page, columns),
+            total=len(candidates),
+            scanned=scanned,
+            elapsed_ms=(time.perf_counter() - start) * 1000,
+        )
+
+    def _index_size(self, condition: Condition) -> int:
+        start, stop = self.indexes[condition.column].span(condition.op, condition.value)
+        return max(stop - start, 0)
+
+    def _ascending(self, rows: np.ndarray) -> np.ndarray:
+        """Row ids in table order (a bitmap pass beats sorting for large ranges)."""
+        if len(rows) * 16 < len(self):
+            return np.sort(rows)
+        mask = np.zeros(len(self), dtype=bool)
+        mask[rows] = True
+        return np.flatnonzero(mask)
+
+    def _evaluate(self, condition: Condition, rows: Optional[np.ndarray]) -> np.ndarray:
+        column = self.columns[condition.column]
+        if isinstance(column, pd.Categorical):
+            codes = column.codes if rows is None else column.codes[rows]
+            hit = _category_lookup(column, condition.value)[codes]
+            return hit if condition.op == "==" else ~hit
+        values = column if rows is None else column[rows]
+        op, value = condition.op, condition.value
+        if op == "<":
+            return values < value
+        if op == "<=":
+            return values <= value
+        if op == ">":
+            return values > value
+        if op == ">=":
+            return values >= value
+        if op == "==":
+            return values == value
+        return values != value
+
+    def _eqtl_hits(self, eqtl: EQTLCondition) -> np.ndarray:
+        """Per variant row: True if at least one association matches ``eqtl``."""
+        rows = self.eqtl_pvalue_index.rows("<=", eqtl.max_pvalue) if eqtl.max_pvalue is not None else None
+        for values, column in ((eqtl.tissues, self.eqtls.tissue), (eqtl.genes, self.eqtls.gene)):
+            if values is not None:
+                lookup = _category_lookup(column, values)
+                rows = np.flatnonzero(lookup[column.codes]) if rows is None else rows[lookup[column.codes[rows]]]
+        owners = self.eqtl_variant if rows is None else self.eqtl_variant[rows]
+        hits = np.zeros(len(self), dtype=bool)
+        hits[owners] = True
+        return hits
+
+    def _page(self, rows: np.ndarray, sort_by: Optional[str], descending: bool,
+              limit: Optional[int], offset: int) -> np.ndarray:
+        stop = None if limit is None else offset + limit
+        if sort_by is None:
+            return rows[offset:stop]
+
+        column = self.columns[sort_by]
+        if isinstance(column, pd.Categorical):
+            codes = column.codes[rows]
+            keys = np.where(codes < 0, np.nan, codes.astype(np.float64))  # categories are sorted
+        else:
+            keys = np.asarray(column[rows], dtype=np.float64)
+        keys = -keys if descending else keys
+        keys = np.nan_to_num(keys, nan=np.inf)  # missing values last either way
+        # Partial selection of the first ``stop`` rows before sorting only those
+        if stop is not None and stop < len(rows):
+            head = np.argpartition(keys, stop - 1)[:stop]
+        else:
+            head = np.arange(len(rows))
+        head = head[np.argsort(keys[head], kind="stable")]
+        return rows[head[offset:]]
+
+    def _frame(self, rows: np.ndarray, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        names = [c for c in (columns or COLUMNS) if c == "variant_id" or c in self.columns]
+        data = {}
+        for name in names:
+            values = self.variant_ids if name == "variant_id" else self.columns[name]
+            data[name] = values[rows]
+        return pd.DataFrame(data, copy=False)
+
+    # ---------- locus view ----------
+
+    def locus(self, chromosome: str, start: Optional[float] = None, end: Optional[float] = None,
+              metric: str = LOCUS_EQTL_METRIC) -> pd.DataFrame:
+        """
+        Points for a locus plot on ``chromosome`` between ``start`` and ``end``:
+        one per eQTL with value = -log10(p) for ``metric="eqtl_pvalue"``,
+        otherwise one per variant with value = that numeric column (e.g. cadd_phred).
+        Columns: position, value, gene, tissue, variant_id.
+        """
+        chromosomes = self.columns["chromosome"]
+        lookup = _category_lookup(chromosomes, [re.sub(r"^chr", "", str(chromosome), flags=re.I)])
+        position = self.columns["position"]
+        in_locus = lookup[chromosomes.codes] & ~np.isnan(position)
+        if start is not None:
+            in_locus &= position >= start
+        if end is not None:
+            in_locus &= position <= end
+
+        if metric == LOCUS_EQTL_METRIC:
+            rows = np.flatnonzero(in_locus[self.eqtl_variant] & (self.eqtls.p_value > 0))
+            owners = self.eqtl_variant[rows]
+            # p-values below float precision would be -log10(0) = inf
+            value = -np.log10(np.maximum(self.eqtls.p_value[rows], 1e-300))
+            gene, tissue = self.eqtls.gene[rows], self.eqtls.tissue[rows]
+        else:
+            if metric not in NUMERIC_FIELDS:
+                raise ValueError(f"Unknown locus metric {metric!r}")
+            owners = np.flatnonzero(in_locus & ~np.isnan(self.columns[metric]))
+            value = self.columns[metric][owners]
+            gene, tissue = self.columns["gene"][owners], self.columns["top_eqtl_tissue"][owners]
+
+        return pd.DataFrame({
+            "position": position[owners],
+            "value": value,
+            "gene": gene,
+            "tissue": tissue,
+            "variant_id": self.variant_ids[owners],
+        }, copy=False)
+
+    # ---------- storage ----------
+
+    def save(self, path: Union[str, Path]) -> None:
+        """One .npy file per column plus ``meta.json`` (categories); loadable with mmap."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        meta = {"variant": {}, "eqtl": {}, "indexed": list(self.indexes)}
+
+        np.save(path / "variant_id.npy", self.variant_ids)
+        for name, column in self.columns.items():
+            meta["variant"][name] = _save_column(path / f"v_{name}.npy", column)
+        for name in EQTL_CATEGORICAL_COLUMNS + EQTL_FLOAT_COLUMNS:
+            meta["eqtl"][name] = _save_column(path / f"e_{name}.npy", getattr(self.eqtls, name))
+        np.save(path / "eqtl_variant.npy", self.eqtl_variant)
+        for name, index in dict(self.indexes, eqtl_p_value=self.eqtl_pvalue_index).items():
+            np.save(path / f"i_{name}.npy", index.order)
+
+        (path / "meta.json").write_text(json.dumps(meta))
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "CohortIndex":
+        """Load a saved index; with ``mmap`` the numeric arrays are paged in on demand."""
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+        mode = "r" if mmap else None
+
+        columns = {name: _load_column(path / f"v_{name}.npy", categories, mode)
+                   for name, categories in meta["variant"].items()}
+        eqtls = EQTLTable(*(_load_column(path / f"e_{name}.npy", meta["eqtl"][name], mode)
+                            for name in EQTL_CATEGORICAL_COLUMNS + EQTL_FLOAT_COLUMNS))
+        indexes = {}
+        for name in meta["indexed"] + ["eqtl_p_value"]:
+            order = np.load(path / f"i_{name}.npy", mmap_mode=mode)
+            values = eqtls.p_value if name == "eqtl_p_value" else columns[name]
+            indexes[name] = SortedIndex(order, values[order])
+
+        return cls(np.load(path / "variant_id.npy"), columns, eqtls,
+                   np.load(path / "eqtl_variant.npy", mmap_mode=mode), indexes=indexes)
+
+
+class CohortCache:
+    """
+    The current CohortIndex over a record store.
+
+    ``get`` compares the store's write version with the one the index was
+    built from (one lookup, no key scan). When the store has changed, the
+    current index keeps answering while a new one is built on a background
+    thread, at most once per ``refresh_seconds``; only the first build blocks.
+
+    With ``path``, each build is saved in a directory there, and at startup
+    a saved index that is still current is loaded memory-mapped instead of
+    being rebuilt from the records.
+    """
+
+    def __init__(self, store: RecordStore = RECORD_STORE, refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+                 clock: Callable[[], float] = time.monotonic, path: Union[None, str, Path] = None):
+        self.store = store
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self.path = Path(path) if path else None
+        self._index: Optional[CohortIndex] = None
+        self._version: Optional[str] = None
+        self._built_at = 0.0
+        self._rebuild: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> CohortIndex:
+        version = self.store.version()
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_or_build(version)
+                self._version, self._built_at = version, self.clock()
+            elif (version != self._version and self._rebuild is None
+                  and self.clock() - self._built_at >= self.refresh_seconds):
+                self._rebuild = threading.Thread(target=self._rebuild_in_background, args=(version,),
+                                                 name="cohort-rebuild", daemon=True)
+                self._rebuild.start()
+            return self._index
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until a background rebuild in progress finishes (used by tests)."""
+        thread = self._rebuild
+        if thread is not None:
+            thread.join(timeout)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._index = None
+
+    def _rebuild_in_background(self, version: str) -> None:
+        try:
+            index = CohortIndex.from_store(self.store)
+            self._save(index, version)
+            with self._lock:
+                self._index, self._version = index, version
+        except Exception:
+            logger.exception("Rebuilding the cohort index failed")
+        finally:
+            with self._lock:
+                self._built_at = self.clock()
+                self._rebuild = None
+
+    def _load_or_build(self, version: str) -> CohortIndex:
+        build = _current_build(self.path) if self.path is not None else None
+        if build is not None and _saved_version(build) == version:
+            try:
+                return CohortIndex.load(build)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Ignoring unreadable cohort index at %s: %s", build, e)
+        index = CohortIndex.from_store(self.store)
+        self._save(index, version)
+        return index
+
+    def _save(self, index: CohortIndex, version: str) -> None:
+        """
+        Write the index to a new build directory, then switch the CURRENT
+        pointer to it with one atomic rename, so readers always find a
+        complete index. The build it replaces is kept for readers that may
+        still be opening it; the one before that is removed.
+        """
+        if self.path is None:
+            return
+        suffix = f"{os.getpid()}-{threading.get_ident()}-{time.time_ns()}"
+        build = self.path / f"build-{suffix}"
+        pointer = self.path / f"{CURRENT_POINTER}.tmp-{suffix}"
+        try:
+            index.save(build)
+            (build / "store_version").write_text(version)
+            replaced = _read_pointer(self.path)
+            pointer.write_text("\n".join([build.name] + replaced[:1]))
+            os.replace(pointer, self.path / CURRENT_POINTER)
+        except OSError as e:
+            logger.warning("Could not save the cohort index to %s: %s", self.path, e)
+            shutil.rmtree(build, ignore_errors=True)
+            pointer.unlink(missing_ok=True)
+            return
+        for name in replaced[1:]:
+            if name != build.name:
+                shutil.rmtree(self.path / name, ignore_errors=True)
+
+
+def _read_pointer(path: Path) -> List[str]:
+    try:
+        return [name for name in (path / CURRENT_POINTER).read_text().split() if name.startswith("build-")]
+    except OSError:
+        return []
+
+
+def _current_build(path: Path) -> Optional[Path]:
+    names = _read_pointer(path)
+    return path / names[0] if names else None
+
+
+def _saved_version(build: Path) -> Optional[str]:
+    try:
+        return (build / "store_version").read_text()
+    except OSError:
+        return None
+
+
+# Shared by the Streamlit app and the REST API; VARIANT_COHORT_INDEX persists it
+COHORT = CohortCache(path=os.environ.get("VARIANT_COHORT_INDEX"))
+
+
+def _category_lookup(column: pd.Categorical, values: Iterable[str]) -> np.ndarray:
+    """Boolean table indexed by category code; the extra last slot makes code -1 (missing) False."""
+    lookup = np.zeros(len(column.categories) + 1, dtype=bool)
+    codes = column.categories.get_indexer(list(values))
+    lookup[codes[codes >= 0]] = True
+    return lookup
+
+
+def _save_column(file: Path, column: Any) -> Optional[List[Any]]:
+    """Save values (or category codes); returns the categories, None for numeric columns."""
+    if isinstance(column, pd.Categorical):
+        np.save(file, column.codes)
+        return [c.item() if isinstance(c, np.generic) else c for c in column.categories]
+    np.save(file, np.asarray(column))
+    return None
+
+
+def _load_column(file: Path, categories: Optional[List[Any]], mode: Optional[str]) -> Any:
+    if categories is None:
+        return np.load(file, mmap_mode=mode)
+    return pd.Categorical.from_codes(np.load(file), categories=categories)
@@ -4,6 +4,10 @@ import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
 
+from eqtl_table import EQTLTable
+from projection import APP_FAVOR_FIELDS, FAVOR_CHART_FIELDS, FAVOR_TABLE_COLUMNS  # noqa: F401 (re-exported)
+
+
 def create_population_frequency_chart(favor_df: pd.DataFrame, variant_id: str) -> go.Figure:
     """Create population allele frequency bar chart"""
 
@@ -41,35 +45,31 @@ def create_population_frequency_chart(favor_df: pd.DataFrame, variant_id: str) -
     return fig
 
 def create_eqtl_heatmap(GTEx_data, variant_id):
-    """Creates eQTL heatmap figure"""
-    if not GTEx_data or "eqtl_results" not in GTEx_data:
+    """Creates eQTL heatmap figure from an EQTLTable or raw GTEx response"""
+    if isinstance(GTEx_data, dict) and "eqtl_results" not in GTEx_data:
         return None
 
-    gtex_df = pd.DataFrame(GTEx_data["eqtl_results"])
-    gtex_df["Tissue"] = gtex_df["tissueSiteDetailId"].str.replace("_", " ")
+    eqtls = EQTLTable.coerce(GTEx_data)
+    if not len(eqtls):
+        return None
 
-    heatmap_data = gtex_df.pivot_table(
-        index="geneSymbol", columns="Tissue", values="nes", aggfunc="first"
-    )
-    pval_data = gtex_df.pivot_table(
-        index="geneSymbol", columns="Tissue", values="pValue", aggfunc="first"
-    )
+    genes, tissues, nes_matrix = eqtls.matrix("effect_size")
+    _, _, pval_matrix = eqtls.matrix("p_value")
+    tissue_labels = [t.replace("_", " ") for t in tissues]
 
     # Build annotations
     annotations = []
-    for i, gene in enumerate(heatmap_data.index):
+    for nes_row, pval_row in zip(nes_matrix, pval_matrix):
         row_annotations = []
-        for j, tissue in enumerate(heatmap_data.columns):
-            nes = heatmap_data.iloc[i, j]
-            pval = pval_data.iloc[i, j]
+        for nes, pval in zip(nes_row, pval_row):
             text = f"{nes:.3f}<br>p={pval:.2e}" if pd.notna(nes) else ""
             row_annotations.append(text)
         annotations.append(row_annotations)
 
     fig = go.Figure(data=go.Heatmap(
-        z=heatmap_data.values,
-        x=heatmap_data.columns,
-        y=heatmap_data.index,
+        z=nes_matrix,
+        x=tissue_labels,
+        y=genes,
         colorscale="RdBu_r",
         zmid=0,
         text=annotations,
@@ -254,3 +254,97 @@ def create_functional_annotation_landscape(favor_df: pd.DataFrame, variant_id: s
     )
 
     return fig
+
+
+# Locus plots: above this many points, draw one marker per occupied bin instead
+LOCUS_MAX_POINTS = 20_000
+LOCUS_X_BINS = 400
+LOCUS_Y_BINS = 50
+LOCUS_MAX_GROUPS = 12
+
+
+def bin_locus_points(points: pd.DataFrame, x_bins: int = LOCUS_X_BINS, y_bins: int = LOCUS_Y_BINS) -> pd.DataFrame:
+    """
+    Aggregate locus points to at most ``x_bins * y_bins`` rows: per occupied
+    (x bin, y bin) cell, the highest point in it (which keeps its gene/tissue
+    for colouring) with ``count`` of points it stands for. Peaks keep their
+    height and the outline of dense regions survives.
+    """
+    if points.empty:
+        return points.assign(count=np.array([], dtype=np.int64))
+
+    x = points["position"].to_numpy(dtype=np.float64)
+    y = points["value"].to_numpy(dtype=np.float64)
+
+    def bin_of(values, n):
+        lo, hi = values.min(), values.max()
+        span = hi - lo if hi > lo else 1.0
+        return np.minimum(((values - lo) / span * n).astype(np.int64), n - 1)
+
+    key = bin_of(x, x_bins) * y_bins + bin_of(y, y_bins)
+    # Highest point first, so each bin's first occurrence is its representative
+    order = np.argsort(-y, kind="stable")
+    _, first, counts = np.unique(key[order], return_index=True, return_counts=True)
+    binned = points.iloc[order[first]].reset_index(drop=True)
+    binned["count"] = counts
+    return binned
+
+
+def create_locus_plot(points: pd.DataFrame, title: str, y_label: str = "-log10(eQTL p-value)",
+                      color_by: str = "gene", x_range=None, max_points: int = LOCUS_MAX_POINTS) -> go.Figure:
+    """
+    Position vs ``value`` for a locus (see ``CohortIndex.locus``), one WebGL
+    trace per ``color_by`` group. Only points in ``x_range`` are drawn; more
+    than ``max_points`` of them are binned server-side, so zooming in (a new
+    ``x_range``) re-bins at finer resolution until raw points fit.
+    """
+    if x_range is not None:
+        lo, hi = x_range
+        points = points[(points["position"] >= lo) & (points["position"] <= hi)]
+
+    fig = go.Figure()
+    if points.empty:
+        fig.add_annotation(text="No stored variants in this region", xref="paper", yref="paper",
+                           x=0.5, y=0.5, showarrow=False, font=dict(size=16))
+        fig.update_layout(height=300)
+        return fig
+
+    binned = len(points) > max_points
+    shown = bin_locus_points(points) if binned else points.assign(count=1)
+
+    # Largest groups get their own colour; the rest share "Other"
+    groups = shown[color_by].astype(object).where(shown[color_by].notna(), "Unknown")
+    top = points[color_by].value_counts().index[:LOCUS_MAX_GROUPS]
+    groups = groups.where(groups.isin(top) | (groups == "Unknown"), "Other")
+
+    palette = px.colors.qualitative.Plotly
+    for i, (name, part) in enumerate(shown.groupby(groups.to_numpy(), sort=False)):
+        if binned:
+            size = np.minimum(4 + 2 * np.log2(part["count"].to_numpy()), 14)
+            hover = part["count"].astype(str) + " points, max " + part["value"].round(2).astype(str)
+        else:
+            size = 6
+            hover = part["variant_id"].astype(str) + "<br>" + part["tissue"].astype(str)
+        fig.add_trace(go.Scattergl(
+            x=part["position"],
+            y=part["value"],
+            mode="markers",
+            name=str(name),
+            marker=dict(size=size, color="#9e9e9e" if name in ("Other", "Unknown") else palette[i % len(palette)],
+                        opacity=0.8),
+            text=hover,
+            hovertemplate="%{x:,}<br>%{y:.2f}<br>%{text}<extra>" + str(name) + "</extra>",
+        ))
+
+    subtitle = (f"{len(points):,} points in {len(shown):,} bins — select a region to zoom"
+                if binned else f"{len(points):,} points")
+    fig.update_layout(
+        title=f"{title}<br><sup>{subtitle}</sup>",
+        xaxis_title="Position",
+        yaxis_title=y_label,
+        height=500,
+        dragmode="select",
+        legend_title=color_by.capitalize(),
+        uirevision=title,  # keep legend toggles across re-binning reruns
+    )
+    return fig
@@ -0,0 +1,267 @@
+import hashlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+import numpy as np
+import pandas as pd
+
+
+# GTEx singleTissueEqtl keys -> column names used in merged records and exports
+GTEX_FIELDS = {
+    "snpId": "snp_id",
+    "geneSymbol": "gene",
+    "tissueSiteDetailId": "tissue",
+    "nes": "effect_size",
+    "pValue": "p_value",
+    "gencodeId": "gencode_id",
+}
+
+CATEGORICAL_COLUMNS = ("snp_id", "gene", "tissue", "gencode_id")
+FLOAT_COLUMNS = ("effect_size", "p_value")
+COLUMNS = ("snp_id", "gene", "tissue", "effect_size", "p_value", "gencode_id")
+
+# GTEx v8 single-tissue eQTL tissues (tissueSiteDetailId)
+GTEX_TISSUES = (
+    "Adipose_Subcutaneous", "Adipose_Visceral_Omentum", "Adrenal_Gland",
+    "Artery_Aorta", "Artery_Coronary", "Artery_Tibial",
+    "Brain_Amygdala", "Brain_Anterior_cingulate_cortex_BA24", "Brain_Caudate_basal_ganglia",
+    "Brain_Cerebellar_Hemisphere", "Brain_Cerebellum", "Brain_Cortex", "Brain_Frontal_Cortex_BA9",
+    "Brain_Hippocampus", "Brain_Hypothalamus", "Brain_Nucleus_accumbens_basal_ganglia",
+    "Brain_Putamen_basal_ganglia", "Brain_Spinal_cord_cervical_c-1", "Brain_Substantia_nigra",
+    "Breast_Mammary_Tissue", "Cells_Cultured_fibroblasts", "Cells_EBV-transformed_lymphocytes",
+    "Colon_Sigmoid", "Colon_Transverse",
+    "Esophagus_Gastroesophageal_Junction", "Esophagus_Mucosa", "Esophagus_Muscularis",
+    "Heart_Atrial_Appendage", "Heart_Left_Ventricle", "Kidney_Cortex", "Liver", "Lung",
+    "Minor_Salivary_Gland", "Muscle_Skeletal", "Nerve_Tibial", "Ovary", "Pancreas", "Pituitary",
+    "Prostate", "Skin_Not_Sun_Exposed_Suprapubic", "Skin_Sun_Exposed_Lower_leg",
+    "Small_Intestine_Terminal_Ileum", "Spleen", "Stomach", "Testis", "Thyroid", "Uterus",
+    "Vagina", "Whole_Blood",
+)
+
+
+def resolve_tissues(spec: Union[None, str, Iterable[str]]) -> Optional[Tuple[str, ...]]:
+    """
+    Expand a tissue filter into GTEx tissueSiteDetailIds.
+
+    Accepts a comma-separated string or an iterable. Exact IDs are kept as-is;
+    other names match tissues by case-insensitive prefix, so ``"brain"`` expands
+    to all 13 Brain_* tissues. Returns None when there is no filter.
+    """
+    if spec is None:
+        return None
+    names = spec.split(",") if isinstance(spec, str) else spec
+    names = [n.strip() for n in names if n and n.strip()]
+    if not names:
+        return None
+
+    resolved = []
+    for name in names:
+        if name in GTEX_TISSUES:
+            matches = [name]
+        else:
+            prefix = name.lower().replace(" ", "_")
+            matches = [t for t in GTEX_TISSUES if t.lower().startswith(prefix)]
+        if not matches:
+            raise ValueError(f"Unknown GTEx tissue '{name}'")
+        resolved.extend(m for m in matches if m not in resolved)
+    return tuple(resolved)
+
+
+def row_passes(row: Dict[str, Any], tissues: Optional[Iterable[str]] = None,
+               max_pvalue: Optional[float] = None) -> bool:
+    """Filter predicate on a raw GTEx row, for use while streaming pages."""
+    if tissues is not None and row.get("tissueSiteDetailId") not in tissues:
+        return False
+    if max_pvalue is not None:
+        p = row.get("pValue")
+        if p is None or p > max_pvalue:
+            return False
+    return True
+
+
+class EQTLTable:
+    """
+    Struct-of-arrays container for eQTL associations.
+
+    Effect sizes and p-values are float64 arrays; SNP, gene, tissue and gencode
+    IDs are pandas Categoricals, so each distinct string is stored once. Behaves
+    like a read-only sequence of association dicts for JSON export and
+    backwards compatibility with code that indexes ``associations[i]["gene"]``.
+    """
+
+    __slots__ = ("snp_id", "gene", "tissue", "gencode_id", "effect_size", "p_value")
+
+    def __init__(self, snp_id: pd.Categorical, gene: pd.Categorical, tissue: pd.Categorical,
+                 gencode_id: pd.Categorical, effect_size: np.ndarray, p_value: np.ndarray):
+        self.snp_id = snp_id
+        self.gene = gene
+        self.tissue = tissue
+        self.gencode_id = gencode_id
+        self.effect_size = effect_size
+        self.p_value = p_value
+
+    # ---------- construction ----------
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], fields: Optional[Dict[str, str]] = None) -> "EQTLTable":
+        """Build from dicts; ``fields`` maps source keys to column names (GTEx keys by default)."""
+        fields = GTEX_FIELDS if fields is None else fields
+        records = records if isinstance(records, list) else list(records)
+        columns = {col: [r.get(key) for r in records] for key, col in fields.items()}
+
+        return cls(
+            *(pd.Categorical(columns.get(col, [None] * len(records))) for col in CATEGORICAL_COLUMNS),
+            *(np.array(columns.get(col, [None] * len(records)), dtype=np.float64) for col in FLOAT_COLUMNS),
+        )
+
+    @classmethod
+    def from_gtex(cls, gtex_data: Optional[Dict[str, Any]]) -> "EQTLTable":
+        """Build from a ``fetch_gtex`` response (empty table if there are no results)."""
+        results = (gtex_data or {}).get("eqtl_results")
+        if isinstance(results, cls):
+            return results
+        return cls.from_records(results or [])
+
+    @classmethod
+    def empty(cls) -> "EQTLTable":
+        return cls.from_records([])
+
+    @classmethod
+    def coerce(cls, data: Any) -> "EQTLTable":
+        """
+        Accept any of the shapes eQTLs travel in: an EQTLTable, a raw GTEx
+        response dict, or a list of association dicts (GTEx or merged keys).
+        """
+        if isinstance(data, cls):
+            return data
+        if not data:
+            return cls.empty()
+        if isinstance(data, dict):
+            return cls.from_gtex(data)
+        first = data[0]
+        if "geneSymbol" in first or "pValue" in first:
+            return cls.from_records(data)
+        return cls.from_records(data, fields={col: col for col in COLUMNS})
+
+    @classmethod
+    def concat(cls, tables: Sequence["EQTLTable"]) -> "EQTLTable":
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+        return cls(
+            *(_union_concat([getattr(t, col) for t in tables]) for col in CATEGORICAL_COLUMNS),
+            *(np.concatenate([getattr(t, col) for t in tables]) for col in FLOAT_COLUMNS),
+        )
+
+    # ---------- sequence protocol ----------
+
+    def __len__(self) -> int:
+        return len(self.p_value)
+
+    @overload
+    def __getitem__(self, i: int) -> Dict[str, Any]: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "EQTLTable": ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Dict[str, Any], "EQTLTable"]:
+        if isinstance(i, slice):
+            return self.take(np.arange(len(self))[i])
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("eQTL index out of range")
+        return {col: _scalar(getattr(self, col)[i]) for col in COLUMNS}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.to_records())
+
+    def __repr__(self) -> str:
+        return f"EQTLTable({len(self)} associations, {len(self.gene.categories)} genes, {len(self.tissue.categories)} tissues)"
+
+    # ---------- views ----------
+
+    def take(self, indices: np.ndarray) -> "EQTLTable":
+        """Row subset; unused categories are dropped so the codes stay dense."""
+        indices = np.asarray(indices, dtype=np.intp)
+        return EQTLTable(
+            *(getattr(self, col)[indices].remove_unused_categories() for col in CATEGORICAL_COLUMNS),
+            *(getattr(self, col)[indices] for col in FLOAT_COLUMNS),
+        )
+
+    def filter(self, tissues: Optional[Iterable[str]] = None, max_pvalue: Optional[float] = None) -> "EQTLTable":
+        """Rows in ``tissues`` with p-value <= ``max_pvalue`` (missing p-values fail a p filter)."""
+        mask = np.ones(len(self), dtype=bool)
+        if tissues is not None:
+            mask &= np.asarray(self.tissue.isin(list(tissues)))
+        if max_pvalue is not None:
+            mask &= self.p_value <= max_pvalue  # NaN compares False
+        return self if mask.all() else self.take(np.flatnonzero(mask))
+
+    def top_k(self, k: int) -> "EQTLTable":
+        """
+        The ``k`` most significant associations, ascending by p-value.
+        Uses a partial selection (O(n)) before sorting only the k winners;
+        missing p-values rank last.
+        """
+        n = len(self)
+        if k <= 0 or n == 0:
+            return self.take(np.array([], dtype=np.intp))
+        p = np.nan_to_num(self.p_value, nan=np.inf)
+        if k < n:
+            idx = np.argpartition(p, k - 1)[:k]
+        else:
+            idx = np.arange(n)
+        idx = idx[np.argsort(p[idx], kind="stable")]
+        return self.take(idx)
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame over the underlying arrays (no per-row conversion)."""
+        return pd.DataFrame({col: getattr(self, col) for col in COLUMNS}, copy=False)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Plain association dicts, NaN/missing values as None (JSON-safe)."""
+        columns = {col: _to_list(getattr(self, col)) for col in COLUMNS}
+        return [dict(zip(COLUMNS, row)) for row in zip(*columns.values())]
+
+    def digest(self) -> str:
+        """Content hash of the table (arrays and category values), for change detection."""
+        h = hashlib.sha1()
+        for col in CATEGORICAL_COLUMNS:
+            column = getattr(self, col)
+            h.update("\x1f".join(map(str, column.categories)).encode())
+            h.update(np.ascontiguousarray(column.codes).tobytes())
+        for col in FLOAT_COLUMNS:
+            h.update(np.ascontiguousarray(getattr(self, col)).tobytes())
+        return h.hexdigest()
+
+    def matrix(self, values: str = "effect_size") -> Tuple[List[str], List[str], np.ndarray]:
+        """
+        Gene x tissue matrix of ``values`` (first association wins), built
+        directly from the category codes. Returns (genes, tissues, matrix).
+        """
+        genes = list(self.gene.categories)
+        tissues = list(self.tissue.categories)
+        z = np.full((len(genes), len(tissues)), np.nan)
+
+        g, t = self.gene.codes, self.tissue.codes
+        keep = (g >= 0) & (t >= 0)
+        # Reverse so the first occurrence of a (gene, tissue) pair is written last
+        idx = np.flatnonzero(keep)[::-1]
+        z[g[idx], t[idx]] = getattr(self, values)[idx]
+        return genes, tissues, z
+
+
+def _union_concat(categoricals: List[pd.Categorical]) -> pd.Categorical:
+    return pd.api.types.union_categoricals(categoricals, sort_categories=True)
+
+
+def _scalar(value: Any) -> Any:
+    if pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _to_list(values: Any) -> List[Any]:
+    return [None if pd.isna(v) else v for v in values.tolist()]
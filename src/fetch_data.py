@@ -1,122 +1,365 @@
-from typing import Optional, Dict, Any
+import json
+import sys
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, FrozenSet, Iterable, Callable, List, Tuple
+from urllib.parse import urlencode
 import requests
-import streamlit as st
 
+from alphagenome_client import AlphaGenomeScorer, default_scorer, variants_from_favor
+from cache import SWRCache, CacheEntry, NOT_MODIFIED, backend_from_url, body_digest
+from eqtl_table import row_passes
+from projection import parse_favor, project_favor
+from resilience import CircuitBreaker, CircuitOpenError, Provider
 
-def fetch_favor(variant_id: str) -> Optional[Dict[str, Any]]:
-    """Fetch functional annotation from FAVOR API"""
+REQUEST_TIMEOUT = 10
+
+MOCK_DIR = Path(__file__).parent.parent / "data" / "mock_data"
+
+# Upstream GET responses (parsed), served stale-while-revalidate. Shared by every
+# session in this process, and by every worker process on the host when
+# VARIANT_CACHE_URL points at a shared backend (e.g. sqlite:///var/cache/variants.db)
+HTTP_CACHE = SWRCache(backend=backend_from_url(table="http"))
+
+
+class UpstreamError(Exception):
+    """Non-200, non-304 response from an upstream API."""
+
+    def __init__(self, status_code: int, text: str = ""):
+        super().__init__(f"Status {status_code}")
+        self.status_code = status_code
+        self.text = text
+
+
+def _in_script() -> bool:
+    # Progress messages only make sense inside a Streamlit script run; background
+    # jobs (cache warmer, workers) call the same fetchers without one, and
+    # without importing Streamlit at all.
+    if "streamlit" not in sys.modules:
+        return False
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return False
+    return get_script_run_ctx(suppress_warning=True) is not None
+
+
+# Messages of fetchers run through collect_messages on this thread
+_collected = threading.local()
+
+
+def _emit(level: str, msg: str) -> None:
+    messages = getattr(_collected, "messages", None)
+    if messages is not None:
+        messages.append((level, msg))
+    elif _in_script():
+        import streamlit as st
+        getattr(st, level)(msg)
+
+
+def _ui_write(msg: str) -> None:
+    _emit("write", msg)
+
+
+def _ui_warning(msg: str) -> None:
+    _emit("warning", msg)
+
+
+def _ui_error(msg: str) -> None:
+    _emit("error", msg)
+
+
+def collect_messages(fetch: Callable[..., Any], *args, **kwargs) -> Tuple[Any, List[Tuple[str, str]]]:
+    """
+    Call ``fetch`` and return (result, messages): the ("write" | "warning" |
+    "error", text) pairs it would have shown. Pool threads have no Streamlit
+    script context, so the app renders these on the script thread instead.
+    """
+    outer = getattr(_collected, "messages", None)
+    messages: List[Tuple[str, str]] = []
+    _collected.messages = messages
+    try:
+        result = fetch(*args, **kwargs)
+    finally:
+        _collected.messages = outer
+    return result, messages
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """True for errors that mean the upstream is unhealthy (5xx, 429, timeouts, open breaker), not e.g. a 404."""
+    if isinstance(error, UpstreamError):
+        return error.status_code >= 500 or error.status_code == 429
+    return True
+
+
+# One breaker / latency window per upstream, shared across sessions
+PROVIDERS = {
+    "favor": Provider("favor", CircuitBreaker("favor"), is_failure=is_upstream_failure),
+    "gtex": Provider("gtex", CircuitBreaker("gtex"), is_failure=is_upstream_failure),
+}
+
+
+def cache_key(url: str, params: Optional[Dict[str, Any]] = None, variant: str = "") -> str:
+    """Stable key for a GET request; ``variant`` distinguishes different parses of the same body."""
+    query = urlencode(sorted((params or {}).items()), doseq=True)
+    return f"{url}?{query}#{variant}"
+
+
+def _get(url: str, params: Optional[Dict[str, Any]], headers: Dict[str, str]) -> requests.Response:
+    resp = requests.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+    if resp.status_code not in (200, 304):
+        raise UpstreamError(resp.status_code, resp.text)
+    return resp
+
+
+def _http_loader(url: str, params: Optional[Dict[str, Any]], parse: Callable[[bytes], Any], provider: Provider):
+    def load(previous: Optional[CacheEntry]):
+        headers = previous.conditional_headers() if previous else {}
+        resp = provider.call(lambda: _get(url, params, headers))
+
+        if resp.status_code == 304:
+            if previous is None:
+                raise UpstreamError(304, "Not Modified without a cached copy")
+            return NOT_MODIFIED
+
+        # Upstream ignored the validators (or sent none) but the body is unchanged
+        digest = body_digest(resp.content)
+        if previous is not None and previous.digest == digest:
+            return NOT_MODIFIED
+
+        return CacheEntry(
+            value=parse(resp.content),
+            etag=resp.headers.get("ETag"),
+            last_modified=resp.headers.get("Last-Modified"),
+            digest=digest,
+        )
+    return load
+
+
+def cached_get_json(url: str, params: Optional[Dict[str, Any]] = None,
+                    parse: Callable[[bytes], Any] = json.loads, variant: str = "", *,
+                    provider: str) -> Tuple[Any, str]:
+    """
+    GET ``url`` through HTTP_CACHE and the circuit breaker of ``provider``
+    (a PROVIDERS key). Returns (parsed body, cache state).
+
+    Expired entries are returned immediately and revalidated in the background
+    with If-None-Match / If-Modified-Since. If a foreground load fails because
+    the upstream is unhealthy, any cached copy is served regardless of age
+    (state "stale-if-error"). Raises UpstreamError / CircuitOpenError /
+    requests exceptions otherwise; errors are never cached.
+    """
+    params = dict(params) if params else None  # callers reuse and mutate their params dict
+    key = cache_key(url, params, variant)
+    try:
+        return HTTP_CACHE.get(key, _http_loader(url, params, parse, PROVIDERS[provider]))
+    except Exception as e:
+        entry = HTTP_CACHE.peek(key)
+        if entry is None or not is_upstream_failure(e):
+            raise
+        return entry.value, "stale-if-error"
+
+
+def load_mock(provider: str, rsid: str) -> Optional[Any]:
+    """Local fallback payload from data/mock_data/{provider}_{rsid}.json, if one exists."""
+    path = MOCK_DIR / f"{provider}_{rsid}.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def fetch_favor(variant_id: str, fields: Optional[FrozenSet[str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Fetch functional annotation from FAVOR API.
+
+    If ``fields`` is given, only those tracks are kept while the body is parsed
+    (and cached). Returns [] when FAVOR answers that it has no such variant.
+    When FAVOR is down or its breaker is open, falls back to local mock data
+    for the variant; returns None if there is nothing to show.
+    """
     try:
         url = f"https://api.genohub.org/v1/rsids/{variant_id}"  # variant_id in path
 
-        st.write(f"Requesting {url}")
+        _ui_write(f"Requesting {url}")
 
-        response = requests.get(url, timeout=10)  # No params needed
+        data, state = cached_get_json(
+            url,
+            parse=lambda body: parse_favor(body, fields),
+            variant=",".join(sorted(fields)) if fields is not None else "",
+            provider="favor",
+        )
 
-        st.write(f"Status code: {response.status_code}")
+        _ui_write(f"Status: 200 ({state})")
+        return data
 
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"FAVOR API returned status {response.status_code}")
-            return {"error": f"Status {response.status_code}", "response": response.text}
+    except UpstreamError as e:
+        if not is_upstream_failure(e):
+            _ui_error(f"FAVOR API returned status {e.status_code}")
+            return []
+        error = e
 
     except Exception as e:
-        st.error(f"FAVOR API error: {e}")
-        return {"error": str(e)}
+        error = e
+
+    mock = load_mock("favor", variant_id)
+    if mock is not None:
+        _ui_warning(f"FAVOR unavailable ({error}); showing local mock data.")
+        return project_favor(mock, fields)
+
+    _ui_error(f"FAVOR API error: {error}")
+    return None
 
 GTEX_BASE = "https://gtexportal.org/api/v2"
 
-def fetch_gtex(rsid: str) -> Optional[Dict[str, Any]]:
+GTEX_PAGE_SIZE = 250
+GTEX_MAX_PAGES = 20
+
+def fetch_gtex(rsid: str, tissues: Optional[Iterable[str]] = None,
+               max_pvalue: Optional[float] = None) -> Optional[Dict[str, Any]]:
     """
     Fetch GTEx regulatory (eQTL) data for a given rsID.
+
+    Falls back to local mock data when GTEx is down or its breaker is open.
+    Errors carry ``"not_found": True`` when GTEx answered that it has no
+    eQTLs for the variant, as opposed to being unavailable.
+
+    ``tissues`` (tissueSiteDetailIds, see ``resolve_tissues``) is pushed down
+    into the GTEx query. GTEx has no p-value parameter, so ``max_pvalue`` is
+    applied to each page as it arrives; rejected rows never reach the result.
     """
 
     # 1. First lookup: convert rsID → variantId
     variant_lookup_url = f"{GTEX_BASE}/dataset/variant"
     params = {"snpId": rsid, "datasetId": "gtex_v8"}
 
-    st.write(f"**GTEx Step 1:** Requesting {variant_lookup_url}")
-    st.write(f"Params: {params}")
+    _ui_write(f"**GTEx Step 1:** Requesting {variant_lookup_url}")
+    _ui_write(f"Params: {params}")
 
     try:
-        resp = requests.get(variant_lookup_url, params=params)
-        st.write(f"Status code: {resp.status_code}")
-
-        if resp.status_code != 200:
-            return {"error": f"GTEx lookup failed with {resp.status_code}"}
-
-        variant_json = resp.json()
+        variant_json, state = cached_get_json(variant_lookup_url, params, provider="gtex")
+        _ui_write(f"Status: 200 ({state})")
 
         if not variant_json.get("data"):
-            return {"error": f"rsID {rsid} not found in GTEx v8"}
+            return {"error": f"rsID {rsid} not found in GTEx v8", "not_found": True}
 
         variant_id = variant_json["data"][0]["variantId"]
-        st.write(f"Found variantId: {variant_id}")
+        _ui_write(f"Found variantId: {variant_id}")
+
+    except UpstreamError as e:
+        if is_upstream_failure(e):
+            return _gtex_fallback(rsid, tissues, max_pvalue, e)
+        return {"error": f"GTEx lookup failed with {e.status_code}", "not_found": True}
 
     except Exception as e:
-        return {"error": f"Error during GTEx variant lookup: {e}"}
+        return _gtex_fallback(rsid, tissues, max_pvalue, e)
 
-    # 2. Second call: get eQTL associations
+    # 2. Second call: get eQTL associations, page by page
     eqtl_url = f"{GTEX_BASE}/association/singleTissueEqtl"
     eqtl_params = {
         "variantId": variant_id,
         "datasetId": "gtex_v8",
         "page": 0,
-        "itemsPerPage": 250,
+        "itemsPerPage": GTEX_PAGE_SIZE,
     }
+    if tissues is not None:
+        tissues = tuple(tissues)
+        eqtl_params["tissueSiteDetailId"] = list(tissues)
 
-    st.write(f"**GTEx Step 2:** Requesting {eqtl_url}")
-    st.write(f"Params: {eqtl_params}")
+    _ui_write(f"**GTEx Step 2:** Requesting {eqtl_url}")
+    _ui_write(f"Params: {eqtl_params}")
 
+    results = []
+    scanned = 0
+    paging = {}
     try:
-        eqtl_resp = requests.get(eqtl_url, params=eqtl_params)
-        st.write(f"Status code: {eqtl_resp.status_code}")
+        while eqtl_params["page"] < GTEX_MAX_PAGES:
+            eqtl_json, state = cached_get_json(eqtl_url, eqtl_params, provider="gtex")
+            _ui_write(f"Page {eqtl_params['page']} status: 200 ({state})")
+            page_rows = eqtl_json.get("data", [])
+            paging = eqtl_json.get("paging_info", {})
+            scanned += len(page_rows)
 
-        if eqtl_resp.status_code != 200:
-            return {"error": f"GTEx eQTL fetch failed with {eqtl_resp.status_code}"}
+            # Tissues are re-checked in case the server ignored the filter
+            results.extend(r for r in page_rows if row_passes(r, tissues, max_pvalue))
 
-        eqtl_json = eqtl_resp.json()
+            eqtl_params["page"] += 1
+            if eqtl_params["page"] >= paging.get("numberOfPages", 1) or not page_rows:
+                break
 
         return {
             "rsid": rsid,
             "variantId": variant_id,
-            "eqtl_results": eqtl_json.get("data", []),
-            "paging": eqtl_json.get("paging_info", {}),
+            "eqtl_results": results,
+            "paging": paging,
+            "filters": {"tissues": tissues, "max_pvalue": max_pvalue, "scanned": scanned},
         }
 
+    except UpstreamError as e:
+        if is_upstream_failure(e):
+            return _gtex_fallback(rsid, tissues, max_pvalue, e)
+        return {"error": f"GTEx eQTL fetch failed with {e.status_code}", "not_found": True}
+
     except Exception as e:
-        return {"error": f"Error during GTEx eQTL fetch: {e}"}
+        return _gtex_fallback(rsid, tissues, max_pvalue, e)
 
-def fetch_alphagenome(chromosome: str, position: str, ref: str, alt: str, gene: str) -> Optional[Dict[str, Any]]:
-    """
-    Fetch AlphaGenome/AlphaMissense data
 
-    Note: Replace with actual AlphaGenome API endpoint
-    """
-    try:
-        # Example API structure - adjust based on actual AlphaGenome API
-        url = "https://api.alphagenome.org/v1/variant"  # Replace with real endpoint
-
-        params = {
-            "chromosome": chromosome,
-            "position": position,
-            "reference": ref,
-            "alternate": alt,
-            "gene": gene
-        }
+def _gtex_fallback(rsid: str, tissues: Optional[Iterable[str]], max_pvalue: Optional[float],
+                   error: Exception) -> Dict[str, Any]:
+    """Degrade to local mock eQTLs (same filters applied) when GTEx is unavailable."""
+    mock = load_mock("gtex", rsid)
+    if mock is None:
+        return {"error": f"GTEx unavailable: {error}"}
 
-        st.write(f"**AlphaGenome:** Requesting {url}")
-        st.write(f"Params: {params}")
+    _ui_warning(f"GTEx unavailable ({error}); showing local mock data.")
+    tissues = tuple(tissues) if tissues is not None else None
+    return dict(
+        mock,
+        eqtl_results=[r for r in mock.get("eqtl_results", []) if row_passes(r, tissues, max_pvalue)],
+        source="mock",
+    )
 
-        response = requests.get(url, params=params, timeout=10)
-        st.write(f"Status code: {response.status_code}")
+# Not looked up yet; None once looked up means AlphaGenome is not configured
+_SCORER_UNSET = object()
+_alphagenome_scorer: Any = _SCORER_UNSET
+_alphagenome_lock = threading.Lock()
 
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"AlphaGenome API returned status {response.status_code}")
-            return None
 
-    except Exception as e:
-        st.error(f"AlphaGenome API error: {e}")
+def get_alphagenome_scorer() -> Optional[AlphaGenomeScorer]:
+    """Process-wide AlphaGenome scorer, created on first use; None when not configured."""
+    global _alphagenome_scorer
+    with _alphagenome_lock:
+        if _alphagenome_scorer is _SCORER_UNSET:
+            _alphagenome_scorer = default_scorer()
+            if _alphagenome_scorer is not None:
+                PROVIDERS["alphagenome"] = _alphagenome_scorer.provider
+    return _alphagenome_scorer
+
+
+def fetch_alphagenome(favor_data: Optional[list],
+                      scorer: Optional[AlphaGenomeScorer] = None) -> Optional[Dict[str, Any]]:
+    """
+    Score the variant(s) in a FAVOR response with AlphaGenome.
+
+    Alleles come from FAVOR's ``variant_vcf``. Returns the scores for the
+    first variant (``{"variant": "chr19:44908684:T>C", ...}``), or None if
+    AlphaGenome is not configured or FAVOR gave no usable allele.
+    """
+    scorer = scorer or get_alphagenome_scorer()
+    if scorer is None:
+        _ui_write("**AlphaGenome:** not configured (set ALPHAGENOME_API_KEY)")
         return None
+
+    variants = variants_from_favor(favor_data)
+    if not variants:
+        _ui_write("**AlphaGenome:** no allele found in FAVOR response")
+        return None
+
+    _ui_write(f"**AlphaGenome:** scoring {len(variants)} variant(s)")
+    scores = scorer.score(variants)
+
+    chrom, pos, ref, alt = variants[0]
+    result = {"variant": f"{chrom}:{pos}:{ref}>{alt}", **scores[variants[0]]}
+    if "error" in result:
+        _ui_error(f"AlphaGenome error: {result['error']}")
+    return result
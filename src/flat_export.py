@@ -0,0 +1,189 @@
+"""
+Flat (CSV or Parquet) exports of the record store that are patched, not regenerated.
+
+Rows from ``merge_api.to_flat_csv`` are split by variant into hash buckets,
+one part file each, and ``manifest.json`` records every variant's bucket and
+source hashes (``merged["sources"]``). A sync only rewrites the buckets
+holding new, changed or removed variants:
+
+    python src/flat_export.py exports/variants --format parquet
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import zlib
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+import pandas as pd
+
+from merge_api import export_to_json, to_flat_csv
+from record_store import RECORD_STORE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = 64
+FORMATS = ("csv", "parquet")
+MANIFEST = "manifest.json"
+
+
+@dataclass
+class SyncReport:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    buckets_written: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def record_version(merged: dict) -> Dict[str, Optional[str]]:
+    """Source hashes of a merged record; records stored before hashes existed fall back to a JSON hash."""
+    sources = merged.get("sources")
+    if sources:
+        return dict(sources)
+    body = dict(merged, query_timestamp=None)
+    return {"record": hashlib.sha1(export_to_json(body).encode()).hexdigest()}
+
+
+def bucket_of(variant_id: str, buckets: int) -> int:
+    return zlib.crc32(variant_id.encode()) % buckets
+
+
+class PartitionedExport:
+    """
+    A directory of bucketed part files plus a manifest.
+
+    The bucket count and format are fixed when the export is created; opening
+    an existing directory keeps them.
+    """
+
+    def __init__(self, path: str, buckets: int = DEFAULT_BUCKETS, format: str = "csv"):
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}, got {format!r}")
+        self.path = Path(path)
+        manifest = self.path / MANIFEST
+        if manifest.exists():
+            meta = json.loads(manifest.read_text())
+            buckets, format = meta["buckets"], meta["format"]
+            self.variants: Dict[str, dict] = meta["variants"]
+        else:
+            self.variants = {}
+        if format == "parquet":
+            _require_parquet()
+        self.buckets = buckets
+        self.format = format
+
+    def part_path(self, bucket: int) -> Path:
+        return self.path / f"part-{bucket:05d}.{self.format}"
+
+    def parts(self) -> List[Path]:
+        return sorted(self.path.glob(f"part-*.{self.format}"))
+
+    def read(self) -> pd.DataFrame:
+        """All rows (part order, not variant order)."""
+        frames = [self._read_part(p) for p in self.parts()]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def sync(self, records: Iterable[dict], prune: bool = True) -> SyncReport:
+        """
+        Bring the export up to date with ``records``: changed and new variants
+        are re-flattened and their buckets rewritten. With ``prune``, variants
+        missing from ``records`` are removed.
+        """
+        report = SyncReport()
+        rows: Dict[str, pd.DataFrame] = {}
+        seen: Set[str] = set()
+        for merged in records:
+            variant_id = merged.get("variant_id")
+            if not variant_id or variant_id in seen:
+                continue
+            seen.add(variant_id)
+            version = record_version(merged)
+            entry = self.variants.get(variant_id)
+            if entry is not None and entry["sources"] == version:
+                report.unchanged += 1
+                continue
+            (report.changed if entry is not None else report.added).append(variant_id)
+            rows[variant_id] = to_flat_csv(merged)
+            self.variants[variant_id] = {"bucket": bucket_of(variant_id, self.buckets), "sources": version}
+
+        if prune:
+            report.removed = [v for v in self.variants if v not in seen]
+
+        dirty: Dict[int, Set[str]] = {}
+        for variant_id in [*rows, *report.removed]:
+            dirty.setdefault(self.variants[variant_id]["bucket"], set()).add(variant_id)
+        for variant_id in report.removed:
+            del self.variants[variant_id]
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        for bucket, variant_ids in dirty.items():
+            self._rewrite(bucket, variant_ids, [rows[v] for v in variant_ids if v in rows])
+        report.buckets_written = len(dirty)
+        if dirty or not (self.path / MANIFEST).exists():
+            self._write_manifest()
+        return report
+
+    def _rewrite(self, bucket: int, replaced: Set[str], new_rows: List[pd.DataFrame]) -> None:
+        path = self.part_path(bucket)
+        frames = []
+        if path.exists():
+            existing = self._read_part(path)
+            frames.append(existing[~existing["variant_id"].isin(replaced)])
+        frames.extend(new_rows)
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            path.unlink(missing_ok=True)
+            return
+        tmp = path.with_name(path.name + ".tmp")
+        self._write_part(pd.concat(frames, ignore_index=True), tmp)
+        os.replace(tmp, path)
+
+    def _read_part(self, path: Path) -> pd.DataFrame:
+        if self.format == "parquet":
+            return pd.read_parquet(path)
+        # Read as text so untouched rows are written back exactly as they were
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+    def _write_part(self, df: pd.DataFrame, path: Path) -> None:
+        if self.format == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+
+    def _write_manifest(self) -> None:
+        manifest = self.path / MANIFEST
+        tmp = manifest.with_name(MANIFEST + ".tmp")
+        tmp.write_text(json.dumps({"format": self.format, "buckets": self.buckets, "variants": self.variants}))
+        os.replace(tmp, manifest)
+
+
+def _require_parquet() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("Parquet exports need pyarrow (pip install pyarrow)") from None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the record store as patchable CSV/Parquet parts.")
+    parser.add_argument("out", help="export directory")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="part files (new exports only)")
+    parser.add_argument("--keep-removed", action="store_true", help="keep variants no longer in the store")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    export = PartitionedExport(args.out, buckets=args.buckets, format=args.format)
+    report = export.sync(RECORD_STORE.records(), prune=not args.keep_removed)
+    print(json.dumps({k: len(v) if isinstance(v, list) else v for k, v in report.as_dict().items()}))
+
+
+if __name__ == "__main__":
+    main()
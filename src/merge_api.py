@@ -1,114 +1,225 @@
 import pandas as pd
+import hashlib
 import json
 from io import StringIO
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from eqtl_table import EQTLTable
 
-def merge_variant_data(favor_data: list, gtex_data: dict, variant_id: str) -> dict:
+
+DEFAULT_TOP_K = 5
+
+
+# Merged-record section built from each source, and the summary keys each source fills
+SOURCE_SECTIONS = {"favor": "favor_annotation", "gtex": "gtex_eqtls", "alphagenome": "alphagenome_scores"}
+SUMMARY_KEYS = {
+    "favor": ("gene", "global_af", "clinvar"),
+    "gtex": ("top_eqtl_gene", "top_eqtl_tissue", "top_eqtl_pvalue", "top_eqtls"),
+    "alphagenome": ("alphagenome_max_score",),
+}
+
+
+def _favor_section(fav: dict, top_k: int) -> Tuple[dict, dict]:
+    annotation = {
+        "basic_info": {
+            "rsid": fav.get("rsid"),
+            "chromosome": fav.get("chromosome"),
+            "position": fav.get("position"),
+            "variant_vcf": fav.get("variant_vcf"),
+            "gene": fav.get("genecode_comprehensive_info"),
+            "consequence": fav.get("genecode_comprehensive_exonic_category"),
+            "protein_change": fav.get("protein_variant"),
+            "hgvsc": fav.get("hgvsc"),
+            "hgvsp": fav.get("hgvsp"),
+        },
+        "pathogenicity_scores": {
+            "cadd_phred": fav.get("cadd_phred"),
+            "sift": {"score": fav.get("sift_val"), "prediction": fav.get("sift_cat")},
+            "polyphen2": {"score": fav.get("polyphen_val"), "prediction": fav.get("polyphen_cat")},
+            "alphamissense": {"score": fav.get("am_pathogenicity"), "prediction": fav.get("am_class")},
+            "mutation_taster": fav.get("mutation_taster_score"),
+            "gerp": fav.get("gerp_s"),
+        },
+        "population_frequencies": {
+            "global": fav.get("af_total"),
+            "african": fav.get("af_afr"),
+            "european": fav.get("af_nfe"),
+            "east_asian": fav.get("af_eas"),
+            "south_asian": fav.get("af_sas"),
+            "latino": fav.get("af_amr"),
+            "ashkenazi": fav.get("af_asj"),
+            "finnish": fav.get("af_fin"),
+        },
+        "clinical": {
+            "clinvar_significance": fav.get("clnsig"),
+            "clinvar_conditions": fav.get("clndn"),
+            "review_status": fav.get("clnrevstat"),
+        },
+        "conservation": {
+            "gerp_n": fav.get("gerp_n"),
+            "gerp_s": fav.get("gerp_s"),
+            "phylop_mammalian": fav.get("mamphylop"),
+            "phylop_vertebrate": fav.get("verphylop"),
+            "phastcons_mammalian": fav.get("mamphcons"),
+        }
+    }
+
+    # Summary stats
+    summary = {
+        "gene": fav.get("genecode_comprehensive_info"),
+        "global_af": fav.get("af_total"),
+        "clinvar": fav.get("clnsig"),
+    }
+    return annotation, summary
+
+
+def _gtex_section(eqtls: EQTLTable, top_k: int) -> Tuple[dict, dict]:
+    section = {
+        "total_associations": len(eqtls),
+        "associations": eqtls,
+    }
+
+    # Summary: most significant eQTLs (missing p-values rank last)
+    summary = {}
+    if len(eqtls):
+        top_eqtls = eqtls.top_k(max(top_k, 1))
+        top = top_eqtls[0]
+        summary["top_eqtl_gene"] = top["gene"]
+        summary["top_eqtl_tissue"] = top["tissue"]
+        summary["top_eqtl_pvalue"] = top["p_value"]
+        summary["top_eqtls"] = top_eqtls.to_records()[:top_k]
+    return section, summary
+
+
+def _alphagenome_section(scores: dict, top_k: int) -> Tuple[dict, dict]:
+    return scores, {"alphagenome_max_score": scores.get("max_abs_quantile_score")}
+
+
+_SECTION_BUILDERS = {"favor": _favor_section, "gtex": _gtex_section, "alphagenome": _alphagenome_section}
+
+
+class _Unavailable:
+    def __repr__(self) -> str:
+        return "UNAVAILABLE"
+
+
+# Payload of a provider that failed or was not asked: its previous section is kept
+UNAVAILABLE = _Unavailable()
+
+
+def _source_payloads(favor_data, gtex_data, alphagenome_data) -> Dict[str, Any]:
     """
-    Merge FAVOR annotation and GTEx eQTL data into a unified structure.
+    The part of each provider's response that the merge reads: None when the
+    provider answered that it has nothing (FAVOR ``[]``, GTEx ``not_found``),
+    UNAVAILABLE when it failed or was not called.
+    """
+    if favor_data is None:
+        favor = UNAVAILABLE
+    else:
+        # FAVOR data (single variant, take first element)
+        favor = favor_data[0] if len(favor_data) > 0 else None
+
+    if gtex_data and "eqtl_results" in gtex_data:
+        gtex = EQTLTable.from_gtex(gtex_data)
+    else:
+        gtex = None if gtex_data and gtex_data.get("not_found") else UNAVAILABLE
+
+    # Failed/skipped AlphaGenome scoring is left out
+    alphagenome = alphagenome_data if alphagenome_data and "error" not in alphagenome_data else UNAVAILABLE
+    return {"favor": favor, "gtex": gtex, "alphagenome": alphagenome}
+
+
+def source_digest(payload: Any, top_k: int = DEFAULT_TOP_K) -> Optional[str]:
+    """Content hash of one source's payload; None if the source had no data."""
+    if payload is None:
+        return None
+    if isinstance(payload, EQTLTable):
+        # top_k shapes the eQTL summary, so it is part of the version
+        return f"{payload.digest()}:{top_k}"
+    body = json.dumps(payload, sort_keys=True, default=_json_default).encode()
+    return hashlib.sha1(body).hexdigest()
+
+
+def merge_variant_data(favor_data: list, gtex_data: dict, variant_id: str, top_k: int = DEFAULT_TOP_K,
+                       alphagenome_data: Optional[dict] = None, previous: Optional[dict] = None) -> dict:
+    """
+    Merge FAVOR annotation, GTEx eQTL and (optionally) AlphaGenome score data
+    into a unified structure.
+
+    ``top_k`` controls how many of the most significant eQTLs are listed in
+    ``summary["top_eqtls"]``.
+
+    ``sources`` records a content hash per source. Given the ``previous``
+    merged record for the variant, sections whose source is unchanged (and
+    their summary keys) are reused rather than rebuilt, and
+    ``query_timestamp`` only moves if something changed. A provider that
+    failed (None, or an error that is not ``not_found``) also keeps its
+    previous section and hash; only an explicit "nothing here" clears it.
 
     Returns nested dict suitable for JSON export or flattening to CSV.
     """
     merged = {
         "variant_id": variant_id,
-        "query_timestamp": pd.Timestamp.now().isoformat(),
+        "query_timestamp": None,
         "favor_annotation": None,
         "gtex_eqtls": None,
-        "summary": {}
+        "alphagenome_scores": None,
+        "summary": {},
+        "sources": {},
     }
 
-    # FAVOR data (single variant, take first element)
-    if favor_data and len(favor_data) > 0:
-        fav = favor_data[0]
-        merged["favor_annotation"] = {
-            "basic_info": {
-                "rsid": fav.get("rsid"),
-                "chromosome": fav.get("chromosome"),
-                "position": fav.get("position"),
-                "variant_vcf": fav.get("variant_vcf"),
-                "gene": fav.get("genecode_comprehensive_info"),
-                "consequence": fav.get("genecode_comprehensive_exonic_category"),
-                "protein_change": fav.get("protein_variant"),
-                "hgvsc": fav.get("hgvsc"),
-                "hgvsp": fav.get("hgvsp"),
-            },
-            "pathogenicity_scores": {
-                "cadd_phred": fav.get("cadd_phred"),
-                "sift": {"score": fav.get("sift_val"), "prediction": fav.get("sift_cat")},
-                "polyphen2": {"score": fav.get("polyphen_val"), "prediction": fav.get("polyphen_cat")},
-                "alphamissense": {"score": fav.get("am_pathogenicity"), "prediction": fav.get("am_class")},
-                "mutation_taster": fav.get("mutation_taster_score"),
-                "gerp": fav.get("gerp_s"),
-            },
-            "population_frequencies": {
-                "global": fav.get("af_total"),
-                "african": fav.get("af_afr"),
-                "european": fav.get("af_nfe"),
-                "east_asian": fav.get("af_eas"),
-                "south_asian": fav.get("af_sas"),
-                "latino": fav.get("af_amr"),
-                "ashkenazi": fav.get("af_asj"),
-                "finnish": fav.get("af_fin"),
-            },
-            "clinical": {
-                "clinvar_significance": fav.get("clnsig"),
-                "clinvar_conditions": fav.get("clndn"),
-                "review_status": fav.get("clnrevstat"),
-            },
-            "conservation": {
-                "gerp_n": fav.get("gerp_n"),
-                "gerp_s": fav.get("gerp_s"),
-                "phylop_mammalian": fav.get("mamphylop"),
-                "phylop_vertebrate": fav.get("verphylop"),
-                "phastcons_mammalian": fav.get("mamphcons"),
-            }
-        }
+    payloads = _source_payloads(favor_data, gtex_data, alphagenome_data)
+    previous_sources = (previous or {}).get("sources") or {}
+    previous_summary = (previous or {}).get("summary") or {}
+    changed = False
 
-        # Summary stats
-        merged["summary"]["gene"] = fav.get("genecode_comprehensive_info")
-        merged["summary"]["global_af"] = fav.get("af_total")
-        merged["summary"]["clinvar"] = fav.get("clnsig")
+    for source, section in SOURCE_SECTIONS.items():
+        payload = payloads[source]
+        if payload is UNAVAILABLE:
+            digest = previous_sources.get(source)
+        else:
+            digest = source_digest(payload, top_k)
+        merged["sources"][source] = digest
 
-    # GTEx eQTL data
-    if gtex_data and "eqtl_results" in gtex_data:
-        eqtls = gtex_data["eqtl_results"]
-        merged["gtex_eqtls"] = {
-            "total_associations": len(eqtls),
-            "associations": [
-                {
-                    "gene": e.get("geneSymbol"),
-                    "tissue": e.get("tissueSiteDetailId"),
-                    "effect_size": e.get("nes"),
-                    "p_value": e.get("pValue"),
-                    "gencode_id": e.get("gencodeId"),
-                }
-                for e in eqtls
-            ]
-        }
+        if payload is UNAVAILABLE or (source in previous_sources and previous_sources[source] == digest):
+            if previous is not None:
+                merged[section] = previous.get(section)
+                merged["summary"].update((k, previous_summary[k]) for k in SUMMARY_KEYS[source] if k in previous_summary)
+            continue
 
-        # Summary: most significant eQTL
-        if eqtls:
-            top_eqtl = min(eqtls, key=lambda x: x.get("pValue", 1))
-            merged["summary"]["top_eqtl_gene"] = top_eqtl.get("geneSymbol")
-            merged["summary"]["top_eqtl_tissue"] = top_eqtl.get("tissueSiteDetailId")
-            merged["summary"]["top_eqtl_pvalue"] = top_eqtl.get("pValue")
+        changed = True
+        if payload is not None:
+            merged[section], summary = _SECTION_BUILDERS[source](payload, top_k)
+            merged["summary"].update(summary)
 
+    if previous is not None and not changed:
+        merged["query_timestamp"] = previous.get("query_timestamp")
+    else:
+        merged["query_timestamp"] = pd.Timestamp.now().isoformat()
     return merged
 
 
+def changed_sections(previous: Optional[dict], merged: dict) -> List[str]:
+    """Sections of ``merged`` that differ from ``previous`` by source hash (all of them if no previous)."""
+    before = (previous or {}).get("sources") or {}
+    after = merged.get("sources") or {}
+    sections = [section for source, section in SOURCE_SECTIONS.items()
+                if previous is None or source not in before or before[source] != after.get(source)]
+    return sections + ["summary"] if sections else []
+
+
 def to_flat_csv(merged_data: dict) -> pd.DataFrame:
     """
     Flatten nested merged data for CSV export.
     Returns one row per eQTL association (or one row if no eQTLs).
     """
-    rows = []
 
     favor = merged_data.get("favor_annotation") or {}
     basic = favor.get("basic_info") or {}
     scores = favor.get("pathogenicity_scores") or {}
     freqs = favor.get("population_frequencies") or {}
     clinical = favor.get("clinical") or {}
+    alphagenome = merged_data.get("alphagenome_scores") or {}
 
     # Base row with FAVOR data
     base_row = {
@@ -140,29 +251,38 @@ def to_flat_csv(merged_data: dict) -> pd.DataFrame:
         # Clinical
         "clinvar_significance": clinical.get("clinvar_significance"),
         "clinvar_conditions": clinical.get("clinvar_conditions"),
+        # AlphaGenome
+        "alphagenome_max_score": alphagenome.get("max_abs_quantile_score"),
+        "alphagenome_top_scorer": alphagenome.get("top_scorer"),
+        "alphagenome_top_gene": alphagenome.get("top_gene"),
     }
 
     # Add eQTL rows (one per association) or single row if none
     gtex = merged_data.get("gtex_eqtls") or {}
-    associations = gtex.get("associations") or []
-
-    if associations:
-        for eqtl in associations:
-            row = base_row.copy()
-            row["eqtl_gene"] = eqtl.get("gene")
-            row["eqtl_tissue"] = eqtl.get("tissue")
-            row["eqtl_effect_size"] = eqtl.get("effect_size")
-            row["eqtl_pvalue"] = eqtl.get("p_value")
-            rows.append(row)
-    else:
-        rows.append(base_row)
+    eqtls = EQTLTable.coerce(gtex.get("associations"))
+
+    if not len(eqtls):
+        return pd.DataFrame([base_row])
+
+    eqtl_df = eqtls.to_frame()
+    df = pd.DataFrame(base_row, index=eqtl_df.index)
+    df["eqtl_gene"] = eqtl_df["gene"]
+    df["eqtl_tissue"] = eqtl_df["tissue"]
+    df["eqtl_effect_size"] = eqtl_df["effect_size"]
+    df["eqtl_pvalue"] = eqtl_df["p_value"]
+    return df
+
 
-    return pd.DataFrame(rows)
+def _json_default(obj):
+    """Serialise EQTLTable as its association list; fall back to str for anything else."""
+    if isinstance(obj, EQTLTable):
+        return obj.to_records()
+    return str(obj)
 
 
 def export_to_json(merged_data: dict) -> str:
     """Export merged data as formatted JSON string."""
-    return json.dumps(merged_data, indent=2, default=str)
+    return json.dumps(merged_data, indent=2, default=_json_default)
 
 
 def export_to_csv(merged_data: dict) -> str:
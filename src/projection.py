@@ -0,0 +1,109 @@
+import json
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Union
+
+
+# FAVOR keys read by merge_variant_data, grouped by the merged-record section they feed
+FAVOR_FIELD_GROUPS: Dict[str, FrozenSet[str]] = {
+    "basic_info": frozenset({
+        "rsid", "chromosome", "position", "variant_vcf",
+        "genecode_comprehensive_info", "genecode_comprehensive_exonic_category",
+        "protein_variant", "hgvsc", "hgvsp",
+    }),
+    "pathogenicity_scores": frozenset({
+        "cadd_phred", "sift_val", "sift_cat", "polyphen_val", "polyphen_cat",
+        "am_pathogenicity", "am_class", "mutation_taster_score", "gerp_s",
+    }),
+    "population_frequencies": frozenset({
+        "af_total", "af_afr", "af_nfe", "af_eas", "af_sas", "af_amr", "af_asj", "af_fin",
+    }),
+    "clinical": frozenset({"clnsig", "clndn", "clnrevstat"}),
+    "conservation": frozenset({"gerp_n", "gerp_s", "mamphylop", "verphylop", "mamphcons"}),
+}
+
+# Everything merge_variant_data reads
+FAVOR_MERGE_FIELDS: FrozenSet[str] = frozenset().union(*FAVOR_FIELD_GROUPS.values())
+
+# Always kept so projected records can still be identified
+FAVOR_KEY_FIELDS: FrozenSet[str] = frozenset({"rsid", "variant_vcf"})
+
+
+def required_fields(*consumers: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    """
+    Union of the field sets needed by the active consumers.
+    A consumer passing None needs every field, so the result is None (no projection).
+    """
+    fields = set(FAVOR_KEY_FIELDS)
+    for consumer in consumers:
+        if consumer is None:
+            return None
+        fields.update(consumer)
+    return frozenset(fields)
+
+
+# FAVOR columns shown in the app's annotation table
+FAVOR_TABLE_COLUMNS = [
+    "rsid",
+    "chromosome",
+    "position",
+    "variant_vcf",
+    "genecode_comprehensive_info",
+    "genecode_comprehensive_exonic_category",
+    "protein_variant",
+    "cadd_phred",
+    "am_class",
+    "clnsig",
+    "af_total",
+    "sift_cat",
+    "polyphen_cat"
+]
+
+# FAVOR keys read by the population frequency and pathogenicity charts
+FAVOR_CHART_FIELDS = frozenset({
+    "af_afr", "af_amr", "af_eas", "af_nfe", "af_fin", "af_sas", "af_asj", "af_ami", "af_oth",
+    "cadd_phred", "sift_val", "polyphen_val", "am_pathogenicity", "gerp_s", "mutation_taster_score",
+})
+
+# Projection used by the app (and by anything warming its cache, so the keys match):
+# only the FAVOR tracks used by the table, charts and merge are parsed and kept
+APP_FAVOR_FIELDS = required_fields(FAVOR_TABLE_COLUMNS, FAVOR_CHART_FIELDS, FAVOR_MERGE_FIELDS)
+
+
+def favor_records(payload: Any) -> Any:
+    """
+    The record list of a FAVOR payload: a ``{"data": [...]}`` wrapper is
+    unwrapped and a lone record becomes a one-item list. Lists and None are
+    returned unchanged.
+    """
+    if isinstance(payload, dict):
+        inner = payload.get("data")
+        if isinstance(inner, list):
+            return inner
+        return [] if FAVOR_KEY_FIELDS.isdisjoint(payload) else [payload]
+    return payload
+
+
+def _projecting_hook(fields: FrozenSet[str]):
+    # Objects holding a key field are records and keep only ``fields``, whatever
+    # the value type. Other objects (values nested in kept fields, a wrapper)
+    # are left whole; favor_records then keeps just the record list.
+    def hook(pairs):
+        if FAVOR_KEY_FIELDS.isdisjoint(k for k, _ in pairs):
+            return dict(pairs)
+        return {k: v for k, v in pairs if k in fields}
+    return hook
+
+
+def parse_favor(payload: Union[str, bytes], fields: Optional[FrozenSet[str]] = None) -> Any:
+    """Decode a FAVOR JSON body into its record list, dropping unneeded tracks while parsing."""
+    if fields is None:
+        return favor_records(json.loads(payload))
+    return favor_records(json.loads(payload, object_pairs_hook=_projecting_hook(fields)))
+
+
+def project_favor(records: Optional[List[Dict[str, Any]]],
+                  fields: Optional[FrozenSet[str]]) -> Optional[List[Dict[str, Any]]]:
+    """Project already-decoded FAVOR records (e.g. from a cache) onto ``fields``."""
+    records = favor_records(records)
+    if fields is None or not isinstance(records, list):
+        return records
+    return [{k: v for k, v in rec.items() if k in fields} for rec in records]
@@ -0,0 +1,59 @@
+import time
+from typing import Callable, Iterator, List, Optional
+
+from cache import CacheBackend, CacheEntry, backend_from_url
+
+
+class RecordStore:
+    """
+    Merged variant records keyed by rsID, with the time each was stored.
+
+    Filled by the app after each search and by the cache warmer; read by
+    anything that needs many merged records at once (warm-up reports,
+    cohort queries). Backed by a CacheBackend, so with a shared backend every
+    worker process sees the same records.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, clock: Callable[[], float] = time.time):
+        self.backend = backend or backend_from_url("memory://")
+        self.clock = clock
+
+    def put(self, rsid: str, merged: dict) -> None:
+        self.backend.set(rsid, CacheEntry(value=merged, fetched_at=self.clock()))
+
+    def touch(self, rsid: str) -> None:
+        """Restart the age of an unchanged record without rewriting it, so ``version`` does not change."""
+        self.backend.touch(rsid, self.clock())
+
+    def get(self, rsid: str) -> Optional[dict]:
+        entry = self.backend.get(rsid)
+        return entry.value if entry else None
+
+    def age(self, rsid: str) -> Optional[float]:
+        """Seconds since ``rsid`` was stored, or None if it never was."""
+        entry = self.backend.get(rsid)
+        return self.clock() - entry.fetched_at if entry else None
+
+    def __contains__(self, rsid: str) -> bool:
+        return self.backend.get(rsid) is not None
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def version(self) -> str:
+        """Changes whenever a record is stored or deleted, in any process sharing the backend."""
+        return self.backend.version()
+
+    def keys(self) -> List[str]:
+        return list(self.backend.keys())
+
+    def records(self) -> Iterator[dict]:
+        for rsid in self.keys():
+            merged = self.get(rsid)
+            if merged is not None:
+                yield merged
+
+
+# Process-wide store shared by the app and background jobs; shared across
+# processes when VARIANT_CACHE_URL points at a shared backend
+RECORD_STORE = RecordStore(backend_from_url(table="records"))
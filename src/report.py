@@ -0,0 +1,221 @@
+"""
+Self-contained HTML reports for reviewers.
+
+One report per variant, or per locus (a named group of variants), with the
+FAVOR table, the three data_viz figures and the merged JSON:
+
+    python src/report.py rs429358 rs7412 --out reports/
+    python src/report.py --variants loci.txt --group APOE --out reports/
+
+Inputs are fetched (through the caches) on a thread pool; figure building
+and HTML writing, which are CPU-bound, run on a process pool. Every report
+links one shared copy of plotly.js in ``<out>/assets`` instead of embedding
+its own ~4 MB.
+"""
+import argparse
+import html
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+import plotly
+from plotly.offline import get_plotlyjs
+
+from annotate import load_variant_list
+from data_viz import (APP_FAVOR_FIELDS, FAVOR_TABLE_COLUMNS, create_eqtl_heatmap,
+                      create_functional_annotation_landscape, create_population_frequency_chart)
+from fetch_data import fetch_alphagenome, fetch_favor, fetch_gtex
+from merge_api import export_to_json, merge_variant_data
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUT_DIR = "reports"
+FETCH_THREADS = 8
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{plotly_js}"></script>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; font-size: 0.85em; }}
+th, td {{ border: 1px solid #ccc; padding: 4px 8px; }}
+pre {{ background: #f6f6f6; padding: 1em; overflow-x: auto; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>Generated {generated}</p>
+{sections}
+</body>
+</html>
+"""
+
+
+@dataclass
+class ReportJob:
+    """One output file: ``name`` and the fetched inputs of each variant in it."""
+    name: str
+    variants: List[Dict[str, Any]]
+
+
+def collect_inputs(rsid: str) -> Dict[str, Any]:
+    """Fetch everything a report section needs for one variant (cached, mock fallback)."""
+    favor_data = fetch_favor(rsid, fields=APP_FAVOR_FIELDS)
+    return {
+        "variant_id": rsid,
+        "favor_data": favor_data,
+        "gtex_data": fetch_gtex(rsid),
+        "alphagenome_data": fetch_alphagenome(favor_data),
+    }
+
+
+def report_filename(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) + ".html"
+
+
+def write_plotly_asset(out_dir: Path) -> str:
+    """Write plotly.js once per output directory; returns its path relative to the reports."""
+    relative = f"assets/plotly-{plotly.__version__}.min.js"
+    path = out_dir / relative
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(get_plotlyjs(), encoding="utf-8")
+    return relative
+
+
+def _figure_html(fig) -> str:
+    return fig.to_html(full_html=False, include_plotlyjs=False) if fig is not None else ""
+
+
+def render_section(inputs: Dict[str, Any]) -> str:
+    """HTML for one variant: FAVOR table, figures and merged JSON."""
+    variant_id = inputs["variant_id"]
+    favor_data, gtex_data = inputs.get("favor_data"), inputs.get("gtex_data")
+    merged = merge_variant_data(favor_data, gtex_data, variant_id, alphagenome_data=inputs.get("alphagenome_data"))
+
+    parts = [f"<h2>{html.escape(variant_id)}</h2>"]
+    if favor_data:
+        favor_df = pd.DataFrame(favor_data)
+        columns = [c for c in FAVOR_TABLE_COLUMNS if c in favor_df.columns]
+        parts.append("<h3>FAVOR Annotation</h3>")
+        parts.append(favor_df[columns].to_html(index=False, na_rep=""))
+        parts.append(_figure_html(create_population_frequency_chart(favor_df, variant_id)))
+        parts.append(_figure_html(create_functional_annotation_landscape(favor_df, variant_id)))
+    else:
+        parts.append("<p>No FAVOR results found.</p>")
+
+    heatmap = create_eqtl_heatmap(gtex_data, variant_id) if gtex_data else None
+    parts.append(_figure_html(heatmap) if heatmap is not None else "<p>No GTEx eQTL results found.</p>")
+
+    parts.append("<details><summary>Merged JSON</summary><pre>")
+    parts.append(html.escape(export_to_json(merged)))
+    parts.append("</pre></details>")
+    return "\n".join(parts)
+
+
+def render_report(job: ReportJob, out_dir: str, plotly_js: str) -> str:
+    """Build and write one report (runs in a worker process). Returns the file path."""
+    page = _PAGE.format(
+        title=html.escape(job.name),
+        plotly_js=plotly_js,
+        generated=pd.Timestamp.now().isoformat(timespec="seconds"),
+        sections="\n<hr>\n".join(render_section(inputs) for inputs in job.variants),
+    )
+    path = Path(out_dir) / report_filename(job.name)
+    path.write_text(page, encoding="utf-8")
+    return str(path)
+
+
+def _write_index(out_dir: Path, paths: Sequence[str]) -> None:
+    links = "\n".join(
+        f'<li><a href="{html.escape(Path(p).name)}">{html.escape(Path(p).stem)}</a></li>' for p in sorted(paths)
+    )
+    (out_dir / "index.html").write_text(f"<!DOCTYPE html><html><body><h1>Reports</h1><ul>\n{links}\n</ul></body></html>",
+                                        encoding="utf-8")
+
+
+def generate_reports(groups: Dict[str, Sequence[str]], out_dir: str = DEFAULT_OUT_DIR,
+                     processes: Optional[int] = None,
+                     fetch: Callable[[str], Dict[str, Any]] = collect_inputs) -> List[str]:
+    """
+    Write one report per ``groups`` entry (name -> rsIDs) into ``out_dir``,
+    plus an index. A report is handed to the process pool as soon as its
+    inputs are fetched. A report that fails to render is logged and left
+    out. Returns the paths of the reports written. Raises ValueError if a
+    group has no rsIDs, since it would never be rendered.
+    """
+    empty = [name for name, members in groups.items() if not members]
+    if empty:
+        raise ValueError(f"Report group(s) with no rsIDs: {', '.join(map(str, empty))}")
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    plotly_js = write_plotly_asset(out)
+    processes = processes or os.cpu_count() or 1
+
+    rsids = list(dict.fromkeys(rsid for members in groups.values() for rsid in members))
+    inputs: Dict[str, Dict[str, Any]] = {}
+    waiting = {name: set(members) for name, members in groups.items()}
+    paths: List[str] = []
+
+    # Spawned workers: the parent has fetch and cache threads running, which fork would copy mid-flight
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as renderers, \
+            ThreadPoolExecutor(max_workers=FETCH_THREADS) as fetchers:
+        fetched = {fetchers.submit(fetch, rsid): rsid for rsid in rsids}
+        rendering = {}
+        for future in as_completed(fetched):
+            rsid = fetched[future]
+            try:
+                inputs[rsid] = future.result()
+            except Exception as e:
+                logger.warning("Fetching %s failed: %s", rsid, e)
+                inputs[rsid] = {"variant_id": rsid}
+            for name in [n for n, missing in waiting.items() if rsid in missing]:
+                waiting[name].discard(rsid)
+                if not waiting[name]:
+                    del waiting[name]
+                    job = ReportJob(name, [inputs[r] for r in dict.fromkeys(groups[name])])
+                    rendering[renderers.submit(render_report, job, str(out), plotly_js)] = name
+        for future in as_completed(rendering):
+            try:
+                paths.append(future.result())
+            except Exception as e:
+                logger.warning("Rendering report %s failed: %s", rendering[future], e)
+
+    _write_index(out, paths)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write HTML reports for many variants in parallel.")
+    parser.add_argument("rsids", nargs="*", help="rsIDs to report on")
+    parser.add_argument("--variants", help="file of rsIDs (see annotate.load_variant_list)")
+    parser.add_argument("--group", help="write one locus report with this name instead of one per variant")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="output directory")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    rsids = list(args.rsids) + (load_variant_list(args.variants) if args.variants else [])
+    if not rsids:
+        parser.error("give rsIDs or --variants")
+    groups = {args.group: rsids} if args.group else {rsid: [rsid] for rsid in rsids}
+
+    start = time.monotonic()
+    paths = generate_reports(groups, args.out, args.processes)
+    print(json.dumps({"reports": len(paths), "out": args.out, "seconds": round(time.monotonic() - start, 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, window: int = 100):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker.
+
+    Errors and calls slower than ``slow_call_seconds`` both count as failures.
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    calls fail fast with CircuitOpenError for ``reset_timeout`` seconds; then
+    a single trial call is let through (half-open) and its outcome closes or
+    re-opens the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call_seconds: float = 8.0,
+                 reset_timeout: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not go upstream."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - self.clock()
+            if self.state == OPEN and retry_in <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError(self.name, max(retry_in, 0))
+
+    def record_success(self, seconds: float) -> None:
+        if seconds > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("Opening %s circuit after %d failures", self.name, self.failures)
+                self.state = OPEN
+                self.opened_at = self.clock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN and self.clock() < self.opened_at + self.reset_timeout
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+
+def hedged(fn: Callable[[], Any], delay: Optional[float], executor: ThreadPoolExecutor = _hedge_executor) -> Any:
+    """
+    Run ``fn``; if it has not finished after ``delay`` seconds, start a
+    duplicate and return whichever succeeds first. Only use for idempotent
+    calls. With ``delay`` None this is a plain call.
+    """
+    if delay is None:
+        return fn()
+
+    first = executor.submit(fn)
+    done, _ = wait([first], timeout=delay)
+    if done:
+        return first.result()
+
+    pending = {first, executor.submit(fn)}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+class Provider:
+    """
+    Breaker, latency window and hedging policy for one upstream.
+
+    ``call`` fails fast while the breaker is open, records latency for the
+    breaker and the hedge delay, and hedges once at least ``hedge_min_samples``
+    latencies are known (delay = p95). ``is_failure`` decides which exceptions
+    count against the breaker, so e.g. a 404 does not trip it.
+    """
+
+    def __init__(self, name: str, breaker: Optional[CircuitBreaker] = None, hedge: bool = True,
+                 hedge_quantile: float = 0.95, hedge_min_samples: int = 20,
+                 is_failure: Callable[[BaseException], bool] = lambda e: True):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyTracker()
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.is_failure = is_failure
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_quantile)
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            result = hedged(fn, self.hedge_delay())
+        except Exception as e:
+            if self.is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success(time.monotonic() - start)
+            raise
+        elapsed = time.monotonic() - start
+        self.latency.record(elapsed)
+        self.breaker.record_success(elapsed)
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "p95_seconds": self.latency.percentile(0.95),
+        }
@@ -0,0 +1,374 @@
+"""
+Portable cache snapshots for fast cold starts.
+
+A snapshot is one file holding cache entries from several backends: FAVOR
+responses, GTEx rsID -> variantId lookups and eQTL pages (the HTTP cache),
+merged records and, if configured, AlphaGenome scores.
+
+    magic (8 bytes) | header length (8) | sha256(header) (32) | header (JSON) | payload
+
+The header lists each entry's offset and length in the payload with its cache
+metadata (fetched_at, validators); values are pickled back to back.
+``Snapshot`` memory-maps the file and unpickles entries on demand. A delta
+snapshot names its base and holds only entries whose value changed, new
+timestamps for entries that were merely re-fetched, and deleted keys.
+
+    python src/snapshot.py export var/snap-1.vsnap
+    python src/snapshot.py export var/snap-2.vsnap --base var/snap-1.vsnap
+    python src/snapshot.py info var/snap-2.vsnap
+
+Export reads the backends configured by VARIANT_CACHE_URL. Set
+VARIANT_SNAPSHOT=var/snap-1.vsnap,var/snap-2.vsnap to load at startup.
+Snapshots contain pickles: only load files you produced.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import pickle
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from cache import CacheBackend, CacheEntry
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VSNAP\x00\x00\x00"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sQ32s")  # magic, header length, sha256(header)
+
+PathLike = Union[str, Path]
+
+
+class SnapshotError(ValueError):
+    """Corrupt, unsupported or out-of-order snapshot file."""
+
+
+class SnapshotEntry(NamedTuple):
+    offset: int
+    length: int
+    fetched_at: float
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: Optional[str]
+    value_hash: str
+
+
+def default_sources() -> Dict[str, CacheBackend]:
+    """Backends worth carrying to a new instance, by snapshot namespace."""
+    from fetch_data import HTTP_CACHE, get_alphagenome_scorer
+    from record_store import RECORD_STORE
+
+    sources = {"http": HTTP_CACHE.backend, "records": RECORD_STORE.backend}
+    scorer = get_alphagenome_scorer()
+    if scorer is not None:
+        sources["alphagenome"] = scorer.cache.backend
+    return sources
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path: PathLike, verify: bool = True):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._map = None
+        try:
+            if os.fstat(self._file.fileno()).st_size < _PREAMBLE.size:
+                raise SnapshotError(f"{self.path} is not a snapshot (too short)")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.header = self._read_header()
+            if verify:
+                self.verify()
+        except Exception:
+            self.close()
+            raise
+        self._indexes: Dict[str, Dict[str, SnapshotEntry]] = {}
+
+    def _read_header(self) -> dict:
+        magic, length, header_hash = _PREAMBLE.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a snapshot")
+        raw = self._map[_PREAMBLE.size:_PREAMBLE.size + length]
+        if len(raw) != length or hashlib.sha256(raw).digest() != header_hash:
+            raise SnapshotError(f"{self.path}: header checksum mismatch")
+        header = json.loads(raw)
+        if header.get("format_version") != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path}: unsupported format version {header.get('format_version')}")
+        self._payload_start = _PREAMBLE.size + length
+        return header
+
+    def verify(self) -> None:
+        """Check the payload against the header's sha256 (raises SnapshotError)."""
+        with memoryview(self._map) as view:
+            digest = hashlib.sha256(view[self._payload_start:]).hexdigest()
+        if digest != self.header["checksum"]:
+            raise SnapshotError(f"{self.path}: payload checksum mismatch")
+
+    # ---------- metadata ----------
+
+    @property
+    def id(self) -> str:
+        return self.header["id"]
+
+    @property
+    def base_id(self) -> Optional[str]:
+        return self.header.get("base_id")
+
+    @property
+    def created_at(self) -> float:
+        return self.header["created_at"]
+
+    @property
+    def namespaces(self) -> List[str]:
+        return list(self.header["entries"])
+
+    def index(self, namespace: str) -> Dict[str, SnapshotEntry]:
+        if namespace not in self._indexes:
+            rows = self.header["entries"].get(namespace, [])
+            self._indexes[namespace] = {row[0]: SnapshotEntry(*row[1:]) for row in rows}
+        return self._indexes[namespace]
+
+    def touched(self, namespace: str) -> Dict[str, float]:
+        return dict(self.header.get("touched", {}).get(namespace, []))
+
+    def deleted(self, namespace: str) -> List[str]:
+        return self.header.get("deleted", {}).get(namespace, [])
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "base_id": self.base_id,
+            "created_at": self.created_at,
+            "bytes": len(self._map),
+            "entries": {ns: len(rows) for ns, rows in self.header["entries"].items()},
+            "touched": {ns: len(rows) for ns, rows in self.header.get("touched", {}).items()},
+            "deleted": {ns: len(keys) for ns, keys in self.header.get("deleted", {}).items()},
+        }
+
+    # ---------- values ----------
+
+    def get(self, namespace: str, key: str) -> Optional[CacheEntry]:
+        meta = self.index(namespace).get(key)
+        return self._entry(meta) if meta else None
+
+    def items(self, namespace: str) -> Iterator[Tuple[str, CacheEntry]]:
+        for key, meta in self.index(namespace).items():
+            yield key, self._entry(meta)
+
+    def _entry(self, meta: SnapshotEntry) -> CacheEntry:
+        start = self._payload_start + meta.offset
+        value = pickle.loads(self._map[start:start + meta.length])
+        return CacheEntry(value, meta.fetched_at, meta.etag, meta.last_modified, meta.digest)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_chain(paths: Sequence[PathLike], verify: bool = True) -> List[Snapshot]:
+    """Open a full snapshot followed by its deltas, checking each delta's base."""
+    chain: List[Snapshot] = []
+    try:
+        for path in paths:
+            snap = Snapshot(path, verify=verify)
+            chain.append(snap)
+            expected = chain[-2].id if len(chain) > 1 else None
+            if snap.base_id != expected and expected is None:
+                raise SnapshotError(f"{path} is a delta on {snap.base_id}; load its base first")
+            if snap.base_id != expected:
+                raise SnapshotError(f"{path} is a delta on {snap.base_id or 'nothing'}, not on {expected}")
+    except Exception:
+        for snap in chain:
+            snap.close()
+        raise
+    return chain
+
+
+def _state(chain: Sequence[Snapshot], namespace: str) -> Dict[str, Tuple[str, float]]:
+    """key -> (value hash, fetched_at) after applying the chain in order."""
+    state: Dict[str, Tuple[str, float]] = {}
+    for snap in chain:
+        for key, meta in snap.index(namespace).items():
+            state[key] = (meta.value_hash, meta.fetched_at)
+        for key, fetched_at in snap.touched(namespace).items():
+            if key in state:
+                state[key] = (state[key][0], fetched_at)
+        for key in snap.deleted(namespace):
+            state.pop(key, None)
+    return state
+
+
+def write_snapshot(path: PathLike, sources: Optional[Dict[str, CacheBackend]] = None,
+                   base: Sequence[PathLike] = (), clock=time.time) -> dict:
+    """
+    Write the current contents of ``sources`` to ``path``. With ``base`` (a
+    full snapshot and any deltas on it), write a delta against that chain.
+    Returns the snapshot summary.
+    """
+    sources = default_sources() if sources is None else sources
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    chain = open_chain(base) if base else []
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "base_id": chain[-1].id if chain else None,
+        "created_at": clock(),
+        "entries": {},
+        "touched": {},
+        "deleted": {},
+    }
+    checksum = hashlib.sha256()
+    offset = 0
+    payload_path = path.with_name(path.name + ".payload")
+    try:
+        with open(payload_path, "wb") as payload:
+            for namespace, backend in sources.items():
+                previous = _state(chain, namespace)
+                rows, touched, seen = [], [], set()
+                for key in backend.keys():
+                    entry = backend.get(key)
+                    if entry is None:
+                        continue
+                    seen.add(key)
+                    blob = pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL)
+                    value_hash = hashlib.sha1(blob).hexdigest()
+                    if key in previous and previous[key][0] == value_hash:
+                        if previous[key][1] != entry.fetched_at:
+                            touched.append([key, entry.fetched_at])
+                        continue
+                    payload.write(blob)
+                    checksum.update(blob)
+                    rows.append([key, offset, len(blob), entry.fetched_at, entry.etag,
+                                 entry.last_modified, entry.digest, value_hash])
+                    offset += len(blob)
+                header["entries"][namespace] = rows
+                if chain:
+                    header["touched"][namespace] = touched
+                    header["deleted"][namespace] = [key for key in previous if key not in seen]
+
+        header["checksum"] = checksum.hexdigest()
+        header["id"] = hashlib.sha256(json.dumps(header, sort_keys=True).encode()).hexdigest()[:16]
+        raw = json.dumps(header).encode()
+
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as out, open(payload_path, "rb") as payload:
+            out.write(_PREAMBLE.pack(MAGIC, len(raw), hashlib.sha256(raw).digest()))
+            out.write(raw)
+            while True:
+                block = payload.read(1 << 20)
+                if not block:
+                    break
+                out.write(block)
+        os.replace(tmp, path)
+    finally:
+        payload_path.unlink(missing_ok=True)
+        for snap in chain:
+            snap.close()
+
+    with Snapshot(path, verify=False) as snap:
+        return snap.summary()
+
+
+def load_snapshots(paths: Sequence[PathLike], sources: Optional[Dict[str, CacheBackend]] = None,
+                   verify: bool = True) -> dict:
+    """
+    Load a full snapshot and its deltas into ``sources``. Entries the backend
+    already holds in a newer version are kept, so loading into a shared,
+    already-warm backend is harmless. Returns counts and the time taken.
+    """
+    sources = default_sources() if sources is None else sources
+    start = time.monotonic()
+    report = {"loaded": 0, "kept_newer": 0, "touched": 0, "deleted": 0}
+
+    chain = open_chain(paths, verify=verify)
+    try:
+        for snap in chain:
+            for namespace, backend in sources.items():
+                existing = set(backend.keys())
+
+                def newer_in_backend(key: str, fetched_at: float) -> bool:
+                    if key not in existing:
+                        return False
+                    current = backend.get(key)
+                    return current is not None and current.fetched_at >= fetched_at
+
+                batch = []
+                for key, meta in snap.index(namespace).items():
+                    if newer_in_backend(key, meta.fetched_at):
+                        report["kept_newer"] += 1
+                    else:
+                        batch.append((key, snap.get(namespace, key)))
+                backend.set_many(batch)
+                report["loaded"] += len(batch)
+                existing.update(key for key, _ in batch)
+
+                for key, fetched_at in snap.touched(namespace).items():
+                    if key in existing and not newer_in_backend(key, fetched_at):
+                        backend.touch(key, fetched_at)
+                        report["touched"] += 1
+                for key in snap.deleted(namespace):
+                    if key in existing and not newer_in_backend(key, snap.created_at):
+                        backend.delete(key)
+                        report["deleted"] += 1
+    finally:
+        for snap in chain:
+            snap.close()
+
+    report["seconds"] = round(time.monotonic() - start, 3)
+    return report
+
+
+def load_from_env() -> Optional[dict]:
+    """Load VARIANT_SNAPSHOT (comma-separated full snapshot + deltas), if set. Never raises."""
+    spec = os.environ.get("VARIANT_SNAPSHOT")
+    if not spec:
+        return None
+    paths = [p.strip() for p in spec.split(",") if p.strip()]
+    try:
+        report = load_snapshots(paths)
+    except (OSError, SnapshotError) as e:
+        logger.warning("Could not load snapshot %s: %s", spec, e)
+        return {"error": str(e)}
+    logger.info("Loaded snapshot %s: %s", spec, report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, load or inspect cache snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="write the configured caches to a snapshot file")
+    export.add_argument("path")
+    export.add_argument("--base", nargs="+", default=[], help="full snapshot (+ deltas) to write a delta against")
+    load = sub.add_parser("load", help="load a full snapshot and its deltas into the configured caches")
+    load.add_argument("paths", nargs="+")
+    info = sub.add_parser("info", help="show a snapshot's header summary")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "export":
+        result = write_snapshot(args.path, base=args.base)
+    elif args.command == "load":
+        result = load_snapshots(args.paths)
+    else:
+        with Snapshot(args.path) as snap:
+            result = snap.summary()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Background cache warmer.
+
+Prefetches FAVOR/GTEx (and AlphaGenome, if configured) for a curated list of
+variants and stores the merged records, so the first user after a deploy or
+TTL expiry gets cache hits. Run it inside the app (opt-in, see
+``warmer_from_env``) or standalone against a shared backend:
+
+    export VARIANT_CACHE_URL=sqlite:///var/cache/variants.db
+    python src/warmer.py --variants my_loci.txt --rate 0.5
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, Optional
+
+from annotate import ProviderUnavailable, annotate_variant, load_variant_list  # noqa: F401 (re-exported)
+from cache import is_shared_backend
+from fetch_data import HTTP_CACHE, PROVIDERS
+from record_store import RECORD_STORE, RecordStore
+
+logger = logging.getLogger(__name__)
+
+# Help tab examples
+HELP_EXAMPLE_VARIANTS = ["rs429358", "rs7412", "rs1801133", "rs334", "rs12913832"]
+
+# Lead SNPs of published Alzheimer's disease loci (ADVP, https://advp.niagads.org)
+ADVP_AD_VARIANTS = [
+    "rs6656401",   # CR1
+    "rs6733839",   # BIN1
+    "rs35349669",  # INPP5D
+    "rs190982",    # MEF2C
+    "rs9271192",   # HLA-DRB5/DRB1
+    "rs10948363",  # CD2AP
+    "rs2718058",   # NME8
+    "rs1476679",   # ZCWPW1
+    "rs11771145",  # EPHA1
+    "rs28834970",  # PTK2B
+    "rs9331896",   # CLU
+    "rs10838725",  # CELF1
+    "rs983392",    # MS4A6A
+    "rs10792832",  # PICALM
+    "rs11218343",  # SORL1
+    "rs17125944",  # FERMT2
+    "rs10498633",  # SLC24A4
+    "rs8093731",   # DSG2
+    "rs4147929",   # ABCA7
+    "rs3865444",   # CD33
+    "rs7274581",   # CASS4
+    "rs75932628",  # TREM2
+]
+
+CURATED_VARIANTS = HELP_EXAMPLE_VARIANTS + ADVP_AD_VARIANTS
+
+# Upstream requests are shared with interactive users, so warm slowly by default
+DEFAULT_RATE = 0.5          # variants per second
+DEFAULT_INTERVAL = 6 * 3600  # seconds between passes (matches the cache TTL)
+
+
+class RateLimiter:
+    """Token bucket: ``rate`` acquisitions per second, bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._last = clock()
+
+    def acquire(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        if self._tokens < 1:
+            self.sleep((1 - self._tokens) / self.rate)
+            self._tokens = 1
+            self._last = self.clock()
+        self._tokens -= 1
+
+
+@dataclass
+class WarmReport:
+    total: int
+    fresh: int
+    stale: int
+    missing: int
+    warmed: int = 0
+    errors: int = 0
+    skipped_unhealthy: int = 0
+    max_age_seconds: Optional[float] = None
+    median_age_seconds: Optional[float] = None
+
+    @property
+    def coverage(self) -> float:
+        """Fraction of the list with a stored merged record (fresh or stale)."""
+        return (self.fresh + self.stale) / self.total if self.total else 1.0
+
+    def as_dict(self) -> dict:
+        return dict(asdict(self), coverage=round(self.coverage, 4))
+
+
+class CacheWarmer:
+    """
+    Warms caches and the record store for ``variants`` within a rate budget.
+
+    Only variants without a fresh merged record are fetched. A pass backs off
+    entirely while any upstream circuit breaker is open, so warming never
+    competes with users for an unhealthy provider.
+    """
+
+    def __init__(self, variants: Iterable[str], rate_per_second: float = DEFAULT_RATE,
+                 store: RecordStore = RECORD_STORE, fresh_ttl: Optional[float] = None,
+                 warm_alphagenome: bool = True, limiter: Optional[RateLimiter] = None):
+        self.variants = list(dict.fromkeys(variants))
+        self.store = store
+        self.fresh_ttl = HTTP_CACHE.fresh_ttl if fresh_ttl is None else fresh_ttl
+        self.warm_alphagenome = warm_alphagenome
+        self.limiter = limiter or RateLimiter(rate_per_second)
+        self.last_run: Optional[WarmReport] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def needs_warming(self, rsid: str) -> bool:
+        age = self.store.age(rsid)
+        return age is None or age >= self.fresh_ttl
+
+    def warm_variant(self, rsid: str) -> bool:
+        """Fetch and merge one variant into the store. Returns False if nothing was found."""
+        return annotate_variant(rsid, self.store, with_alphagenome=self.warm_alphagenome)
+
+    def run_once(self) -> WarmReport:
+        """One pass over the list; returns the coverage report after the pass."""
+        warmed = errors = skipped = 0
+        for rsid in self.variants:
+            if self._stop.is_set():
+                break
+            if not self.needs_warming(rsid):
+                continue
+            if any(p.breaker.is_open for p in PROVIDERS.values()):
+                skipped = sum(self.needs_warming(v) for v in self.variants)
+                logger.info("Upstream unhealthy; pausing warm-up with %d variants pending", skipped)
+                break
+
+            self.limiter.acquire()
+            try:
+                if self.warm_variant(rsid):
+                    warmed += 1
+                else:
+                    errors += 1
+            except Exception as e:
+                errors += 1
+                logger.warning("Warming %s failed: %s", rsid, e)
+
+        report = self.report()
+        report.warmed, report.errors, report.skipped_unhealthy = warmed, errors, skipped
+        self.last_run = report
+        return report
+
+    def report(self) -> WarmReport:
+        """Coverage and staleness of the record store for this warmer's list."""
+        ages = [self.store.age(rsid) for rsid in self.variants]
+        known = [a for a in ages if a is not None]
+        fresh = sum(a < self.fresh_ttl for a in known)
+        return WarmReport(
+            total=len(self.variants),
+            fresh=fresh,
+            stale=len(known) - fresh,
+            missing=len(ages) - len(known),
+            max_age_seconds=max(known) if known else None,
+            median_age_seconds=statistics.median(known) if known else None,
+        )
+
+    # ---------- scheduling ----------
+
+    def start(self, interval_seconds: float = DEFAULT_INTERVAL) -> threading.Thread:
+        """Run a pass now and then every ``interval_seconds`` on a daemon thread."""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    report = self.run_once()
+                    logger.info("Cache warm-up pass: %s", report.as_dict())
+                except Exception:
+                    logger.exception("Cache warm-up pass failed")
+                self._stop.wait(interval_seconds)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="cache-warmer", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def warmer_from_env() -> Optional[CacheWarmer]:
+    """
+    Build and start a warmer from the environment, or return None if disabled.
+    Off by default: every app process would otherwise run its own warmer
+    against the same upstreams. Enable it in one process, ideally with a
+    shared VARIANT_CACHE_URL so the other workers see what it fetched.
+
+    CACHE_WARMER_INTERVAL  seconds between passes (default 0, disabled; 21600 matches the cache TTL)
+    CACHE_WARMER_RATE      variants per second (default 0.5)
+    CACHE_WARMER_VARIANTS  optional file of extra rsIDs
+    """
+    interval = float(os.environ.get("CACHE_WARMER_INTERVAL", 0))
+    if interval <= 0:
+        return None
+    variants = list(CURATED_VARIANTS)
+    extra = os.environ.get("CACHE_WARMER_VARIANTS")
+    if extra:
+        variants += load_variant_list(extra)
+    warmer = CacheWarmer(variants, rate_per_second=float(os.environ.get("CACHE_WARMER_RATE", DEFAULT_RATE)))
+    warmer.start(interval)
+    return warmer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch annotations for a list of variants.")
+    parser.add_argument("--variants", help="file of rsIDs (default: curated AD loci + Help examples)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="variants per second")
+    parser.add_argument("--loop", type=float, default=0, help="repeat every N seconds instead of a single pass")
+    args = parser.parse_args()
+    if not is_shared_backend():
+        parser.error("VARIANT_CACHE_URL is not a shared backend; a standalone warmer's results would "
+                     "stay in its own memory (e.g. export VARIANT_CACHE_URL=sqlite:///var/cache/variants.db)")
+
+    logging.basicConfig(level=logging.INFO)
+    variants = load_variant_list(args.variants) if args.variants else CURATED_VARIANTS
+    warmer = CacheWarmer(variants, rate_per_second=args.rate)
+
+    while True:
+        print(json.dumps(warmer.run_once().as_dict()))
+        if args.loop <= 0:
+            break
+        time.sleep(args.loop)
+
+
+if __name__ == "__main__":
+    main()
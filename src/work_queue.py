@@ -0,0 +1,135 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PENDING, CLAIMED, DONE, FAILED = "pending", "claimed", "done", "failed"
+
+# A claimed item whose worker has not finished it within this many seconds
+# (crashed, killed, host lost) goes back to the queue
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SQLiteWorkQueue:
+    """
+    Work queue shared by worker processes through one SQLite (WAL) file.
+
+    ``claim`` hands each pending item to exactly one worker, under a lease;
+    workers ``complete`` or ``fail`` what they claimed. Expired leases are
+    reclaimed, failed items are retried up to ``max_attempts``. Enqueueing the
+    same item twice is a no-op, so a big rsID list can be re-submitted safely.
+    Items a worker could not try (e.g. an upstream outage) are ``release``d
+    without using up an attempt. A networked queue only needs the same methods.
+    """
+
+    def __init__(self, path: str, queue: str = "annotate", lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, timeout: float = 30.0):
+        self.path = str(path)
+        self.queue = queue
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS work_items ("
+            " queue TEXT NOT NULL, item TEXT NOT NULL, status TEXT NOT NULL,"
+            " worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT,"
+            " PRIMARY KEY (queue, item))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS work_items_status ON work_items (queue, status, lease_until)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, items: Iterable[str]) -> int:
+        """Add items not already in the queue. Returns how many were added."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO work_items (queue, item, status) VALUES (?, ?, ?)",
+                ((self.queue, item, PENDING) for item in items),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return conn.total_changes - before
+
+    def claim(self, worker: str, limit: int = 10) -> List[str]:
+        """Atomically take up to ``limit`` pending (or lease-expired) items for ``worker``."""
+        now = time.time()
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can
+        # never select the same rows before either marks them claimed
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT item FROM work_items WHERE queue = ? AND "
+                "(status = ? OR (status = ? AND lease_until < ?)) LIMIT ?",
+                (self.queue, PENDING, CLAIMED, now, limit),
+            ).fetchall()
+            items = [r[0] for r in rows]
+            conn.executemany(
+                "UPDATE work_items SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE queue = ? AND item = ?",
+                ((CLAIMED, worker, now + self.lease_seconds, self.queue, item) for item in items),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return items
+
+    def complete(self, worker: str, items: Iterable[str]) -> None:
+        self._conn().executemany(
+            "UPDATE work_items SET status = ?, lease_until = NULL, error = NULL "
+            "WHERE queue = ? AND item = ? AND worker = ?",
+            ((DONE, self.queue, item, worker) for item in items),
+        )
+
+    def release(self, worker: str, items: Iterable[str]) -> None:
+        """Hand claimed items back untried; the claim does not count as an attempt."""
+        self._conn().executemany(
+            "UPDATE work_items SET status = ?, worker = NULL, lease_until = NULL, attempts = attempts - 1 "
+            "WHERE queue = ? AND item = ? AND worker = ? AND status = ?",
+            ((PENDING, self.queue, item, worker, CLAIMED) for item in items),
+        )
+
+    def fail(self, worker: str, item: str, error: str, permanent: bool = False) -> None:
+        """Record a failure; the item is retried until it has used ``max_attempts`` unless ``permanent``."""
+        max_attempts = 0 if permanent else self.max_attempts
+        self._conn().execute(
+            "UPDATE work_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "lease_until = NULL, error = ? WHERE queue = ? AND item = ? AND worker = ?",
+            (max_attempts, FAILED, PENDING, error, self.queue, item, worker),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) FROM work_items WHERE queue = ? GROUP BY status", (self.queue,)
+        ).fetchall()
+        counts = {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def failures(self) -> List[Tuple[str, Optional[str]]]:
+        return self._conn().execute(
+            "SELECT item, error FROM work_items WHERE queue = ? AND status = ?", (self.queue, FAILED)
+        ).fetchall()
@@ -0,0 +1,21 @@
+import pytest
+
+
+class FakeClock:
+    """Settable time source; ``sleep`` advances it instead of blocking."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
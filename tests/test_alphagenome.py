@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+import fetch_data
+from alphagenome_client import AlphaGenomeScorer, parse_variant_vcf, variants_from_favor
+from merge_api import merge_variant_data, to_flat_csv
+
+
+class StandInClient:
+    """Local stand-in for AlphaGenome: score = position / 1e8, records batch sizes"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def score_batch(self, variants):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.batches.append(list(variants))
+        try:
+            if self.fail:
+                raise ConnectionError("model unavailable")
+            return [{"max_abs_quantile_score": pos / 1e8, "top_scorer": "RNA_SEQ", "top_gene": "APOE",
+                     "scores": {"RNA_SEQ": pos / 1e8}} for _, pos, _, _ in variants]
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def variants(n):
+    return [("chr19", 44_900_000 + i, "T", "C") for i in range(n)]
+
+
+class TestAlphaGenomeScorer:
+
+    def test_parse_variant_vcf(self):
+        """FAVOR variant_vcf becomes a chr-prefixed allele tuple"""
+        assert parse_variant_vcf("19-44908684-T-C") == ("chr19", 44908684, "T", "C")
+        assert parse_variant_vcf("not-a-variant") is None
+        assert variants_from_favor([{"variant_vcf": "19-44908684-T-C"}, {"rsid": "rs1"}]) == [("chr19", 44908684, "T", "C")]
+        assert variants_from_favor({"data": [{"variant_vcf": "19-44908684-T-C"}]}) == [("chr19", 44908684, "T", "C")]
+
+    def test_unconfigured_scorer_looked_up_once(self, monkeypatch):
+        """Without an API key the lookup is cached too, not repeated on every fetch"""
+        calls = []
+        monkeypatch.setattr(fetch_data, "_alphagenome_scorer", fetch_data._SCORER_UNSET)
+        monkeypatch.setattr(fetch_data, "default_scorer", lambda: calls.append(1))
+
+        assert fetch_data.get_alphagenome_scorer() is None
+        assert fetch_data.get_alphagenome_scorer() is None
+        assert len(calls) == 1
+        assert "alphagenome" not in fetch_data.PROVIDERS
+
+    def test_batches_and_concurrency(self):
+        """Misses are split into batches and scored with bounded concurrency"""
+        client = StandInClient()
+        scorer = AlphaGenomeScorer(client, batch_size=4, max_concurrency=2)
+
+        results = scorer.score(variants(10))
+
+        assert sorted(len(b) for b in client.batches) == [2, 4, 4]
+        assert client.max_active <= 2
+        assert results[("chr19", 44_900_003, "T", "C")]["max_abs_quantile_score"] == pytest.approx(0.44900003)
+
+    def test_cached_per_allele(self):
+        """Already-scored alleles are not sent again"""
+        client = StandInClient()
+        scorer = AlphaGenomeScorer(client, batch_size=8)
+        scorer.score(variants(3))
+
+        scorer.score(variants(5))
+
+        assert [len(b) for b in client.batches] == [3, 2]
+
+    def test_budget_and_failures_not_cached(self):
+        """Over-budget alleles are skipped; failed batches report errors and stay uncached"""
+        client = StandInClient(fail=True)
+        scorer = AlphaGenomeScorer(client, batch_size=2, max_variants=2)
+
+        results = scorer.score(variants(3))
+
+        assert "budget" in results[variants(3)[2]]["error"]
+        assert "unavailable" in results[variants(3)[0]]["error"]
+        assert scorer.cache.peek("alphagenome:chr19:44900000:T>C") is None
+
+    def test_scores_in_merge_and_csv(self):
+        """Scores land in the merged record, summary and flat export"""
+        scores = StandInClient().score_batch([("chr19", 44908684, "T", "C")])[0]
+        merged = merge_variant_data([{"rsid": "rs429358"}], None, "rs429358", alphagenome_data=scores)
+
+        assert merged["summary"]["alphagenome_max_score"] == pytest.approx(0.44908684)
+        assert to_flat_csv(merged)["alphagenome_top_gene"].iloc[0] == "APOE"
+        assert merge_variant_data(None, None, "rs1", alphagenome_data={"error": "x"})["alphagenome_scores"] is None
@@ -0,0 +1,58 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import annotate
+import pytest
+from annotate import ProviderUnavailable, annotate_variant, load_variant_list
+from cache import SQLiteBackend
+from record_store import RecordStore
+
+SRC = Path(__file__).parent.parent / "src"
+
+
+def test_annotate_variant_outage_is_not_a_miss(monkeypatch):
+    """No data because the upstreams are down raises instead of reporting an unknown variant"""
+    monkeypatch.setattr(annotate, "fetch_favor", lambda rsid, fields=None: None)
+    monkeypatch.setattr(annotate, "fetch_gtex", lambda rsid: {"error": "GTEx unavailable: refused"})
+    store = RecordStore()
+
+    with pytest.raises(ProviderUnavailable):
+        annotate_variant("rs1", store, with_alphagenome=False)
+    assert "rs1" not in store
+
+
+def test_unchanged_remerge_keeps_store_version(monkeypatch, tmp_path, clock):
+    """Re-annotating with the same upstream data restarts the record's age without a store write"""
+    monkeypatch.setattr(annotate, "fetch_favor", lambda rsid, fields=None: [{"rsid": rsid, "cadd_phred": 20.0}])
+    monkeypatch.setattr(annotate, "fetch_gtex", lambda rsid: {"eqtl_results": []})
+    store = RecordStore(SQLiteBackend(str(tmp_path / "records.db"), table="records"), clock=clock)
+
+    annotate_variant("rs1", store, with_alphagenome=False)
+    version = store.version()
+    clock.now += 100
+    annotate_variant("rs1", store, with_alphagenome=False)
+
+    assert store.version() == version
+    assert store.age("rs1") == 0
+
+    monkeypatch.setattr(annotate, "fetch_favor", lambda rsid, fields=None: [{"rsid": rsid, "cadd_phred": 25.0}])
+    annotate_variant("rs1", store, with_alphagenome=False)
+    assert store.version() != version
+
+
+def test_load_variant_list(tmp_path):
+    """First column rsIDs, comments and headers ignored, duplicates dropped"""
+    path = tmp_path / "loci.csv"
+    path.write_text("SNP,Locus\nrs3865444,CD33\n# comment\nRS6656401,CR1\nrs3865444,CD33\n")
+
+    assert load_variant_list(path) == ["rs3865444", "rs6656401"]
+
+
+def test_workers_do_not_import_the_ui():
+    """Batch workers load the fetch/merge path without Streamlit or the charts"""
+    code = ("import sys, batch_annotate; "
+            "print(sorted({m.split('.')[0] for m in sys.modules} & {'streamlit', 'plotly', 'data_viz'}))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True)
+
+    assert out.stdout.strip() == "[]"
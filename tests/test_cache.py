@@ -0,0 +1,107 @@
+import pytest
+from cache import SWRCache, CacheEntry, MemoryBackend, NOT_MODIFIED, FRESH, STALE, MISS, backend_from_url
+
+
+@pytest.fixture
+def cache(clock):
+    return SWRCache(fresh_ttl=60, max_stale=600, clock=clock)
+
+
+class CountingLoader:
+    """Loader that returns a new payload unless told the upstream is unchanged"""
+
+    def __init__(self):
+        self.calls = []
+        self.unchanged = False
+        self.version = 0
+
+    def __call__(self, previous):
+        self.calls.append(previous.conditional_headers() if previous else {})
+        if previous is not None and self.unchanged:
+            return NOT_MODIFIED
+        self.version += 1
+        return CacheEntry(value={"v": self.version}, etag=f'"v{self.version}"')
+
+
+class TestSWRCache:
+
+    def test_miss_then_fresh(self, cache):
+        """First call loads; repeat calls inside the TTL do not"""
+        loader = CountingLoader()
+
+        assert cache.get("k", loader) == ({"v": 1}, MISS)
+        assert cache.get("k", loader) == ({"v": 1}, FRESH)
+        assert len(loader.calls) == 1
+
+    def test_stale_served_while_revalidating(self, cache, clock):
+        """Expired entry is returned at once; refresh happens in the background"""
+        loader = CountingLoader()
+        cache.get("k", loader)
+
+        clock.now += 120
+        value, state = cache.get("k", loader)
+        cache.wait("k", timeout=5)
+
+        assert (value, state) == ({"v": 1}, STALE)
+        assert cache.peek("k").value == {"v": 2}
+        assert loader.calls[1] == {"If-None-Match": '"v1"'}
+
+    def test_not_modified_keeps_payload(self, cache, clock):
+        """304-style revalidation only bumps the timestamp"""
+        loader = CountingLoader()
+        cache.get("k", loader)
+        stored = cache.peek("k").value
+
+        clock.now += 120
+        loader.unchanged = True
+        cache.get("k", loader)
+        cache.wait("k", timeout=5)
+
+        assert cache.peek("k").value is stored
+        assert cache.peek("k").fetched_at == clock.now
+        assert cache.stats.not_modified == 1
+
+    def test_foreground_revalidates_before_returning(self, cache, clock):
+        """Inside foreground() an expired entry is refreshed synchronously"""
+        loader = CountingLoader()
+        cache.get("k", loader)
+
+        clock.now += 120
+        with cache.foreground():
+            assert cache.get("k", loader) == ({"v": 2}, MISS)
+        assert cache.peek("k").fetched_at == clock.now
+
+    def test_too_stale_blocks(self, cache, clock):
+        """Past max_stale the caller waits for a foreground reload"""
+        loader = CountingLoader()
+        cache.get("k", loader)
+
+        clock.now += 10_000
+        assert cache.get("k", loader) == ({"v": 2}, MISS)
+
+    def test_failed_revalidation_keeps_stale(self, cache, clock):
+        """Errors in the background refresh leave the cached value in place"""
+        cache.get("k", CountingLoader())
+
+        def broken(previous):
+            raise ConnectionError("upstream down")
+
+        clock.now += 120
+        assert cache.get("k", broken)[1] == STALE
+        cache.wait("k", timeout=5)
+
+        assert cache.peek("k").value == {"v": 1}
+        assert cache.stats.errors == 1
+
+
+def test_memory_backend_evicts_least_recently_used():
+    """A bounded memory backend drops the entry read or written longest ago"""
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", CacheEntry(1))
+    backend.set("b", CacheEntry(2))
+    backend.get("a")
+    backend.set("c", CacheEntry(3))
+
+    assert sorted(backend.keys()) == ["a", "c"]
+    assert backend_from_url("memory://", table="http").max_entries is not None
+    assert backend_from_url("memory://", table="records").max_entries is None
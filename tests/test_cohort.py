@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import api
+from cohort import (CATEGORICAL_FIELDS, CURRENT_POINTER, NUMERIC_FIELDS, CohortCache, CohortIndex,
+                    Condition, eqtl_condition, parse_condition)
+from eqtl_table import GTEX_TISSUES, EQTLTable
+from merge_api import merge_variant_data
+from record_store import RecordStore
+
+
+def make_record(rsid, cadd=None, af=None, gene=None, eqtls=(), position=None):
+    """Merged record with the given FAVOR scores and (tissue, p-value) eQTLs"""
+    favor = [{"rsid": rsid, "cadd_phred": cadd, "af_total": af, "genecode_comprehensive_info": gene,
+              "chromosome": "19", "position": position}]
+    gtex = {"eqtl_results": [
+        {"geneSymbol": gene, "tissueSiteDetailId": tissue, "pValue": p, "nes": 0.1} for tissue, p in eqtls
+    ]}
+    return merge_variant_data(favor, gtex, rsid)
+
+
+@pytest.fixture
+def records():
+    return [
+        make_record("rs1", cadd=25.0, af=0.001, gene="APOE", eqtls=[("Brain_Cortex", 1e-8)]),
+        make_record("rs2", cadd=30.0, af=0.005, gene="TOMM40", eqtls=[("Whole_Blood", 1e-10), ("Brain_Cortex", 1e-3)]),
+        make_record("rs3", cadd=22.0, af=0.2, gene="APOE", eqtls=[("Brain_Hippocampus", 1e-9)]),
+        make_record("rs4", cadd=12.0, af=0.0001, gene="APOC1", eqtls=[("Brain_Cortex", 1e-12)]),
+        make_record("rs5", cadd=None, af=0.002, gene="BIN1"),
+        make_record("rs6", cadd=40.0, af=0.003, gene="CLU", eqtls=[("Brain_Caudate_basal_ganglia", 5e-7)]),
+    ]
+
+
+class TestCohortIndex:
+
+    def test_example_query(self, records):
+        """cadd_phred > 20, af_total < 0.01 and a brain eQTL with p <= 1e-6"""
+        index = CohortIndex.from_records(records)
+
+        result = index.query(["cadd_phred>20", "af_total<0.01"],
+                             eqtl=eqtl_condition("brain", max_pvalue=1e-6),
+                             sort_by="cadd_phred", descending=True)
+
+        assert list(result.rows["variant_id"]) == ["rs6", "rs1"]
+        assert result.total == 2
+        assert result.scanned < len(index)  # started from an index range, not a full scan
+
+    def test_categorical_and_count_conditions(self, records):
+        """Text columns match alternatives; eqtl_count is derived"""
+        index = CohortIndex.from_records(records)
+
+        assert list(index.query("gene=APOE|CLU").rows["variant_id"]) == ["rs1", "rs3", "rs6"]
+        assert list(index.query("gene!=APOE, eqtl_count>=2").rows["variant_id"]) == ["rs2"]
+        assert index.query("gene=NOPE").total == 0
+
+    def test_sort_missing_last_and_paging(self, records):
+        """Missing values sort last in both directions; offset/limit page the sorted result"""
+        index = CohortIndex.from_records(records)
+
+        ascending = index.query(sort_by="cadd_phred").rows["variant_id"]
+        descending = index.query(sort_by="cadd_phred", descending=True, limit=2, offset=1)
+
+        assert list(ascending) == ["rs4", "rs3", "rs1", "rs2", "rs6", "rs5"]
+        assert list(descending.rows["variant_id"]) == ["rs2", "rs1"]
+        assert descending.total == 6
+
+    def test_latest_record_wins(self, records):
+        """A variant stored twice is indexed once, from its latest record"""
+        index = CohortIndex.from_records(records + [make_record("rs1", cadd=5.0)])
+
+        assert len(index) == 6
+        assert index.query("cadd_phred<10").rows["variant_id"].tolist() == ["rs1"]
+
+    def test_save_load_round_trip(self, records, tmp_path):
+        """Saved columns and indexes answer the same queries after loading"""
+        index = CohortIndex.from_records(records)
+        index.save(tmp_path / "cohort")
+        loaded = CohortIndex.load(tmp_path / "cohort")
+
+        query = dict(where="af_total<0.01", eqtl=eqtl_condition("brain", max_pvalue=1e-6), sort_by="gene")
+        pd.testing.assert_frame_equal(loaded.query(**query).rows.astype(object), index.query(**query).rows.astype(object))
+
+
+    def test_locus_points(self, records):
+        """eQTL points carry -log10(p) and their tissue; variant metrics skip missing values"""
+        records[0] = make_record("rs1", cadd=25.0, gene="APOE", eqtls=[("Brain_Cortex", 1e-8)], position=100)
+        records[1] = make_record("rs2", cadd=30.0, gene="TOMM40", eqtls=[("Whole_Blood", 1e-10)], position=5000)
+        index = CohortIndex.from_records(records)
+
+        eqtls = index.locus("chr19", start=0, end=1000)
+        assert eqtls[["variant_id", "tissue"]].values.tolist() == [["rs1", "Brain_Cortex"]]
+        assert eqtls["value"].iloc[0] == pytest.approx(8.0)
+        assert index.locus("19", metric="cadd_phred")["value"].tolist() == [25.0, 30.0]
+        assert index.locus("2").empty
+
+
+def test_parse_condition():
+    """Operators, alternatives and helpful errors"""
+    assert parse_condition("cadd_phred >= 20") == Condition("cadd_phred", ">=", 20.0)
+    assert parse_condition("clinvar=Pathogenic|Likely_pathogenic").value == ("Pathogenic", "Likely_pathogenic")
+
+    for bad in ["cadd_phred>high", "gene>APOE", "nope<1", "cadd_phred"]:
+        with pytest.raises(ValueError):
+            parse_condition(bad)
+
+
+def test_cohort_cache_rebuilds_in_background(records):
+    """The index is reused until the store changes; then the old one answers while a new one is built"""
+    store = RecordStore()
+    store.put("rs1", records[0])
+    cache = CohortCache(store, refresh_seconds=0)
+
+    first = cache.get()
+    assert cache.get() is first
+
+    store.put("rs2", records[1])
+    assert cache.get() is first
+    cache.wait(timeout=10)
+    assert len(cache.get()) == 2
+
+
+def test_cohort_cache_loads_saved_index(records, tmp_path, monkeypatch):
+    """A saved index that matches the store version is memory-mapped, not rebuilt"""
+    store = RecordStore()
+    for merged in records:
+        store.put(merged["variant_id"], merged)
+    built = CohortCache(store, path=tmp_path / "cohort").get()
+
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError("index rebuilt from the store")
+
+    monkeypatch.setattr(CohortIndex, "from_store", no_rebuild)
+    loaded = CohortCache(store, path=tmp_path / "cohort").get()
+
+    assert len(loaded) == len(built)
+    assert isinstance(loaded.columns["cadd_phred"], np.memmap)
+
+
+def test_cohort_cache_swaps_saved_builds(records, tmp_path):
+    """Each save switches the CURRENT pointer to a new build; only the build it replaced is kept"""
+    store = RecordStore()
+    cache = CohortCache(store, refresh_seconds=0, path=tmp_path / "cohort")
+    builds = []
+    for merged in records[:3]:
+        store.put(merged["variant_id"], merged)
+        cache.get()
+        cache.wait()
+        builds.append((tmp_path / "cohort" / CURRENT_POINTER).read_text().split()[0])
+
+    assert len(set(builds)) == 3
+    assert sorted(p.name for p in (tmp_path / "cohort").iterdir()) == sorted([CURRENT_POINTER] + builds[1:])
+    assert len(CohortCache(store, path=tmp_path / "cohort").get()) == 3
+
+
+def synthetic_index(n, eqtls_per_variant=3, seed=0):
+    """Cohort index over ``n`` random variants, built from arrays (records would take minutes)"""
+    rng = np.random.default_rng(seed)
+    columns = {col: rng.random(n) for col in NUMERIC_FIELDS}
+    columns["cadd_phred"] = rng.gamma(2.0, 5.0, n)
+    columns["af_total"] = rng.beta(0.5, 5.0, n)
+    for col in CATEGORICAL_FIELDS:
+        columns[col] = pd.Categorical.from_codes(rng.integers(0, 50, n), categories=[f"{col}{i}" for i in range(50)])
+
+    m = n * eqtls_per_variant
+    genes = [f"GENE{i}" for i in range(20000)]
+
+    def categorical(categories):
+        return pd.Categorical.from_codes(rng.integers(0, len(categories), m), categories=categories)
+
+    eqtls = EQTLTable(categorical([f"rs{i}" for i in range(1000)]), categorical(genes), categorical(list(GTEX_TISSUES)),
+                      categorical([f"{g}.1" for g in genes]), rng.normal(size=m), 10 ** -rng.uniform(0, 12, m))
+    owners = np.sort(rng.integers(0, n, m))
+    return CohortIndex(np.array([f"rs{i}" for i in range(n)]), columns, eqtls, owners)
+
+
+def test_query_at_one_million_variants():
+    """The README's example query over 1M variants and 3M eQTLs: right answer, in well under a second"""
+    index = synthetic_index(1_000_000)
+    eqtl = eqtl_condition("brain", max_pvalue=1e-6)
+
+    index.query(["cadd_phred>20", "af_total<0.01"], eqtl=eqtl)  # first call pays for lazy setup
+    result = index.query(["cadd_phred>20", "af_total<0.01"], eqtl=eqtl, sort_by="cadd_phred", descending=True)
+
+    cadd, af = index.columns["cadd_phred"], index.columns["af_total"]
+    brain = np.asarray(index.eqtls.tissue.isin([t for t in GTEX_TISSUES if t.startswith("Brain")]))
+    with_eqtl = np.zeros(len(index), dtype=bool)
+    with_eqtl[index.eqtl_variant[brain & (index.eqtls.p_value <= 1e-6)]] = True
+    assert result.total == int(np.sum((cadd > 20) & (af < 0.01) & with_eqtl))
+    assert result.elapsed_ms < 500
+
+
+def test_api_cohort(records, monkeypatch):
+    """REST endpoint returns JSON rows and maps bad queries to 400"""
+    store = RecordStore()
+    for merged in records:
+        store.put(merged["variant_id"], merged)
+    monkeypatch.setattr(api, "COHORT", CohortCache(store))
+    params = dict(eqtl_tissue="brain", eqtl_gene=None, eqtl_max_pvalue=1e-6, sort="cadd_phred",
+                  desc=True, limit=10, offset=0, fields="variant_id,cadd_phred")
+
+    body = api.cohort(where=["cadd_phred>20,af_total<0.01"], **params)
+    assert body["total"] == 2
+    assert body["rows"][0] == {"variant_id": "rs6", "cadd_phred": 40.0}
+
+    with pytest.raises(HTTPException) as e:
+        api.cohort(where=["nope>1"], **params)
+    assert e.value.status_code == 400
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_viz import bin_locus_points, create_locus_plot
+
+
+@pytest.fixture
+def locus_points():
+    """Dense random locus with one strong peak"""
+    rng = np.random.default_rng(0)
+    n = 5000
+    points = pd.DataFrame({
+        "position": rng.uniform(44_000_000, 46_000_000, n),
+        "value": rng.exponential(1.0, n),
+        "gene": rng.choice(["APOE", "TOMM40", "APOC1"], n),
+        "tissue": "Whole_Blood",
+        "variant_id": [f"rs{i}" for i in range(n)],
+    })
+    points.loc[0, ["position", "value"]] = [44_908_684, 50.0]
+    return points
+
+
+class TestLocusPlot:
+
+    def test_binning_bounds_markers_and_keeps_peak(self, locus_points):
+        """At most x_bins * y_bins markers; counts add up; the peak survives"""
+        binned = bin_locus_points(locus_points, x_bins=40, y_bins=10)
+
+        assert len(binned) <= 400
+        assert binned["count"].sum() == len(locus_points)
+        assert binned["value"].max() == 50.0
+
+    def test_webgl_traces_per_group(self, locus_points):
+        """Raw points below the threshold, one Scattergl trace per gene"""
+        fig = create_locus_plot(locus_points, "chr19")
+
+        assert {trace.type for trace in fig.data} == {"scattergl"}
+        assert sorted(trace.name for trace in fig.data) == ["APOC1", "APOE", "TOMM40"]
+        assert sum(len(trace.x) for trace in fig.data) == len(locus_points)
+
+    def test_bins_over_threshold_and_rebins_on_zoom(self, locus_points):
+        """Above max_points the chart is binned; a narrow x_range draws raw points again"""
+        full = create_locus_plot(locus_points, "chr19", max_points=1000)
+        zoomed = create_locus_plot(locus_points, "chr19", max_points=1000, x_range=(44_900_000, 44_950_000))
+
+        assert "bins" in full.layout.title.text
+        assert sum(len(trace.x) for trace in full.data) < len(locus_points)
+        assert "bins" not in zoomed.layout.title.text
+        assert 0 < sum(len(trace.x) for trace in zoomed.data) < 1000
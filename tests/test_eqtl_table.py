@@ -0,0 +1,101 @@
+import json
+
+import numpy as np
+import pytest
+from eqtl_table import EQTLTable, resolve_tissues
+from merge_api import merge_variant_data, export_to_json, to_flat_csv
+
+
+@pytest.fixture
+def eqtl_rows():
+    """GTEx singleTissueEqtl rows, including a repeated gene and a missing p-value"""
+    return [
+        {"snpId": "rs429358", "geneSymbol": "APOC1", "tissueSiteDetailId": "Esophagus_Mucosa", "pValue": 2.3e-5, "nes": -0.28, "gencodeId": "ENSG00000130208.9"},
+        {"snpId": "rs429358", "geneSymbol": "APOC1", "tissueSiteDetailId": "Adrenal_Gland", "pValue": 4.7e-5, "nes": -0.36, "gencodeId": "ENSG00000130208.9"},
+        {"snpId": "rs429358", "geneSymbol": "TOMM40", "tissueSiteDetailId": "Brain_Cortex", "pValue": None, "nes": 0.12, "gencodeId": "ENSG00000130204.12"},
+    ]
+
+
+class TestEQTLTable:
+
+    def test_arrays_and_categories(self, eqtl_rows):
+        """Numbers are float64 arrays; strings are stored once as categories"""
+        table = EQTLTable.from_records(eqtl_rows)
+
+        assert len(table) == 3
+        assert table.p_value.dtype == np.float64
+        assert np.isnan(table.p_value[2])
+        assert list(table.gene.categories) == ["APOC1", "TOMM40"]
+
+    def test_records_round_trip(self, eqtl_rows):
+        """Row access returns merged-style dicts with None for missing values"""
+        table = EQTLTable.from_records(eqtl_rows)
+
+        assert table[0] == {
+            "snp_id": "rs429358", "gene": "APOC1", "tissue": "Esophagus_Mucosa", "effect_size": -0.28,
+            "p_value": 2.3e-5, "gencode_id": "ENSG00000130208.9",
+        }
+        assert table[-1]["p_value"] is None
+        assert isinstance(table[1:], EQTLTable) and table[1:][0]["tissue"] == "Adrenal_Gland"
+        assert EQTLTable.coerce(table.to_records()).to_records() == table.to_records()
+
+    def test_from_gtex_reuses_table(self, eqtl_rows):
+        """A response already holding a table (app renders before merging) is not rebuilt"""
+        table = EQTLTable.from_gtex({"eqtl_results": eqtl_rows})
+
+        assert EQTLTable.from_gtex({"eqtl_results": table}) is table
+        assert len(EQTLTable.from_gtex(None)) == 0
+
+    def test_to_frame_shares_memory(self, eqtl_rows):
+        """DataFrame view does not copy the float arrays"""
+        table = EQTLTable.from_records(eqtl_rows)
+        df = table.to_frame()
+
+        assert np.shares_memory(df["p_value"].to_numpy(), table.p_value)
+
+    def test_matrix_first_wins(self, eqtl_rows):
+        """Gene x tissue matrix keeps the first association for duplicate cells"""
+        rows = eqtl_rows + [dict(eqtl_rows[0], nes=9.9)]
+        genes, tissues, z = EQTLTable.from_records(rows).matrix("effect_size")
+
+        assert z[genes.index("APOC1"), tissues.index("Esophagus_Mucosa")] == pytest.approx(-0.28)
+        assert np.isnan(z[genes.index("TOMM40"), tissues.index("Adrenal_Gland")])
+
+    def test_merge_export_uses_table(self, eqtl_rows):
+        """Merged record holds the table; JSON and CSV exports read from it"""
+        merged = merge_variant_data(None, {"eqtl_results": eqtl_rows}, "rs429358")
+
+        assert isinstance(merged["gtex_eqtls"]["associations"], EQTLTable)
+        assert merged["summary"]["top_eqtl_tissue"] == "Esophagus_Mucosa"
+
+        parsed = json.loads(export_to_json(merged))
+        assert parsed["gtex_eqtls"]["associations"][2]["p_value"] is None
+
+        df = to_flat_csv(merged)
+        assert list(df["eqtl_gene"]) == ["APOC1", "APOC1", "TOMM40"]
+
+    def test_filter_and_top_k(self, eqtl_rows):
+        """Tissue/p-value filter and top-k ordering by p-value"""
+        table = EQTLTable.from_records(eqtl_rows)
+
+        assert len(table.filter(max_pvalue=3e-5)) == 1  # missing p-value fails
+        assert len(table.filter(tissues=resolve_tissues("brain"))) == 1
+        assert [r["tissue"] for r in table.top_k(5)] == ["Esophagus_Mucosa", "Adrenal_Gland", "Brain_Cortex"]
+        assert len(table.top_k(1)) == 1
+
+    def test_merge_top_k_summary(self, eqtl_rows):
+        """Summary lists the k most significant eQTLs"""
+        merged = merge_variant_data(None, {"eqtl_results": eqtl_rows}, "rs429358", top_k=2)
+
+        assert [e["tissue"] for e in merged["summary"]["top_eqtls"]] == ["Esophagus_Mucosa", "Adrenal_Gland"]
+
+
+def test_resolve_tissues():
+    """Group prefixes expand; exact IDs pass through; unknown names raise"""
+    brain = resolve_tissues("brain")
+
+    assert len(brain) == 13 and all(t.startswith("Brain_") for t in brain)
+    assert resolve_tissues(["Liver", " Whole_Blood "]) == ("Liver", "Whole_Blood")
+    assert resolve_tissues("") is None
+    with pytest.raises(ValueError):
+        resolve_tissues("Kidney_Medulla_X")
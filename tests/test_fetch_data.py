@@ -0,0 +1,150 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import fetch_data
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self.content = json.dumps(payload).encode()
+        self.text = self.content.decode()
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    fetch_data.HTTP_CACHE.clear()
+    yield
+    fetch_data.HTTP_CACHE.clear()
+
+
+@pytest.fixture
+def gtex_pages(monkeypatch):
+    """Two GTEx eQTL pages behind a variant lookup; records every request"""
+    calls = []
+    pages = [
+        [{"geneSymbol": "APOC1", "tissueSiteDetailId": "Brain_Cortex", "pValue": 1e-9, "nes": 0.3},
+         {"geneSymbol": "APOE", "tissueSiteDetailId": "Brain_Cortex", "pValue": 0.01, "nes": 0.1}],
+        [{"geneSymbol": "TOMM40", "tissueSiteDetailId": "Brain_Cerebellum", "pValue": 1e-7, "nes": -0.2},
+         {"geneSymbol": "APOC1", "tissueSiteDetailId": "Liver", "pValue": 1e-12, "nes": 0.4}],
+    ]
+
+    def fake_get(url, params=None, **kwargs):
+        calls.append((url, dict(params or {})))
+        if url.endswith("/dataset/variant"):
+            return FakeResponse({"data": [{"variantId": "chr19_44908684_T_C_b38"}]})
+        page = params["page"]
+        return FakeResponse({"data": pages[page], "paging_info": {"numberOfPages": len(pages)}})
+
+    monkeypatch.setattr(fetch_data.requests, "get", fake_get)
+    return calls
+
+
+class TestFetchGtexFilters:
+
+    def test_streams_all_pages(self, gtex_pages):
+        """Every page is read when no filter is given"""
+        result = fetch_data.fetch_gtex("rs429358")
+
+        assert len(result["eqtl_results"]) == 4
+        assert [c[1].get("page") for c in gtex_pages[1:]] == [0, 1]
+
+    def test_tissue_pushdown_and_pvalue_stream_filter(self, gtex_pages):
+        """Tissues go into the request; p-value and tissue are enforced per row"""
+        tissues = ("Brain_Cortex", "Brain_Cerebellum")
+        result = fetch_data.fetch_gtex("rs429358", tissues=tissues, max_pvalue=1e-6)
+
+        assert gtex_pages[1][1]["tissueSiteDetailId"] == list(tissues)
+        assert [r["geneSymbol"] for r in result["eqtl_results"]] == ["APOC1", "TOMM40"]
+        assert result["filters"]["scanned"] == 4
+
+
+class TestDegradedMode:
+
+    @pytest.fixture(autouse=True)
+    def closed_breakers(self):
+        for provider in fetch_data.PROVIDERS.values():
+            provider.breaker.record_success(0.0)
+        yield
+        for provider in fetch_data.PROVIDERS.values():
+            provider.breaker.record_success(0.0)
+
+    def test_favor_falls_back_to_mock(self, monkeypatch):
+        """5xx from FAVOR serves the local mock instead of an error dict"""
+        monkeypatch.setattr(fetch_data.requests, "get", lambda *a, **k: FakeResponse({}, status_code=503))
+
+        data = fetch_data.fetch_favor("rs429358", fields=frozenset({"rsid", "cadd_phred"}))
+
+        assert data == [{"rsid": "rs429358", "cadd_phred": 17.93}]
+
+    def test_favor_not_found_returns_empty(self, monkeypatch):
+        """A 404 is an answer, not an outage: no mock, an empty result rather than None"""
+        monkeypatch.setattr(fetch_data.requests, "get", lambda *a, **k: FakeResponse({}, status_code=404))
+
+        assert fetch_data.fetch_favor("rs429358") == []
+        assert fetch_data.PROVIDERS["favor"].breaker.failures == 0
+
+    def test_open_breaker_serves_stale_cache(self, monkeypatch):
+        """With the breaker open, a cached copy is served without calling upstream"""
+        monkeypatch.setattr(fetch_data.requests, "get", lambda *a, **k: FakeResponse([{"rsid": "rs7412"}]))
+        fetch_data.fetch_favor("rs7412")
+
+        def no_network(*a, **k):
+            raise AssertionError("upstream called while breaker open")
+
+        monkeypatch.setattr(fetch_data.requests, "get", no_network)
+        monkeypatch.setattr(fetch_data.HTTP_CACHE, "fresh_ttl", -1)
+        monkeypatch.setattr(fetch_data.HTTP_CACHE, "max_stale", -1)
+        breaker = fetch_data.PROVIDERS["favor"].breaker
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        assert fetch_data.fetch_favor("rs7412") == [{"rsid": "rs7412"}]
+
+    def test_gtex_falls_back_to_mock(self, monkeypatch):
+        """Connection errors from GTEx serve mock eQTLs, filtered the same way"""
+        def refuse(*a, **k):
+            raise fetch_data.requests.ConnectionError("refused")
+
+        monkeypatch.setattr(fetch_data.requests, "get", refuse)
+        result = fetch_data.fetch_gtex("rs429358", tissues=["Adrenal_Gland"])
+
+        assert result["source"] == "mock"
+        assert [r["tissueSiteDetailId"] for r in result["eqtl_results"]] == ["Adrenal_Gland"]
+
+
+def test_collect_messages_on_worker_thread(monkeypatch):
+    """Messages from a fetcher on a pool thread come back with its result"""
+    def refuse(*a, **k):
+        raise fetch_data.requests.ConnectionError("refused")
+
+    monkeypatch.setattr(fetch_data.requests, "get", refuse)
+    with ThreadPoolExecutor(1) as pool:
+        data, messages = pool.submit(fetch_data.collect_messages, fetch_data.fetch_favor, "rs429358").result()
+
+    assert data
+    assert messages[0] == ("write", "Requesting https://api.genohub.org/v1/rsids/rs429358")
+    assert messages[-1][0] == "warning" and "showing local mock data" in messages[-1][1]
+
+
+def test_collect_messages_concurrent_calls_do_not_mix():
+    """Two fetchers interleaving on different pool threads each get only their own messages"""
+    barrier = threading.Barrier(2)
+
+    def fetch(name):
+        fetch_data._ui_write(f"{name} start")
+        barrier.wait(timeout=5)  # both calls are now collecting at once
+        fetch_data._ui_warning(f"{name} done")
+        return name
+
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(fetch_data.collect_messages, fetch, name) for name in ("favor", "gtex")]
+        results = [f.result() for f in futures]
+
+    for name, (result, messages) in zip(("favor", "gtex"), results):
+        assert result == name
+        assert messages == [("write", f"{name} start"), ("warning", f"{name} done")]
+    assert getattr(fetch_data._collected, "messages", None) is None
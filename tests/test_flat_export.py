@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+
+from flat_export import MANIFEST, PartitionedExport, bucket_of
+from merge_api import merge_variant_data
+
+
+def make_record(rsid, cadd, eqtls=(), previous=None):
+    favor = [{"rsid": rsid, "cadd_phred": cadd, "genecode_comprehensive_info": "APOE", "chromosome": "19"}]
+    gtex = {"eqtl_results": [{"geneSymbol": "APOE", "tissueSiteDetailId": t, "pValue": p, "nes": 0.1} for t, p in eqtls]}
+    return merge_variant_data(favor, gtex, rsid, previous=previous)
+
+
+@pytest.fixture
+def records():
+    return [make_record(f"rs{i}", cadd=float(i), eqtls=[("Whole_Blood", 1e-5)]) for i in range(1, 21)]
+
+
+def rows_by_variant(export):
+    return export.read().set_index("variant_id")["cadd_phred"].astype(float).sort_index()
+
+
+class TestPartitionedExport:
+
+    def test_first_sync_writes_everything(self, records, tmp_path):
+        """Every variant is added and lands in its bucket's part file"""
+        export = PartitionedExport(tmp_path / "out", buckets=4)
+        report = export.sync(records)
+
+        assert len(report.added) == 20 and report.buckets_written == len(export.parts())
+        assert rows_by_variant(export).to_dict() == {f"rs{i}": float(i) for i in range(1, 21)}
+        assert (tmp_path / "out" / MANIFEST).exists()
+
+    def test_unchanged_records_write_nothing(self, records, tmp_path):
+        """A second sync of the same (re-merged) records leaves the parts alone"""
+        PartitionedExport(tmp_path / "out", buckets=4).sync(records)
+        mtimes = {p: p.stat().st_mtime_ns for p in (tmp_path / "out").iterdir()}
+
+        remerged = [make_record(r["variant_id"], cadd=float(r["variant_id"][2:]), eqtls=[("Whole_Blood", 1e-5)],
+                                previous=r) for r in records]
+        report = PartitionedExport(tmp_path / "out").sync(remerged)
+
+        assert report.unchanged == 20 and report.buckets_written == 0
+        assert {p: p.stat().st_mtime_ns for p in (tmp_path / "out").iterdir()} == mtimes
+
+    def test_changed_record_patches_its_bucket(self, records, tmp_path):
+        """Only the changed variant's part is rewritten; other rows are untouched"""
+        export = PartitionedExport(tmp_path / "out", buckets=4)
+        export.sync(records)
+        bucket = bucket_of("rs7", 4)
+        others = {p: p.read_bytes() for p in export.parts() if p != export.part_path(bucket)}
+
+        records[6] = make_record("rs7", cadd=99.0, eqtls=[("Whole_Blood", 1e-5)], previous=records[6])
+        report = PartitionedExport(tmp_path / "out").sync(records)
+
+        assert report.changed == ["rs7"] and report.buckets_written == 1
+        assert rows_by_variant(export)["rs7"] == 99.0
+        assert {p: p.read_bytes() for p in others} == others
+
+    def test_outage_does_not_drop_rows(self, records, tmp_path):
+        """Re-merging while GTEx is down keeps the stored eQTLs, so nothing is patched"""
+        PartitionedExport(tmp_path / "out", buckets=4).sync(records)
+
+        records[0] = merge_variant_data(None, {"error": "GTEx unavailable: refused"}, "rs1", previous=records[0])
+        export = PartitionedExport(tmp_path / "out")
+        report = export.sync(records)
+
+        assert report.unchanged == 20
+        assert export.read().set_index("variant_id").loc["rs1", "eqtl_tissue"] == "Whole_Blood"
+
+    def test_removed_variants_pruned(self, records, tmp_path):
+        """Variants missing from the records are dropped unless prune is off"""
+        PartitionedExport(tmp_path / "out", buckets=4).sync(records)
+
+        kept = PartitionedExport(tmp_path / "out").sync(records[1:], prune=False)
+        assert kept.removed == []
+
+        export = PartitionedExport(tmp_path / "out")
+        report = export.sync(records[1:])
+        assert report.removed == ["rs1"]
+        assert "rs1" not in rows_by_variant(export)
+        assert len(rows_by_variant(export)) == 19
+
+
+def test_bad_format(tmp_path):
+    with pytest.raises(ValueError):
+        PartitionedExport(tmp_path, format="xlsx")
@@ -1,5 +1,7 @@
+import copy
+
 import pytest
-from merge_api import merge_variant_data, export_to_json, export_to_csv
+from merge_api import changed_sections, merge_variant_data, export_to_json, export_to_csv
 
 
 # ============================================================
@@ -168,6 +170,73 @@ class TestMergeVariantData:
 # EXPORT FUNCTION TESTS
 # ============================================================
 
+class TestIncrementalMerge:
+
+    def test_sources_hashed(self, favor_mock, gtex_mock):
+        """Each source present gets a hash; absent sources get None"""
+        merged = merge_variant_data(favor_mock, gtex_mock, "rs429358")
+
+        assert merged["sources"]["favor"] and merged["sources"]["gtex"]
+        assert merged["sources"]["alphagenome"] is None
+
+    def test_unchanged_sources_reused(self, favor_mock, gtex_mock):
+        """Re-merging identical inputs reuses every section and keeps the timestamp"""
+        previous = merge_variant_data(favor_mock, gtex_mock, "rs429358")
+        merged = merge_variant_data(favor_mock, gtex_mock, "rs429358", previous=previous)
+
+        assert merged["favor_annotation"] is previous["favor_annotation"]
+        assert merged["gtex_eqtls"] is previous["gtex_eqtls"]
+        assert merged["query_timestamp"] == previous["query_timestamp"]
+        assert changed_sections(previous, merged) == []
+
+    def test_only_changed_source_rebuilt(self, favor_mock, gtex_mock):
+        """New GTEx data rebuilds gtex_eqtls and its summary keys; FAVOR is reused"""
+        previous = merge_variant_data(favor_mock, gtex_mock, "rs429358")
+        gtex_new = copy.deepcopy(gtex_mock)
+        gtex_new["eqtl_results"][0]["pValue"] = 1e-20
+
+        merged = merge_variant_data(favor_mock, gtex_new, "rs429358", previous=previous)
+
+        assert merged["favor_annotation"] is previous["favor_annotation"]
+        assert merged["summary"]["gene"] == "APOE"
+        assert merged["summary"]["top_eqtl_pvalue"] == 1e-20
+        assert changed_sections(previous, merged) == ["gtex_eqtls", "summary"]
+
+    def test_source_not_found_clears(self, favor_mock, gtex_mock):
+        """A provider that answers it has nothing clears its section and summary keys"""
+        previous = merge_variant_data(favor_mock, gtex_mock, "rs429358")
+        gtex_none = {"error": "rsID rs429358 not found in GTEx v8", "not_found": True}
+
+        merged = merge_variant_data(favor_mock, gtex_none, "rs429358", previous=previous)
+
+        assert merged["gtex_eqtls"] is None
+        assert "top_eqtl_gene" not in merged["summary"]
+        assert merged["summary"]["gene"] == "APOE"
+        assert changed_sections(previous, merged) == ["gtex_eqtls", "summary"]
+
+    def test_failed_source_keeps_previous(self, favor_mock, gtex_mock):
+        """An outage is not "no data": the previous sections, summary and hashes are kept"""
+        previous = merge_variant_data(favor_mock, gtex_mock, "rs429358")
+
+        merged = merge_variant_data(None, {"error": "GTEx unavailable: refused"}, "rs429358", previous=previous)
+
+        assert merged["favor_annotation"] is previous["favor_annotation"]
+        assert merged["gtex_eqtls"] is previous["gtex_eqtls"]
+        assert merged["summary"] == previous["summary"]
+        assert merged["sources"] == previous["sources"]
+        assert merged["query_timestamp"] == previous["query_timestamp"]
+
+    def test_previous_without_sources(self, favor_mock, gtex_mock):
+        """Records stored before source hashes existed are rebuilt in full"""
+        previous = merge_variant_data(favor_mock, gtex_mock, "rs429358")
+        del previous["sources"]
+
+        merged = merge_variant_data(favor_mock, gtex_mock, "rs429358", previous=previous)
+
+        assert merged["favor_annotation"] is not previous["favor_annotation"]
+        assert changed_sections(previous, merged) == ["favor_annotation", "gtex_eqtls", "alphagenome_scores", "summary"]
+
+
 class TestExportFunctions:
 
     def test_export_json_valid(self, favor_mock, gtex_mock):
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from merge_api import merge_variant_data
+from projection import (
+    FAVOR_FIELD_GROUPS, FAVOR_MERGE_FIELDS, parse_favor, project_favor, required_fields,
+)
+
+
+@pytest.fixture
+def favor_body():
+    """FAVOR-style body with tracks nobody consumes"""
+    return json.dumps([{
+        "rsid": "rs429358",
+        "variant_vcf": "19-44908684-T-C",
+        "cadd_phred": 17.93,
+        "clnsig": "Conflicting_interpretations_of_pathogenicity",
+        "encode_dnase_sum": 12.5,
+        "linsight": 0.08,
+        "encode_tracks": {"dnase": 12.5, "h3k27ac": 3.1},
+    }])
+
+
+class TestProjection:
+
+    def test_parse_drops_unneeded_tracks(self, favor_body):
+        """Fields outside the projection never make it into the records"""
+        records = parse_favor(favor_body, required_fields(FAVOR_FIELD_GROUPS["pathogenicity_scores"]))
+
+        assert records[0]["cadd_phred"] == 17.93
+        assert records[0]["rsid"] == "rs429358"  # key fields always kept
+        assert "clnsig" not in records[0]
+        assert "encode_dnase_sum" not in records[0]
+        assert "encode_tracks" not in records[0]  # nested containers are projected by key too
+
+    def test_parse_unwraps_to_record_list(self):
+        """A wrapped body comes back as its record list, projected like a bare one"""
+        body = json.dumps({"data": [{"rsid": "rs1", "linsight": 0.1, "tracks": [1, 2]}], "meta": {"n": 1}})
+
+        assert parse_favor(body, frozenset({"rsid"})) == [{"rsid": "rs1"}]
+        assert parse_favor(body, None) == [{"rsid": "rs1", "linsight": 0.1, "tracks": [1, 2]}]
+        assert project_favor({"rsid": "rs1", "linsight": 0.1}, frozenset({"rsid"})) == [{"rsid": "rs1"}]
+
+    def test_no_projection(self, favor_body):
+        """None means keep everything"""
+        assert parse_favor(favor_body, None) == json.loads(favor_body)
+        assert required_fields({"cadd_phred"}, None) is None
+
+    def test_merge_projection_is_lossless(self, favor_body):
+        """Projecting to the merge fields gives the same merged record"""
+        full = json.loads(favor_body)
+        projected = project_favor(full, required_fields(FAVOR_MERGE_FIELDS))
+
+        assert "linsight" not in projected[0]
+        a = merge_variant_data(full, None, "rs429358")
+        b = merge_variant_data(projected, None, "rs429358")
+        assert a["favor_annotation"] == b["favor_annotation"]
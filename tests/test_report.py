@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from report import ReportJob, generate_reports, render_report, write_plotly_asset
+
+MOCK_DIR = Path(__file__).parent.parent / "data" / "mock_data"
+
+
+@pytest.fixture
+def inputs():
+    """Fetched inputs for rs429358 from the bundled mock payloads"""
+    return {
+        "variant_id": "rs429358",
+        "favor_data": json.loads((MOCK_DIR / "favor_rs429358.json").read_text()),
+        "gtex_data": json.loads((MOCK_DIR / "gtex_rs429358.json").read_text()),
+    }
+
+
+class TestReports:
+
+    def test_report_links_shared_plotly(self, inputs, tmp_path):
+        """Table, three figures and merged JSON; plotly.js referenced, not embedded"""
+        asset = write_plotly_asset(tmp_path)
+        path = Path(render_report(ReportJob("rs429358", [inputs]), str(tmp_path), asset))
+        page = path.read_text()
+
+        assert f'<script src="{asset}"></script>' in page
+        assert page.count('class="plotly-graph-div"') == 3
+        assert "genecode_comprehensive_info" in page and "&quot;top_eqtl_gene&quot;: &quot;APOC1&quot;" in page
+        assert len(page) < 200_000
+
+    def test_missing_data_sections(self, tmp_path):
+        """Variants unknown to both sources still get a section"""
+        page = Path(render_report(ReportJob("rs1", [{"variant_id": "rs1"}]), str(tmp_path), "plotly.js")).read_text()
+
+        assert "No FAVOR results found." in page and "No GTEx eQTL results found." in page
+
+    def test_generate_per_variant_and_locus(self, inputs, tmp_path):
+        """Worker processes write every report and an index; a locus report holds all its variants"""
+        fetched = []
+
+        def fetch(rsid):
+            fetched.append(rsid)
+            return dict(inputs, variant_id=rsid)
+
+        groups = {"rs1": ["rs1"], "rs2": ["rs2"], "APOE locus": ["rs1", "rs2"]}
+        paths = generate_reports(groups, str(tmp_path), processes=2, fetch=fetch)
+
+        assert sorted(Path(p).name for p in paths) == ["APOE_locus.html", "rs1.html", "rs2.html"]
+        assert sorted(fetched) == ["rs1", "rs2"]  # shared variants are fetched once
+        assert Path(tmp_path / "APOE_locus.html").read_text().count('class="plotly-graph-div"') == 6
+        assert len(list((tmp_path / "assets").iterdir())) == 1
+        assert "rs2.html" in (tmp_path / "index.html").read_text()
+
+    def test_failed_render_skips_only_that_report(self, inputs, tmp_path):
+        """A variant whose figures cannot be built does not stop the rest of the batch"""
+        def fetch(rsid):
+            if rsid == "rs2":
+                return {"variant_id": rsid, "favor_data": [{"rsid": rsid}]}  # no frequency fields
+            return dict(inputs, variant_id=rsid)
+
+        paths = generate_reports({"rs1": ["rs1"], "rs2": ["rs2"]}, str(tmp_path), processes=1, fetch=fetch)
+
+        assert [Path(p).name for p in paths] == ["rs1.html"]
+        assert "rs1.html" in (tmp_path / "index.html").read_text()
+
+    def test_empty_group_rejected(self, tmp_path):
+        """A group without rsIDs would never be rendered, so it is an error rather than a silent gap"""
+        with pytest.raises(ValueError, match="APOE locus"):
+            generate_reports({"rs1": ["rs1"], "APOE locus": []}, str(tmp_path / "out"))
+        assert not (tmp_path / "out").exists()
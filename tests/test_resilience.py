@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+from resilience import CircuitBreaker, CircuitOpenError, Provider, hedged, CLOSED, OPEN
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold_and_fails_fast(self, clock):
+        """Consecutive failures open the breaker; calls are then rejected"""
+        breaker = CircuitBreaker("gtex", failure_threshold=3, clock=clock)
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_half_open_trial_closes(self, clock):
+        """After the reset timeout one trial call is allowed; success closes"""
+        breaker = CircuitBreaker("gtex", failure_threshold=1, reset_timeout=30, clock=clock)
+        breaker.record_failure()
+
+        clock.now += 31
+        breaker.before_call()  # the trial
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()  # concurrent callers still fail fast
+        breaker.record_success(0.1)
+
+        assert breaker.state == CLOSED
+
+    def test_slow_calls_count_as_failures(self, clock):
+        """Latency over the threshold trips the breaker like an error"""
+        breaker = CircuitBreaker("favor", failure_threshold=2, slow_call_seconds=1.0, clock=clock)
+        breaker.record_success(5.0)
+        breaker.record_success(5.0)
+
+        assert breaker.state == OPEN
+
+
+class TestProvider:
+
+    def test_non_failures_do_not_trip(self):
+        """Errors the provider deems benign (e.g. 404) leave the breaker closed"""
+        provider = Provider("favor", CircuitBreaker("favor", failure_threshold=1),
+                            is_failure=lambda e: not isinstance(e, KeyError))
+
+        with pytest.raises(KeyError):
+            provider.call(lambda: {}["missing"])
+        assert provider.breaker.state == CLOSED
+
+
+def test_hedged_returns_faster_duplicate():
+    """A slow first attempt is overtaken by the hedge"""
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return "slow"
+        return "fast"
+
+    try:
+        assert hedged(fn, delay=0.01) == "fast"
+    finally:
+        release.set()
+    assert len(calls) == 2
@@ -0,0 +1,180 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+from cache import CacheEntry, SQLiteBackend, SWRCache, backend_from_url, MemoryBackend, MISS, PEER_WAIT_SECONDS
+from eqtl_table import EQTLTable
+from record_store import RecordStore
+import batch_annotate
+from annotate import ProviderUnavailable
+from work_queue import DEFAULT_MAX_ATTEMPTS, SQLiteWorkQueue
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "shared.db")
+
+
+class TestSQLiteBackend:
+
+    def test_entries_visible_to_other_instances(self, db_path):
+        """Two caches on one file (as two worker processes would be) share entries"""
+        a = SWRCache(backend=SQLiteBackend(db_path, table="http"))
+        b = SWRCache(backend=SQLiteBackend(db_path, table="http"))
+        a.get("k", lambda prev: CacheEntry(value={"rows": [1, 2]}, etag='"e1"'))
+
+        def must_not_load(prev):
+            raise AssertionError("second worker refetched")
+
+        assert b.get("k", must_not_load)[0] == {"rows": [1, 2]}
+        assert b.peek("k").etag == '"e1"'
+
+    def test_touch_and_prefix_keys(self, db_path):
+        """touch only moves the timestamp; keys() filters by literal prefix"""
+        backend = SQLiteBackend(db_path)
+        backend.set("favor:rs1", CacheEntry(value=[1], fetched_at=1.0))
+        backend.set("favor_x", CacheEntry(value=[2], fetched_at=1.0))
+        backend.touch("favor:rs1", 50.0)
+
+        assert backend.get("favor:rs1") == CacheEntry(value=[1], fetched_at=50.0)
+        assert list(backend.keys("favor:")) == ["favor:rs1"]
+
+    def test_lease_excludes_other_owners(self, db_path):
+        """Only one owner may refresh a key until the lease is released or expires"""
+        backend = SQLiteBackend(db_path)
+
+        assert backend.acquire_lease("k", "worker-a", 30)
+        assert not SQLiteBackend(db_path).acquire_lease("k", "worker-b", 30)
+        backend.release_lease("k", "worker-a")
+        assert backend.acquire_lease("k", "worker-b", 30)
+
+    def test_miss_waits_for_peer_load(self, db_path):
+        """A miss on a key a peer is loading reuses the peer's result"""
+        peer = SQLiteBackend(db_path)
+        peer.acquire_lease("k", "peer", 30)
+        cache = SWRCache(backend=SQLiteBackend(db_path))
+
+        timer = threading.Timer(0.2, lambda: peer.set("k", CacheEntry(value="from peer", fetched_at=cache.clock())))
+        timer.start()
+        value, state = cache.get("k", lambda prev: CacheEntry(value="duplicate call"))
+        timer.join()
+
+        assert (value, state) == ("from peer", MISS)
+
+    def test_miss_stops_waiting_when_peer_gives_up(self, db_path):
+        """Once the peer releases its lease without storing anything, the miss loads at once"""
+        peer = SQLiteBackend(db_path)
+        peer.acquire_lease("k", "peer", 30)
+        cache = SWRCache(backend=SQLiteBackend(db_path))
+
+        timer = threading.Timer(0.2, lambda: peer.release_lease("k", "peer"))
+        timer.start()
+        started = time.monotonic()
+        value, state = cache.get("k", lambda prev: CacheEntry(value="loaded here"))
+        timer.join()
+
+        assert (value, state) == ("loaded here", MISS)
+        assert time.monotonic() - started < PEER_WAIT_SECONDS / 2
+
+    def test_version_counts_writes_from_any_instance(self, db_path):
+        """Writes through another connection change the version; reads do not"""
+        reader, writer = SQLiteBackend(db_path, table="records"), SQLiteBackend(db_path, table="records")
+        before = reader.version()
+        reader.get("rs1")
+        assert reader.version() == before
+
+        writer.set("rs1", CacheEntry(value={}))
+        assert reader.version() != before
+        assert SQLiteBackend(db_path, table="http").version() != reader.version()
+
+    @pytest.mark.parametrize("backend", ["sqlite", "memory"])
+    def test_touch_keeps_version(self, db_path, backend):
+        """Touching an entry restarts its age but is not a write"""
+        store = SQLiteBackend(db_path, table="records") if backend == "sqlite" else MemoryBackend()
+        store.set("rs1", CacheEntry(value={"a": 1}, fetched_at=1.0))
+        before = store.version()
+
+        store.touch("rs1", 5.0)
+
+        assert store.version() == before
+        assert store.get("rs1").fetched_at == 5.0
+
+    def test_record_store_round_trip(self, db_path):
+        """Merged records (including EQTLTable) survive the shared store"""
+        store = RecordStore(SQLiteBackend(db_path, table="records"))
+        table = EQTLTable.from_records([{"geneSymbol": "APOC1", "tissueSiteDetailId": "Liver", "pValue": 1e-5, "nes": 0.2}])
+        store.put("rs1", {"variant_id": "rs1", "gtex_eqtls": {"associations": table}})
+
+        other = RecordStore(SQLiteBackend(db_path, table="records"))
+        assert other.get("rs1")["gtex_eqtls"]["associations"][0]["gene"] == "APOC1"
+        assert other.keys() == ["rs1"]
+
+
+def test_backend_from_url(tmp_path):
+    """URL schemes select the backend; unknown ones are rejected"""
+    assert isinstance(backend_from_url("memory://"), MemoryBackend)
+    assert isinstance(backend_from_url(f"sqlite://{tmp_path}/c.db"), SQLiteBackend)
+    with pytest.raises(ValueError):
+        backend_from_url("redis://localhost")
+
+
+def _claim_all(path, worker, out):
+    queue = SQLiteWorkQueue(path)
+    claimed = []
+    while True:
+        items = queue.claim(worker, 7)
+        if not items:
+            break
+        claimed.extend(items)
+        queue.complete(worker, items)
+    out.put(claimed)
+
+
+class TestWorkQueue:
+
+    def test_workers_split_without_overlap(self, db_path):
+        """Items are claimed exactly once across concurrent processes"""
+        items = [f"rs{i}" for i in range(300)]
+        SQLiteWorkQueue(db_path).enqueue(items)
+
+        ctx = multiprocessing.get_context("fork")
+        out = ctx.Queue()
+        procs = [ctx.Process(target=_claim_all, args=(db_path, f"w{i}", out)) for i in range(4)]
+        for p in procs:
+            p.start()
+        claimed = [out.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join(timeout=30)
+
+        flat = [item for worker_items in claimed for item in worker_items]
+        assert sorted(flat) == sorted(items)
+        assert SQLiteWorkQueue(db_path).stats()["done"] == 300
+
+    def test_expired_lease_and_retries(self, db_path):
+        """Crashed workers' items come back; failures retry up to max_attempts"""
+        queue = SQLiteWorkQueue(db_path, lease_seconds=-1, max_attempts=2)
+        assert queue.enqueue(["rs1", "rs1"]) == 1
+
+        assert queue.claim("crashed") == ["rs1"]
+        assert queue.claim("w2") == ["rs1"]  # lease already expired
+        queue.fail("w2", "rs1", "boom")
+
+        assert queue.stats()["failed"] == 1
+        assert queue.failures() == [("rs1", "boom")]
+
+    def test_outage_hands_items_back(self, db_path, monkeypatch):
+        """Items hit by an upstream outage are retried later without using up attempts"""
+        SQLiteWorkQueue(db_path).enqueue(["rs1", "rs2"])
+        outages = iter([True] * (DEFAULT_MAX_ATTEMPTS + 1))
+
+        def annotate(rsid):
+            if next(outages, False):
+                raise ProviderUnavailable(rsid)
+            return True
+
+        monkeypatch.setattr(batch_annotate, "annotate_variant", annotate)
+        done = batch_annotate.run_worker(db_path, worker="w1", backoff_seconds=0)
+
+        assert done == 2
+        assert SQLiteWorkQueue(db_path).stats()["done"] == 2
@@ -0,0 +1,99 @@
+import pytest
+
+import snapshot
+from cache import CacheEntry, MemoryBackend, SQLiteBackend
+from snapshot import Snapshot, SnapshotError, load_snapshots, write_snapshot
+
+
+@pytest.fixture
+def sources():
+    """HTTP cache with a FAVOR response and a GTEx rsID -> variantId lookup, plus a merged record"""
+    http, records = MemoryBackend(), MemoryBackend()
+    http.set("favor/rs429358", CacheEntry([{"rsid": "rs429358", "cadd_phred": 17.93}], 100.0, etag='"a"'))
+    http.set("gtex/variant/rs429358", CacheEntry({"data": [{"variantId": "chr19_44908684_T_C_b38"}]}, 100.0))
+    http.set("gtex/variant/rs7412", CacheEntry({"data": [{"variantId": "chr19_44908822_C_T_b38"}]}, 100.0))
+    records.set("rs429358", CacheEntry({"variant_id": "rs429358", "summary": {"gene": "APOE"}}, 100.0))
+    return {"http": http, "records": records}
+
+
+def fresh_sources():
+    return {"http": MemoryBackend(), "records": MemoryBackend()}
+
+
+class TestSnapshot:
+
+    def test_round_trip(self, sources, tmp_path):
+        """Values and cache metadata survive export and load"""
+        write_snapshot(tmp_path / "full.vsnap", sources)
+        target = fresh_sources()
+
+        report = load_snapshots([tmp_path / "full.vsnap"], target)
+
+        assert report["loaded"] == 4
+        entry = target["http"].get("favor/rs429358")
+        assert entry.value[0]["cadd_phred"] == 17.93
+        assert (entry.fetched_at, entry.etag) == (100.0, '"a"')
+        assert target["records"].get("rs429358").value["summary"]["gene"] == "APOE"
+
+    def test_lazy_reads(self, sources, tmp_path):
+        """A mapped snapshot answers single lookups without loading everything"""
+        write_snapshot(tmp_path / "full.vsnap", sources)
+
+        with Snapshot(tmp_path / "full.vsnap") as snap:
+            assert snap.get("http", "gtex/variant/rs7412").value["data"][0]["variantId"] == "chr19_44908822_C_T_b38"
+            assert snap.get("http", "missing") is None
+            assert snap.summary()["entries"] == {"http": 3, "records": 1}
+
+    def test_delta(self, sources, tmp_path):
+        """A delta carries changed values, re-fetch times and deletions only"""
+        write_snapshot(tmp_path / "full.vsnap", sources)
+        http = sources["http"]
+        http.set("favor/rs429358", CacheEntry([{"rsid": "rs429358", "cadd_phred": 18.0}], 200.0))
+        http.touch("gtex/variant/rs429358", 300.0)
+        http.delete("gtex/variant/rs7412")
+
+        summary = write_snapshot(tmp_path / "delta.vsnap", sources, base=[tmp_path / "full.vsnap"])
+        assert summary["entries"] == {"http": 1, "records": 0}
+        assert summary["touched"]["http"] == 1 and summary["deleted"]["http"] == 1
+
+        target = fresh_sources()
+        load_snapshots([tmp_path / "full.vsnap", tmp_path / "delta.vsnap"], target)
+        assert target["http"].get("favor/rs429358").value[0]["cadd_phred"] == 18.0
+        assert target["http"].get("gtex/variant/rs429358").fetched_at == 300.0
+        assert target["http"].get("gtex/variant/rs7412") is None
+
+    def test_keeps_newer_entries(self, sources, tmp_path):
+        """Loading into a warm (e.g. shared SQLite) backend does not roll entries back"""
+        write_snapshot(tmp_path / "full.vsnap", sources)
+        http = SQLiteBackend(str(tmp_path / "cache.db"), table="http")
+        http.set("favor/rs429358", CacheEntry(["newer"], 500.0))
+
+        report = load_snapshots([tmp_path / "full.vsnap"], {"http": http})
+
+        assert report["kept_newer"] == 1
+        assert http.get("favor/rs429358").value == ["newer"]
+        assert http.get("gtex/variant/rs7412") is not None
+
+    def test_corruption_and_chain_order_rejected(self, sources, tmp_path):
+        """Checksums catch damaged files; a delta cannot be loaded without its base"""
+        path = tmp_path / "full.vsnap"
+        write_snapshot(path, sources)
+        write_snapshot(tmp_path / "delta.vsnap", sources, base=[path])
+
+        with pytest.raises(SnapshotError):
+            load_snapshots([tmp_path / "delta.vsnap"], fresh_sources())
+
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xFF
+        path.write_bytes(bytes(data))
+        with pytest.raises(SnapshotError):
+            Snapshot(path)
+
+
+def test_load_from_env(sources, tmp_path, monkeypatch):
+    """VARIANT_SNAPSHOT is optional and a bad file never breaks startup"""
+    monkeypatch.delenv("VARIANT_SNAPSHOT", raising=False)
+    assert snapshot.load_from_env() is None
+
+    monkeypatch.setenv("VARIANT_SNAPSHOT", str(tmp_path / "missing.vsnap"))
+    assert "error" in snapshot.load_from_env()
@@ -0,0 +1,86 @@
+import annotate
+import pytest
+import warmer
+from record_store import RecordStore
+from warmer import CacheWarmer, RateLimiter
+
+
+@pytest.fixture
+def fake_upstream(monkeypatch):
+    """Fetchers that answer from memory and count calls"""
+    calls = []
+
+    def fake_favor(rsid, fields=None):
+        calls.append(rsid)
+        return [{"rsid": rsid, "cadd_phred": 20.0}] if rsid != "rs404" else []
+
+    def fake_gtex(rsid, tissues=None, max_pvalue=None):
+        return {"error": "not found", "not_found": True} if rsid == "rs404" else {"eqtl_results": []}
+
+    monkeypatch.setattr(annotate, "fetch_favor", fake_favor)
+    monkeypatch.setattr(annotate, "fetch_gtex", fake_gtex)
+    monkeypatch.setattr(annotate, "fetch_alphagenome", lambda favor_data: None)
+    return calls
+
+
+def make_warmer(variants, store, clock):
+    limiter = RateLimiter(rate=2.0, clock=clock, sleep=clock.sleep)
+    return CacheWarmer(variants, store=store, fresh_ttl=100, limiter=limiter)
+
+
+class TestCacheWarmer:
+
+    def test_pass_fills_store_and_reports(self, clock, fake_upstream):
+        """A pass stores merged records and reports coverage"""
+        store = RecordStore(clock=clock)
+        w = make_warmer(["rs1", "rs2", "rs404"], store, clock)
+
+        report = w.run_once()
+
+        assert store.get("rs1")["summary"]["gene"] is None
+        assert (report.warmed, report.errors, report.missing) == (2, 1, 1)
+        assert report.coverage == pytest.approx(2 / 3)
+
+    def test_rate_budget(self, clock, fake_upstream):
+        """Fetches are spaced by the token bucket"""
+        w = make_warmer(["rs1", "rs2", "rs3"], RecordStore(clock=clock), clock)
+
+        w.run_once()
+
+        assert clock.slept == [0.5, 0.5]
+
+    def test_fresh_records_skipped_and_staleness(self, clock, fake_upstream):
+        """Fresh records are not refetched; old ones are reported stale and rewarmed"""
+        store = RecordStore(clock=clock)
+        w = make_warmer(["rs1", "rs2"], store, clock)
+        w.run_once()
+        fake_upstream.clear()
+
+        w.run_once()
+        assert fake_upstream == []
+
+        clock.now += 150
+        assert w.report().stale == 2
+        w.run_once()
+        assert fake_upstream == ["rs1", "rs2"]
+
+    def test_backs_off_when_breaker_open(self, clock, fake_upstream, monkeypatch):
+        """No upstream calls while a provider's breaker is open"""
+        breaker = warmer.PROVIDERS["gtex"].breaker
+        monkeypatch.setattr(type(breaker), "is_open", property(lambda self: self is breaker))
+
+        report = make_warmer(["rs1", "rs2"], RecordStore(clock=clock), clock).run_once()
+
+        assert fake_upstream == []
+        assert report.skipped_unhealthy == 2
+
+
+def test_warmer_is_opt_in(monkeypatch):
+    """No interval, no warmer; standalone runs refuse a per-process backend"""
+    monkeypatch.delenv("CACHE_WARMER_INTERVAL", raising=False)
+    assert warmer.warmer_from_env() is None
+
+    monkeypatch.delenv("VARIANT_CACHE_URL", raising=False)
+    monkeypatch.setattr("sys.argv", ["warmer.py"])
+    with pytest.raises(SystemExit):
+        warmer.main()